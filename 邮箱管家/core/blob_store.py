@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+原始邮件/附件存储 - 按 SHA-256 内容寻址，跨账号去重，通过内存映射读取
+
+同一封验证码邮件常被群发到很多账号，内容相同时只保存一份。
+文件位于数据库所在目录的 blobs/ 下，按摘要前两位分子目录：blobs/ab/abcdef...
+哪个账号的哪封邮件/附件对应哪个摘要记录在数据库中，删除账号后由 collect_garbage 清理。
+"""
+
+import contextlib
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+
+
+class BlobStore:
+    """内容寻址的文件存储"""
+
+    # 计算摘要时每次读取的字节数
+    READ_CHUNK = 1024 * 1024
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return bool(digest) and os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """保存内容，已存在时不重复写入，返回 SHA-256 摘要"""
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.has(digest):
+            self._write(digest, lambda f: f.write(data))
+        return digest
+
+    def put_file(self, src_path, keep=False):
+        """把已下载的文件放入存储（不读入内存），返回摘要
+        keep=False: 移入存储，已存在时删除源文件
+        keep=True: 保留源文件，用硬链接放入存储，不再写一遍数据（文件系统不支持时才复制）
+        """
+        digest = self._file_digest(src_path)
+        target = self.path(digest)
+        if os.path.exists(target):
+            if not keep:
+                os.remove(src_path)
+            return digest
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not keep:
+            # 跨磁盘时 move 会退化为复制
+            shutil.move(src_path, target)
+            return digest
+        try:
+            os.link(src_path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            self._write(digest, lambda f: self._copy_file(src_path, f))
+        return digest
+
+    def _file_digest(self, path):
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.READ_CHUNK), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def _copy_file(self, src_path, dest):
+        with open(src_path, 'rb') as src:
+            shutil.copyfileobj(src, dest, self.READ_CHUNK)
+
+    def _write(self, digest, writer):
+        """先写临时文件再重命名，其他线程不会读到写了一半的文件"""
+        target = self.path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+            os.replace(temp_path, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+    @contextlib.contextmanager
+    def open(self, digest):
+        """只读内存映射打开，支持切片、find 和正则，不把整个文件读入内存
+        文件不存在时抛出 FileNotFoundError
+        """
+        with open(self.path(digest), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b''  # 空文件不能映射
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def copy_to(self, digest, dest_path):
+        """复制到目标路径，边复制边校验摘要，返回是否成功
+        put_file(keep=True) 与用户保存的文件共用同一份数据，文件被原地修改过时
+        内容与摘要不符：删除该文件并返回 False，由调用方重新下载
+        """
+        sha = hashlib.sha256()
+        with open(self.path(digest), 'rb') as src, open(dest_path, 'wb') as dest:
+            for chunk in iter(lambda: src.read(self.READ_CHUNK), b''):
+                sha.update(chunk)
+                dest.write(chunk)
+        if sha.hexdigest() == digest:
+            return True
+        with contextlib.suppress(OSError):
+            os.remove(self.path(digest))
+        return False
+
+    def digests(self):
+        """存储中的全部摘要"""
+        if not os.path.isdir(self.root):
+            return set()
+        result = set()
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if len(prefix) == 2 and os.path.isdir(directory):
+                result.update(name for name in os.listdir(directory) if not name.endswith('.part'))
+        return result
+
+    def collect_garbage(self, referenced):
+        """删除没有被引用的文件，返回 (删除个数, 释放字节数)"""
+        removed, freed = 0, 0
+        for digest in self.digests() - set(referenced):
+            path = self.path(digest)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store(db_manager):
+    """数据库对应的存储（数据库所在目录的 blobs/），没有数据库时返回 None"""
+    db_path = getattr(db_manager, 'db_path', None)
+    if not db_path:
+        return None
+    root = os.path.join(os.path.dirname(os.path.abspath(db_path)), 'blobs')
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = BlobStore(root)
+        return store
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+并发检测引擎 - 有界线程池，按服务器和租户限制并发，结果按完成顺序返回
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class KeyedLimiter:
+    """按键计数的并发名额，只在调度线程中使用，不阻塞；键为 None 时不限制"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._counts = {}
+
+    def available(self, key):
+        return key is None or self._counts.get(key, 0) < self.limit
+
+    def acquire(self, key):
+        if key is not None:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def release(self, key):
+        if key is None:
+            return
+        count = self._counts.get(key, 0) - 1
+        if count > 0:
+            self._counts[key] = count
+        else:
+            self._counts.pop(key, None)
+
+
+class CheckEngine:
+    """批量检测引擎
+
+    - 线程池大小即全局并发数
+    - 同一 IMAP 服务器最多 per_host 个并发（服务器通常按 IP 限制连接数）
+    - 同一租户（邮箱域名，微软个人账号按邮箱地址）最多 per_tenant 个并发，
+      Graph 按租户/邮箱限流，不再单独限制主机
+    - 调度线程提交任务前先占好服务器和租户名额，名额已满的任务留在等待队列，
+      工作线程不会因限流而阻塞，其他服务器的任务照常占满线程池
+    - 任务按需提交，停止后不再提交新任务，已开始的任务执行完毕
+    """
+
+    def __init__(self, concurrency=8, per_host=8, per_tenant=16):
+        self.concurrency = max(1, int(concurrency))
+        self.host_limiter = KeyedLimiter(max(1, per_host))
+        self.tenant_limiter = KeyedLimiter(max(1, per_tenant))
+
+    @staticmethod
+    def client_keys(client):
+        """返回客户端的 (服务器, 租户) 限流键，Graph 账号的服务器键为 None"""
+        if client.use_graph_api():
+            return None, client.tenant_key()
+        return f'{client.imap_server}:{client.imap_port}', client.tenant_key()
+
+    def _try_reserve(self, host, tenant):
+        """两个名额都有空时一起占用，返回是否成功"""
+        if not (self.host_limiter.available(host) and self.tenant_limiter.available(tenant)):
+            return False
+        self.host_limiter.acquire(host)
+        self.tenant_limiter.acquire(tenant)
+        return True
+
+    def run(self, items, make_client, task, should_stop=None):
+        """执行批量任务
+        make_client: item -> EmailClient，在调度线程中调用（只创建对象，不联网）
+        task: (item, client) -> result，在工作线程中执行，提交前已占好限流名额
+        should_stop: 返回 True 时停止提交新任务（等待队列中的任务也不再执行）
+        产出: (item, result, error)，按完成顺序
+        """
+        pending = set()
+        waiting = deque()  # 名额已满、等待提交的 (item, client, host, tenant)
+        items = iter(items)
+        end = object()
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def submit(item, client, host, tenant):
+                future = executor.submit(task, item, client)
+                future.job = (item, host, tenant)
+                pending.add(future)
+
+            while True:
+                if should_stop and should_stop():
+                    exhausted = True
+                    waiting.clear()
+
+                # 先提交等待队列中名额已空出的任务（保持原顺序）
+                if waiting and len(pending) < self.concurrency:
+                    still_waiting = deque()
+                    for job in waiting:
+                        if len(pending) < self.concurrency and self._try_reserve(job[2], job[3]):
+                            submit(*job)
+                        else:
+                            still_waiting.append(job)
+                    waiting = still_waiting
+
+                # 再从输入取新任务，名额已满的放入等待队列，继续取下一个
+                while not exhausted and len(pending) < self.concurrency:
+                    item = next(items, end)
+                    if item is end:
+                        exhausted = True
+                        break
+                    try:
+                        client = make_client(item)
+                        host, tenant = self.client_keys(client)
+                    except Exception as e:
+                        yield item, None, e
+                        continue
+                    if self._try_reserve(host, tenant):
+                        submit(item, client, host, tenant)
+                    else:
+                        waiting.append((item, client, host, tenant))
+
+                if not pending:
+                    # 没有在途任务时名额全部空闲，等待队列必然已提交
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item, host, tenant = future.job
+                    self.host_limiter.release(host)
+                    self.tenant_limiter.release(tenant)
+                    try:
+                        yield item, future.result(), None
+                    except Exception as e:
+                        yield item, None, e
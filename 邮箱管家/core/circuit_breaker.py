@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+熔断模块 - 按 服务器:端口 熔断连续连接失败的邮件服务器，避免每个账号都等满连接超时
+"""
+
+import imaplib
+import smtplib
+import threading
+import time
+
+
+class HostUnreachable(Exception):
+    """服务器处于熔断状态，未发起连接"""
+
+    # 连接失败信息中的标识，用于区分"服务器不可达"和普通异常
+    MARKER = '服务器不可达'
+
+    def __init__(self, host, retry_in):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(f'{self.MARKER}: {host} 连续连接失败，{int(retry_in) + 1} 秒后重试')
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = 'closed'  # closed / open / half_open
+        self.failures = 0
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+
+
+class CircuitBreaker:
+    """按 服务器:端口 的熔断器
+
+    - closed: 正常连接，连续 threshold 次连接失败后转为 open
+    - open: 直接抛出 HostUnreachable，不再发起连接；cooldown 秒后转为 half_open
+    - half_open: 只放行一个探测连接，成功则恢复 closed，失败则重新 open 且冷却时间加倍
+    只有连接层错误（DNS、拒绝连接、超时、TLS 握手失败等）计为失败，
+    登录失败说明服务器可达，不影响熔断状态。
+    """
+
+    def __init__(self, threshold=3, cooldown=60, max_cooldown=600):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._circuits = {}
+
+    def call(self, host, func):
+        """在熔断保护下执行连接函数 func，熔断中时抛出 HostUnreachable"""
+        self._before(host)
+        try:
+            result = func()
+        except Exception as e:
+            self._after(host, not self.is_connect_error(e))
+            raise
+        self._after(host, True)
+        return result
+
+    @staticmethod
+    def is_connect_error(error):
+        """是否为连接层错误（协议层的认证/命令错误说明服务器可达）"""
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        # SMTPException 是 OSError 的子类，需先排除
+        if isinstance(error, (imaplib.IMAP4.error, smtplib.SMTPException)):
+            return False
+        return isinstance(error, OSError)
+
+    def open_hosts(self):
+        """当前熔断中的服务器列表"""
+        with self._lock:
+            return [host for host, c in self._circuits.items() if c.state != 'closed']
+
+    def reset(self, host=None):
+        """手动恢复某个服务器（None 表示全部）"""
+        with self._lock:
+            if host is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(host, None)
+
+    def _before(self, host):
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.state == 'closed':
+                return
+            remaining = circuit.opened_at + circuit.cooldown - time.monotonic()
+            if circuit.state == 'open' and remaining <= 0:
+                # 冷却结束，由当前调用者探测一次
+                circuit.state = 'half_open'
+                return
+            # 仍在冷却，或已有探测连接在进行
+            raise HostUnreachable(host, max(0.0, remaining))
+
+    def _after(self, host, reachable):
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if reachable:
+                if circuit:
+                    del self._circuits[host]
+                return
+            if circuit is None:
+                circuit = self._circuits[host] = _Circuit()
+            circuit.failures += 1
+            if circuit.state == 'half_open':
+                circuit.cooldown = min(self.max_cooldown, circuit.cooldown * 2)
+            elif circuit.failures >= self.threshold:
+                circuit.cooldown = self.base_cooldown
+            else:
+                return
+            circuit.state = 'open'
+            circuit.opened_at = time.monotonic()
+
+
+# 全局熔断器
+host_breaker = CircuitBreaker()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+验证码提取模块 - 同步/检测时从邮件中提取验证码写入索引表，查最新验证码不必再打开收件箱
+"""
+
+import html
+import re
+
+
+# 标题/发件人中出现这些词的邮件视为验证码邮件（英文按整词匹配，"Footprint" 不算 otp）
+# 单独的 code 太宽泛（code review 等），只认带限定词的说法
+TRIGGER_WORDS = [
+    '验证码', '校验码', '动态码', '动态密码', '确认码', '认证码', '安全码',
+    'verification', 'verify', 'one-time', 'otp', 'passcode', 'security code', 'login code',
+    'sign-in code', 'sign in code', 'access code', 'your code',
+]
+
+_TRIGGER_RE = re.compile(
+    '|'.join(re.escape(w) if not w.isascii() else rf'(?<![A-Za-z]){re.escape(w)}(?![A-Za-z])'
+             for w in TRIGGER_WORDS),
+    re.IGNORECASE
+)
+
+# 验证码: 4~8 位，纯数字或含数字的字母数字组合（不要求大写，但必须有数字，避免把单词当成验证码）
+_CODE = r'(?=[A-Za-z]*\d)[A-Za-z0-9]{4,8}'
+_BOUNDARY_BEFORE = r'(?<![A-Za-z0-9])'
+_BOUNDARY_AFTER = r'(?![A-Za-z0-9])'
+
+# 紧跟在提示词后面的验证码："验证码：123456"、"Your code is AB12CD"、"OTP - 1234"
+_CONTEXT_RE = re.compile(
+    r'(?:验证码|校验码|动态码|动态密码|确认码|认证码|安全码|'
+    r'(?<![A-Za-z])(?:code|otp|passcode|pin|one-time password)(?![A-Za-z]))'
+    r'[^A-Za-z0-9\n]{0,6}(?:(?:is|为|是)[^A-Za-z0-9\n]{0,4})?'
+    + _BOUNDARY_BEFORE + '(' + _CODE + ')' + _BOUNDARY_AFTER,
+    re.IGNORECASE
+)
+# 没有提示词时取单独的数字，优先 6 位（只用于标题/发件人明确是验证码的邮件）
+_DIGITS_RE = [
+    re.compile(_BOUNDARY_BEFORE + r'(\d{6})' + _BOUNDARY_AFTER),
+    re.compile(_BOUNDARY_BEFORE + r'(\d{4,8})' + _BOUNDARY_AFTER),
+]
+
+# 正文清理：样式/脚本、标签、链接（链接里的数字不是验证码）
+_HTML_BLOCK_RE = re.compile(r'<(style|script)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_URL_RE = re.compile(r'https?://\S+|www\.\S+', re.IGNORECASE)
+
+
+def clean_text(text):
+    """把 HTML/纯文本正文转换为用于匹配的纯文本"""
+    if not text:
+        return ''
+    if '<' in text:
+        text = _TAG_RE.sub(' ', _HTML_BLOCK_RE.sub(' ', text))
+        text = html.unescape(text)
+    return _URL_RE.sub(' ', text)
+
+
+def find_code(text, fallback=True):
+    """在一段文本中找验证码，没有时返回 None
+    fallback: 找不到提示词时取单独的数字
+    """
+    text = clean_text(text)
+    if not text:
+        return None
+    match = _CONTEXT_RE.search(text)
+    if match:
+        return match.group(1)
+    if not fallback:
+        return None
+    for regex in _DIGITS_RE:
+        match = regex.search(text)
+        if match:
+            return match.group(1)
+    return None
+
+
+class CodeExtractor:
+    """验证码提取器
+
+    先按标题/发件人筛出验证码邮件（触发词，或命中关键词规则如 aws），
+    再依次在标题、预览、正文中查找验证码，标题里有就不再看正文。
+    rules: RuleSet，命中任一规则的邮件也视为候选，但只认提示词后的验证码
+        （这类邮件还包括订单、账单等，单独的数字多是订单号或年份）
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules
+
+    def is_candidate(self, email_data):
+        return self.has_trigger(email_data) or bool(self.rules and self.rules.match(email_data))
+
+    @staticmethod
+    def has_trigger(email_data):
+        """标题/发件人中有验证码触发词"""
+        text = ' '.join(email_data.get(key) or '' for key in ('subject', 'sender', 'sender_email'))
+        return bool(_TRIGGER_RE.search(text))
+
+    def extract(self, email_data, text=None):
+        """提取一封邮件的验证码
+        text: 另外获取的正文片段（IMAP 只取了邮件头时）
+        """
+        subject = email_data.get('subject') or ''
+        # 标题只认提示词后的验证码，避免把订单号等数字当成验证码
+        match = _CONTEXT_RE.search(subject)
+        if match:
+            return match.group(1)
+        fallback = self.has_trigger(email_data)
+        for body in (email_data.get('preview'), email_data.get('body'), text):
+            code = find_code(body, fallback)
+            if code:
+                return code
+        return None
+
+    def needs_text(self, email_data):
+        """候选邮件的标题/预览/正文中都没有验证码，需要取正文"""
+        return self.extract(email_data) is None
+
+    def collect(self, emails, texts=None):
+        """提取一批邮件的验证码
+        texts: {uid: 正文片段}
+        返回: [{'uid', 'sender', 'sender_email', 'subject', 'code', 'received_at'}, ...]
+        """
+        texts = texts or {}
+        records = []
+        for email_data in emails:
+            if not self.is_candidate(email_data):
+                continue
+            uid = str(email_data.get('uid'))
+            code = self.extract(email_data, texts.get(uid))
+            if not code:
+                continue
+            records.append({
+                'uid': uid,
+                'sender': email_data.get('sender', ''),
+                'sender_email': email_data.get('sender_email', ''),
+                'subject': email_data.get('subject', ''),
+                'code': code,
+                'received_at': email_data.get('date'),
+            })
+        return records
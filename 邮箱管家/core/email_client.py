@@ -5,18 +5,66 @@
 
 import imaplib
 import smtplib
-import email
-from email.header import decode_header
-from email.utils import parsedate_to_datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-import ssl
 import requests
 import os
 import base64
-from datetime import datetime
+import quopri
+import re
+import time
+from datetime import datetime, timedelta
+
+from core.imap_pool import imap_pool
+from core.rate_control import rate_controller
+from core.circuit_breaker import host_breaker, HostUnreachable
+from core import tls
+from core.net_metrics import network_timeouts, latency_stats
+from core.imap_compress import CompressedIMAP4_SSL
+from core.imap_parser import (
+    parse_fetch_response, get_fetch_item, parse_flags, parse_bodystructure,
+    is_attachment_part, find_text_part, parse_list_response, parse_status_response,
+    decode_imap_utf7, build_uid_sets, parse_uid_set
+)
+from core.keyword_rules import RULE_FIELDS, DEFAULT_RULES, RuleSet
+from core import mime_parser
+from core.parse_pool import parse_pool
+from core.blob_store import get_blob_store
+from core.code_extractor import CodeExtractor
+
+
+class _TransferDecoder:
+    """按 Content-Transfer-Encoding 流式解码分段到达的数据"""
+
+    def __init__(self, encoding):
+        self.encoding = (encoding or '').lower()
+        self.buffer = b''
+
+    def feed(self, data):
+        if self.encoding == 'base64':
+            self.buffer += re.sub(rb'[^A-Za-z0-9+/=]', b'', data)
+            usable = len(self.buffer) // 4 * 4
+            chunk, self.buffer = self.buffer[:usable], self.buffer[usable:]
+            return base64.b64decode(chunk) if chunk else b''
+        if self.encoding == 'quoted-printable':
+            # 按行解码，避免把 =XX 或软换行拆到两段
+            self.buffer += data
+            cut = self.buffer.rfind(b'\n') + 1
+            chunk, self.buffer = self.buffer[:cut], self.buffer[cut:]
+            return quopri.decodestring(chunk) if chunk else b''
+        return data
+
+    def flush(self):
+        chunk, self.buffer = self.buffer, b''
+        if not chunk:
+            return b''
+        if self.encoding == 'base64':
+            return base64.b64decode(chunk + b'=' * (-len(chunk) % 4))
+        if self.encoding == 'quoted-printable':
+            return quopri.decodestring(chunk)
+        return chunk
 
 
 class EmailClient:
@@ -41,8 +89,10 @@ class EmailClient:
         self.refresh_token = refresh_token
         self.access_token = None
         self.connection = None
+        self._session = None  # 连接池会话
         self.account_id = account_id  # 账号ID，用于更新数据库
         self.db_manager = db_manager  # 数据库管理器，用于保存新的refresh_token
+        self._profile = None  # 账号能力档案，首次使用时从数据库读取
         
         if not self.imap_server:
             self.imap_server = self.detect_server(email_addr)
@@ -63,17 +113,66 @@ class EmailClient:
         domain = self.email_addr.split('@')[-1].lower()
         return domain in ['outlook.com', 'hotmail.com', 'live.com', 'msn.com']
     
+    def tenant_key(self):
+        """限流用的租户键：微软个人账号按邮箱地址（Graph 对个人邮箱逐个限流，不共享租户配额），其他按邮箱域名"""
+        if self.is_outlook():
+            return f'consumers:{self.email_addr.lower()}'
+        return self.email_addr.split('@')[-1].lower()
+
+    def _request(self, method, url, **kwargs):
+        """经过共享限流层发送 HTTP 请求（429/503 按 Retry-After 退避重试）"""
+        return rate_controller.request(method, url, tenant=self.tenant_key(), **kwargs)
+
     def use_graph_api(self):
         """判断是否使用 Graph API"""
         return self.is_outlook() and self.client_id and self.refresh_token
     
     def get_api_type(self):
-        """根据 token scope 判断使用哪个 API"""
-        # 先获取 token 看 scope
+        """获取使用哪个 API：本次已判断过或能力档案里有记录时直接使用，否则获取 token 看 scope"""
+        if getattr(self, '_api_type', None):
+            return self._api_type
+        api_type = self.get_profile()['api_type']
+        if api_type:
+            self._api_type = api_type
+            return api_type
         if not self.access_token:
             self.get_oauth2_access_token()
         return getattr(self, '_api_type', 'graph')
     
+    def get_profile(self):
+        """账号能力档案: {'api_type', 'capabilities', 'folder_map'}
+        记录上次探测到的 API 类型、IMAP 服务器能力和文件夹映射，下次运行直接复用
+        """
+        if self._profile is None:
+            profile = None
+            if self.db_manager and self.account_id:
+                try:
+                    profile = self.db_manager.get_account_profile(self.account_id)
+                except Exception:
+                    profile = None
+            self._profile = profile or {'api_type': None, 'capabilities': [], 'folder_map': {}}
+        return self._profile
+
+    def update_profile(self, **changes):
+        """更新能力档案，只有内容变化时才写数据库"""
+        profile = self.get_profile()
+        changed = {k: v for k, v in changes.items() if v is not None and profile.get(k) != v}
+        if not changed:
+            return
+        profile.update(changed)
+        if self.db_manager and self.account_id:
+            try:
+                self.db_manager.save_account_profile(self.account_id, **changed)
+            except Exception as e:
+                print(f"保存账号能力档案失败: {e}")
+
+    def has_capability(self, name):
+        """服务器是否支持某个 IMAP 扩展（已连接时看当前连接，否则看能力档案）"""
+        name = name.upper()
+        if self.connection is not None:
+            return name in self.connection.capabilities
+        return name in self.get_profile()['capabilities']
+
     def get_oauth2_access_token(self):
         """使用 refresh_token 获取 access_token"""
         if not self.client_id or not self.refresh_token:
@@ -88,7 +187,7 @@ class EmailClient:
         }
         
         try:
-            response = requests.post(token_url, data=data, timeout=30)
+            response = self._request('POST', token_url, data=data, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
@@ -113,8 +212,11 @@ class EmailClient:
                     self._api_type = 'outlook'
                 else:
                     self._api_type = 'graph'
+                self.update_profile(api_type=self._api_type)
                 
                 return self.access_token, "获取成功"
+            elif response.status_code in rate_controller.THROTTLE_STATUS:
+                return None, f"限流: 服务器返回 {response.status_code}，重试后仍未恢复"
             else:
                 error_data = response.json()
                 error = error_data.get('error_description', response.text)
@@ -135,37 +237,469 @@ class EmailClient:
                     else:
                         url = 'https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages?$top=1'
                     
-                    resp = requests.get(url, headers=headers, timeout=10)
+                    resp = self._request('GET', url, headers=headers, timeout=10)
                     if resp.status_code == 200:
                         return "正常", "Token 有效"
+                    elif resp.status_code in rate_controller.THROTTLE_STATUS:
+                        return "限流", f"API 限流: {resp.status_code}"
                     else:
                         return "异常", f"API 错误: {resp.status_code}"
                 except Exception as e:
                     return "异常", f"网络错误: {e}"
             else:
-                return "异常", msg
+                return self.failure_status(msg), msg
         else:
             # 普通 IMAP 检测
             success, msg = self.connect_imap()
             if success:
                 self.disconnect()
                 return "正常", msg
-            return "异常", msg
+            return self.failure_status(msg), msg
     
-    def connect_imap(self):
-        """连接 IMAP 服务器（普通密码认证）"""
+    def failure_status(self, msg):
+        """认证/连接失败时的账号状态
+        服务器熔断中为 不可达，被服务器限流时为 限流（这两种情况账号本身未必有问题），否则为 异常
+        """
+        if HostUnreachable.MARKER in msg:
+            return "不可达"
+        if msg.startswith('限流') or rate_controller.IMAP_THROTTLE_RE.search(msg):
+            return "限流"
+        return "异常"
+
+    # IMAP SEARCH 日期中的月份缩写
+    _IMAP_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                    'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+    def probe(self, limit=30, rules=None):
+        """一次认证内完成状态检测和关键词规则检测
+        关键词先由服务器端搜索（IMAP UID SEARCH / Graph $search），只取回命中邮件的
+        标题/发件人/时间交给规则集逐封匹配；搜索请求本身同时用来验证 token 或登录状态
+        rules: RuleSet，默认使用内置规则
+        返回: {'status', 'message', 'latency', 'hits', 'counts'}
+            latency: 认证到首个响应的耗时（毫秒），hits: {规则名: 命中邮件数}（未能检测时为 None）
+            counts: 收件箱计数，见 folder_counts()（账号异常或获取失败时为 None）
+        """
+        rules = rules if rules is not None else RuleSet(DEFAULT_RULES)
+        start = time.monotonic()
+        if self.use_graph_api():
+            status, msg, hits, counts = self._probe_graph(rules, limit)
+        else:
+            status, msg, hits, counts = self._probe_imap(rules, limit)
+        latency = int((time.monotonic() - start) * 1000)
+        return {
+            'status': status,
+            'message': msg,
+            'latency': latency,
+            'hits': hits,
+            'counts': counts
+        }
+
+    def _probe_graph(self, rules, limit):
+        """返回: (status, msg, hits, counts)"""
+        token, msg = self.get_oauth2_access_token()
+        if not token:
+            return self.failure_status(msg), msg, None, None
+
+        status_code, hits, msg = self._evaluate_rules_graph(token, rules, limit)
+        if status_code in (200, 400):
+            # 400: token 有效但邮箱不支持搜索语法，只影响关键词检测
+            # 收件箱计数沿用同一个 token，只多一次 mailFolders 请求
+            counts, _ = self._folder_counts_graph(token, ('inbox',))
+            return "正常", "Token 有效", hits if status_code == 200 else None, counts
+        if status_code in rate_controller.THROTTLE_STATUS:
+            return "限流", msg, None, None
+        return "异常", msg, None, None
+
+    def _probe_imap(self, rules, limit):
+        """返回: (status, msg, hits, counts)"""
+        success, msg = self.connect_imap()
+        if not success:
+            return self.failure_status(msg), msg, None, None
+
+        # 登录成功即为正常，之后的步骤失败只影响关键词检测/计数
         try:
-            context = ssl.create_default_context()
-            self.connection = imaplib.IMAP4_SSL(
-                self.imap_server, self.imap_port, ssl_context=context
+            hits, _ = self._evaluate_rules_imap(rules, limit)
+            counts = None
+            if self.connection is not None:
+                # 同一会话上 STATUS 收件箱
+                try:
+                    counts = self._folder_counts_imap(('inbox',))
+                except Exception as e:
+                    self._drop_broken_session(e)
+            return "正常", msg, hits, counts
+        finally:
+            self.disconnect()
+
+    def evaluate_rules(self, rules, limit=50):
+        """按规则集检测邮箱（一次认证，规则涉及的每个文件夹一次服务器端搜索）
+        返回: ({规则名: 命中邮件数}, msg)，失败时为 None
+        """
+        if not rules:
+            return {}, "没有启用的规则"
+        if self.use_graph_api():
+            token, msg = self.get_oauth2_access_token()
+            if not token:
+                return None, msg
+            _, hits, msg = self._evaluate_rules_graph(token, rules, limit)
+            return hits, msg
+
+        success, msg = self.connect_imap()
+        if not success:
+            return None, msg
+        try:
+            return self._evaluate_rules_imap(rules, limit)
+        finally:
+            self.disconnect()
+
+    def _evaluate_rules_imap(self, rules, limit):
+        """在已登录的连接上逐个文件夹搜索并匹配规则"""
+        hits = {}
+        for folder in rules.folders():
+            if not self.has_folder(folder):
+                # 服务器上没有这个文件夹，不必 SELECT
+                hits.update({r.name: 0 for r in rules.rules_for_folder(folder)})
+                continue
+            terms, since_days = rules.search_terms(folder)
+            uids, msg = self._search_keywords_imap(terms, self.get_folder_name(folder), since_days)
+            if uids is None:
+                return None, msg
+            emails = self._fetch_match_fields_imap(uids[-limit:]) if uids else []
+            if emails is None:
+                return None, "获取邮件头失败"
+            hits.update(rules.evaluate(emails, folder))
+            # 命中规则的邮件多是验证码邮件，顺带提取验证码
+            self.index_verification_codes(folder, emails, CodeExtractor(rules))
+        return hits, "检测成功"
+
+    def _fetch_match_fields_imap(self, uids):
+        """只取规则匹配需要的 SUBJECT/FROM/DATE 头"""
+        status, data = self.connection.uid('FETCH', ','.join(uids),
+                                           f'(UID BODY.PEEK[HEADER.FIELDS ({self.LIST_HEADER_FIELDS})])')
+        if status != 'OK':
+            return None
+        items = [attrs for _, attrs in parse_fetch_response(data) if 'UID' in attrs]
+        return [self._build_imap_summary(attrs['UID'], attrs, self._parse_fetched_headers(attrs))
+                for attrs in items]
+
+    def _evaluate_rules_graph(self, token, rules, limit):
+        """逐个文件夹 $search 并匹配规则
+        返回: (status_code, hits, msg)，失败时 hits 为 None
+        """
+        hits = {}
+        status_code = 200
+        for folder in rules.folders():
+            terms, since_days = rules.search_terms(folder)
+            status_code, _, emails, msg = self._search_keywords_graph(
+                token, terms, folder, since_days, limit, with_fields=True
             )
-            self.connection.login(self.email_addr, self.password)
-            return True, "连接成功"
+            if status_code != 200:
+                return status_code, None, msg
+            hits.update(rules.evaluate(emails, folder))
+            self.index_verification_codes(folder, emails, CodeExtractor(rules))
+        return status_code, hits, "检测成功"
+
+    def search_subject_keywords(self, keywords, folder='inbox', since_days=None, limit=50):
+        """服务器端按标题关键词搜索，只返回匹配数量和邮件 ID，不下载邮件内容
+        keywords: 关键词列表（任一命中即可）
+        since_days: 只搜索最近多少天的邮件，None 表示不限
+        返回: (count, ids, msg)，失败时 count 为 None
+        """
+        terms = [('subject', kw) for kw in keywords]
+        if self.use_graph_api():
+            token, msg = self.get_oauth2_access_token()
+            if not token:
+                return None, [], msg
+            _, count, ids, msg = self._search_keywords_graph(
+                token, terms, folder, since_days, limit
+            )
+            return count, ids, msg
+
+        success, msg = self.connect_imap()
+        if not success:
+            return None, [], msg
+        try:
+            ids, msg = self._search_keywords_imap(terms, self.get_folder_name(folder), since_days)
+            if ids is None:
+                return None, [], msg
+            # UID 递增，最新的在末尾
+            return len(ids), ids[-limit:][::-1], msg
+        finally:
+            self.disconnect()
+
+    @staticmethod
+    def _imap_quote(value):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    def _imap_mailbox(self, name):
+        """命令中的文件夹名：含空格等特殊字符时加引号（imaplib 不会自动处理）"""
+        if name.startswith('"') or re.fullmatch(r'[^\s"(){%*\\\]]+', name):
+            return name
+        return self._imap_quote(name)
+
+    def build_keyword_criteria(self, terms, since_days=None):
+        """构建 IMAP SEARCH 条件: [SINCE d-Mon-yyyy] OR SUBJECT "a" OR FROM "b" SUBJECT "c"
+        terms: [(字段, 关键词), ...]，字段见 RULE_FIELDS
+        """
+        terms = [f'{RULE_FIELDS[field][0]} {self._imap_quote(kw)}' for field, kw in terms]
+        criteria = terms[-1]
+        for term in reversed(terms[:-1]):
+            criteria = f'OR {term} {criteria}'
+        return f'{self._since_criteria(since_days)}{criteria}'
+
+    def _since_criteria(self, since_days):
+        """SEARCH 的 SINCE 条件（带末尾空格），since_days 为空时返回空串"""
+        if not since_days:
+            return ''
+        # SINCE 的月份必须是英文缩写，不能依赖 strftime 的本地化结果
+        since = datetime.now() - timedelta(days=since_days)
+        return f'SINCE {since.day}-{self._IMAP_MONTHS[since.month - 1]}-{since.year} '
+
+    def _search_keywords_imap(self, terms, folder, since_days=None):
+        """在已登录的连接上执行 UID SEARCH，返回 (uid 列表（升序）, msg)，失败时为 None
+        ASCII 关键词合并为一条 OR 条件；非 ASCII 关键词按 RFC 3501 用 CHARSET UTF-8 加文字量（literal）发送，
+        imaplib 每条命令只能在末尾带一个文字量，所以每个非 ASCII 关键词单独搜索一次，结果取并集
+        """
+        try:
+            status, _ = self.select_folder(folder, readonly=True)
+            if status != 'OK':
+                return None, f"无法打开文件夹 {folder}"
+            searches = []  # (charset, 条件, 文字量)
+            ascii_terms = [(field, kw) for field, kw in terms if kw.isascii()]
+            if ascii_terms:
+                searches.append((None, self.build_keyword_criteria(ascii_terms, since_days), None))
+            for field, kw in terms:
+                if not kw.isascii():
+                    criteria = f'{self._since_criteria(since_days)}{RULE_FIELDS[field][0]}'
+                    searches.append(('UTF-8', criteria, kw.encode('utf-8')))
+
+            uids = set()
+            for charset, criteria, literal in searches:
+                if literal is None:
+                    status, data = self.connection.uid('SEARCH', None, criteria)
+                else:
+                    self.connection.literal = literal
+                    status, data = self.connection.uid('SEARCH', 'CHARSET', charset, criteria)
+                if status != 'OK':
+                    return None, "搜索失败"
+                uids.update((data[0] or b'').split())
+            return [u.decode() for u in sorted(uids, key=int)], "搜索成功"
+        except Exception as e:
+            self._drop_broken_session(e)
+            return None, f"搜索失败: {str(e)}"
+
+    # 取正文片段时每封邮件最多下载的字节数（验证码一般在正文开头）
+    CODE_SNIPPET_BYTES = 8192
+
+    def index_verification_codes(self, folder, emails, extractor=None):
+        """从一批邮件中提取验证码写入索引表
+        标题/预览中找不到验证码的候选邮件（IMAP 只取了邮件头时），在当前已选中文件夹的连接上取正文开头一段
+        提取失败不影响同步/检测，返回写入的条数
+        """
+        if not (self.db_manager and self.account_id) or not emails:
+            return 0
+        extractor = extractor or CodeExtractor()
+        try:
+            candidates = [e for e in emails if extractor.is_candidate(e)]
+            if not candidates:
+                return 0
+            texts = {}
+            if not self.use_graph_api() and self.connection is not None:
+                missing = [str(e['uid']) for e in candidates if extractor.needs_text(e)]
+                if missing:
+                    texts = self._fetch_text_snippets_imap(missing)
+            records = extractor.collect(candidates, texts)
+            self.db_manager.save_verification_codes(self.account_id, folder, records)
+            return len(records)
+        except Exception as e:
+            self._drop_broken_session(e)
+            return 0
+
+    def _fetch_text_snippets_imap(self, uids):
+        """取邮件正文部件开头的一段并解码 {uid: 文本}
+        已存入本地的邮件直接解析；其余先 FETCH BODYSTRUCTURE 找到正文部件，部件号相同的邮件合并为一次 FETCH
+        """
+        texts = self._cached_message_texts(uids)
+        uids = [uid for uid in uids if uid not in texts]
+        if not uids:
+            return texts
+        status, data = self.connection.uid('FETCH', ','.join(uids), '(UID BODYSTRUCTURE)')
+        if status != 'OK':
+            return texts
+        by_section = {}
+        for _, attrs in parse_fetch_response(data):
+            part = find_text_part(parse_bodystructure(attrs.get('BODYSTRUCTURE'))) if 'UID' in attrs else None
+            if part:
+                by_section.setdefault(part['section'], {})[str(attrs['UID'])] = part
+
+        limit = self.CODE_SNIPPET_BYTES
+        for section, parts in by_section.items():
+            status, data = self.connection.uid('FETCH', ','.join(parts), f'(UID BODY.PEEK[{section}]<0.{limit}>)')
+            if status != 'OK':
+                continue
+            for _, attrs in parse_fetch_response(data):
+                part = parts.get(str(attrs.get('UID')))
+                if part is None:
+                    continue
+                payload = get_fetch_item(attrs, 'BODY[') or b''
+                if len(payload) >= limit:
+                    # 截断处可能在 base64 四字节组或 QP 转义中间，丢掉最后不完整的一行
+                    payload = payload[:payload.rfind(b'\n') + 1] or payload
+                texts[str(attrs['UID'])] = mime_parser.decode_payload(
+                    payload, part['encoding'], part['params'].get('charset')
+                )
+        return texts
+
+    def _cached_message_texts(self, uids):
+        """当前选中文件夹中已存入本地的邮件，解析正文开头 {uid: 文本}"""
+        store = self._blob_store()
+        folder, _ = self._selected_folder()
+        if store is None or folder is None:
+            return {}
+        blobs = self.db_manager.get_message_blobs(self.account_id, folder, uids)
+        texts = self._parse_message_blobs(store, blobs.values(), self.CODE_SNIPPET_BYTES)
+        return {uid: text for uid, text in zip(blobs, texts) if text is not None}
+
+    def _search_keywords_graph(self, token, terms, folder='inbox', since_days=None, limit=50, with_fields=False):
+        """Graph/Outlook $search 关键词
+        terms: [(字段, 关键词), ...]
+        with_fields: 额外选择标题/发件人/时间/预览供规则匹配和验证码提取，否则只选择 id
+        返回: (status_code, count, items, msg)，items 为 id 列表或邮件字典列表；网络错误时 status_code 为 None
+        """
+        query = ' OR '.join(f'{RULE_FIELDS[field][1]}:{kw.replace(chr(34), "")}' for field, kw in terms)
+        if since_days:
+            since = (datetime.now() - timedelta(days=since_days)).strftime('%Y-%m-%d')
+            query = f'({query}) AND received>={since}'
+
+        folder_name = self.get_folder_name(folder)
+        headers = {'Authorization': f'Bearer {token}'}
+        if self._api_type == 'outlook':
+            url = f'https://outlook.office.com/api/v2.0/me/mailfolders/{folder_name}/messages'
+            select = 'Id,Subject,From,ReceivedDateTime,BodyPreview' if with_fields else 'Id'
+            params = {'$search': f'"{query}"', '$select': select, '$top': limit}
+            id_field = 'Id'
+        else:
+            url = f'https://graph.microsoft.com/v1.0/me/mailFolders/{folder_name}/messages'
+            select = 'id,subject,from,receivedDateTime,bodyPreview' if with_fields else 'id'
+            params = {'$search': f'"{query}"', '$select': select, '$top': limit, '$count': 'true'}
+            # $count 需要 eventual 一致性
+            headers['ConsistencyLevel'] = 'eventual'
+            id_field = 'id'
+
+        try:
+            resp = self._request('GET', url, headers=headers, params=params, timeout=10)
         except Exception as e:
-            return False, f"连接失败: {str(e)}"
+            return None, None, [], f"网络错误: {e}"
+        if resp.status_code != 200:
+            return resp.status_code, None, [], f"API 错误: {resp.status_code}"
+        try:
+            data = resp.json()
+        except ValueError:
+            return resp.status_code, None, [], "响应解析失败"
+        values = data.get('value', [])
+        if with_fields:
+            items = [self._parse_graph_message(m, headers_only=True) for m in values]
+        else:
+            items = [m.get(id_field) for m in values]
+        count = data.get('@odata.count')
+        return resp.status_code, count if isinstance(count, int) else len(items), items, "搜索成功"
     
-    def disconnect(self):
-        if self.connection:
+    def connect_imap(self):
+        """连接 IMAP 服务器（普通密码认证），优先复用连接池中已登录的会话"""
+        if self._session:
+            return True, "连接成功"
+        key = (self.imap_server, self.imap_port, self.email_addr, self.password)
+        session, msg = imap_pool.acquire(key, self.imap_server, self._connect_new_imap)
+        if not session:
+            return False, msg
+        self._session = session
+        self.connection = session.conn
+        return True, msg
+
+    def _connect_new_imap(self):
+        """新建连接：服务器熔断中直接失败，限流时退避重试"""
+        return host_breaker.call(
+            f'{self.imap_server}:{self.imap_port}',
+            lambda: rate_controller.run_imap(self._open_imap, self.imap_server, self.tenant_key())
+        )
+
+    def _open_imap(self):
+        """新建 IMAP 连接并登录（供连接池调用）"""
+        connection = CompressedIMAP4_SSL(self.imap_server, self.imap_port)
+        connection.login(self.email_addr, self.password)
+        self._refresh_capabilities(connection)
+        # ENABLE 只允许在未选择文件夹时发送，连接池中的会话之后多半已选中文件夹，所以在登录后立即开启
+        if 'CONDSTORE' in connection.capabilities and 'ENABLE' in connection.capabilities:
+            try:
+                connection.enable('CONDSTORE')
+            except imaplib.IMAP4.error:
+                pass
+        # 服务器支持时压缩传输（邮件头列表和同步数据压缩率很高）
+        connection.enable_compression()
+        return connection
+
+    def _refresh_capabilities(self, connection):
+        """登录后的能力列表（登录前的 CAPABILITY 往往不含 CONDSTORE/MOVE 等扩展）
+        优先使用 LOGIN 响应里附带的 [CAPABILITY ...]，其次用能力档案，都没有时才发一次 CAPABILITY
+        """
+        data = connection.untagged_responses.pop('CAPABILITY', None)
+        if data and data[-1]:
+            caps = data[-1].decode('ascii', errors='ignore').upper().split()
+        elif self.get_profile()['capabilities']:
+            caps = self.get_profile()['capabilities']
+        else:
+            try:
+                status, data = connection.capability()
+                caps = data[-1].decode('ascii', errors='ignore').upper().split() if status == 'OK' else []
+            except imaplib.IMAP4.error:
+                caps = []
+        if caps:
+            connection.capabilities = tuple(caps)
+            self.update_profile(capabilities=sorted(caps))
+
+    def select_folder(self, folder, readonly=False, force=False):
+        """选择文件夹，会话已选中同一文件夹时跳过 SELECT
+        force: 强制重新 SELECT（需要读取 UIDVALIDITY 等响应时）
+        """
+        session = self._session
+        if session and not force and session.selected == (folder, readonly):
+            return 'OK', [b'']
+        if session:
+            session.selected = None
+        status, data = self.connection.select(self._imap_mailbox(folder), readonly=readonly)
+        if session and status == 'OK':
+            session.selected = (folder, readonly)
+            # 只读取不取出，同步时还要从响应中读 UIDVALIDITY
+            session.uidvalidity = self._response_int(self.connection.untagged_responses.get('UIDVALIDITY'))
+        return status, data
+
+    @staticmethod
+    def _response_int(data):
+        try:
+            return int(data[-1]) if data and data[-1] is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _selected_folder(self):
+        """当前会话选中的文件夹和 UIDVALIDITY，未选中时为 (None, None)"""
+        session = self._session
+        if session and session.selected:
+            return session.selected[0], session.uidvalidity
+        return None, None
+
+    def _drop_broken_session(self, error):
+        """连接已断开（abort/socket 错误）时丢弃会话，下次透明重新登录"""
+        if isinstance(error, (imaplib.IMAP4.abort, OSError)):
+            self.disconnect(discard=True)
+
+    def disconnect(self, discard=False):
+        """归还连接到连接池
+        discard: 连接可能已损坏时直接登出而不复用
+        """
+        if self._session:
+            imap_pool.release(self._session, discard=discard)
+            self._session = None
+            self.connection = None
+        elif self.connection:
             try:
                 self.connection.logout()
             except:
@@ -234,19 +768,280 @@ class EmailClient:
                 mapping = self.FOLDER_MAP['imap_163']
             else:
                 mapping = self.FOLDER_MAP['imap']
-            return mapping.get(folder_key, folder_key)
+            # 能力档案里记录的实际文件夹名优先
+            folder_map = self.get_profile()['folder_map']
+            return folder_map.get(folder_key) or mapping.get(folder_key, folder_key)
+
+    def has_folder(self, folder_key):
+        """文件夹是否存在（发现过文件夹且服务器上没有时为 False，未发现时按存在处理）"""
+        folder_map = self.get_profile()['folder_map']
+        return folder_key not in folder_map or folder_map[folder_key] is not None
+
+    # SPECIAL-USE（RFC 6154）和 Gmail XLIST 属性 -> 文件夹键
+    SPECIAL_USE = {
+        '\\JUNK': 'junk', '\\SPAM': 'junk',
+        '\\SENT': 'sent', '\\DRAFTS': 'drafts', '\\TRASH': 'deleted',
+    }
+    # 服务器没有返回 SPECIAL-USE 属性时按名称识别
+    SPECIAL_NAMES = {
+        'junk': ('junk', 'junk e-mail', 'junk email', 'spam', 'bulk mail', '垃圾邮件', '垃圾箱'),
+        'sent': ('sent', 'sent items', 'sent messages', 'sent mail', '已发送', '已发送邮件'),
+        'drafts': ('drafts', 'draft', '草稿箱', '草稿'),
+        'deleted': ('trash', 'deleted', 'deleted items', 'deleted messages', '已删除', '已删除邮件'),
+    }
+    SPECIAL_ORDER = ('inbox', 'junk', 'sent', 'drafts', 'deleted')
+    # 逐个 STATUS 时最多统计的文件夹数
+    MAX_STATUS_FOLDERS = 30
+
+    def get_folders(self, refresh=False):
+        """获取文件夹列表，优先使用缓存
+        返回: ([{'folder', 'name', 'special', 'unread', 'total'}, ...], msg)，失败时为 None
+            folder 为程序内使用的键：特殊文件夹为 inbox/junk/...，其他为服务器文件夹名或 Graph ID
+        """
+        if not refresh and self.db_manager and self.account_id:
+            folders = self.db_manager.get_account_folders(self.account_id)
+            if folders:
+                return folders, "缓存"
+        return self.discover_folders()
+
+    def discover_folders(self):
+        """从服务器发现文件夹（IMAP LIST SPECIAL-USE / XLIST，Graph mailFolders）并缓存
+        同时更新能力档案中的文件夹映射，服务器上不存在的特殊文件夹记为 None
+        """
+        if self.use_graph_api():
+            folders, msg = self._discover_folders_graph()
+        else:
+            folders, msg = self._discover_folders_imap()
+        if folders is None:
+            return None, msg
+
+        if not self.use_graph_api():
+            found = {f['special']: f['server_name'] for f in folders if f['special']}
+            self.update_profile(folder_map={key: found.get(key) for key in self.SPECIAL_ORDER})
+        folders = [{k: v for k, v in f.items() if k != 'server_name'} for f in folders]
+        if self.db_manager and self.account_id:
+            try:
+                self.db_manager.save_account_folders(self.account_id, folders)
+            except Exception as e:
+                print(f"保存文件夹列表失败: {e}")
+        return folders, msg
+
+    def _discover_folders_imap(self):
+        success, msg = self.connect_imap()
+        if not success:
+            return None, msg
+        try:
+            conn = self.connection
+            list_status = self.has_capability('LIST-STATUS')
+            if self.has_capability('SPECIAL-USE') or not self.has_capability('XLIST'):
+                options = []
+                if self.has_capability('SPECIAL-USE'):
+                    options.append('SPECIAL-USE')
+                if list_status:
+                    options.append('STATUS (MESSAGES UNSEEN)')
+                pattern = '"*"' + (f' RETURN ({" ".join(options)})' if options else '')
+                status, data = conn.list('""', pattern)
+            else:
+                # Gmail 旧接口，属性为 \Spam / \Trash 等
+                imaplib.Commands.setdefault('XLIST', ('AUTH', 'SELECTED'))
+                status, data = conn._simple_command('XLIST', '""', '"*"')
+                status, data = conn._untagged_response(status, data, 'XLIST')
+                list_status = False
+            if status != 'OK':
+                return None, "获取文件夹列表失败"
+
+            statuses = parse_status_response(conn.untagged_responses.pop('STATUS', [])) if list_status else {}
+            folders = self._classify_imap_folders(parse_list_response(data))
+            if not list_status:
+                # 不支持 LIST-STATUS 时逐个 STATUS
+                for f in folders[:self.MAX_STATUS_FOLDERS]:
+                    status, data = conn.status(self._imap_mailbox(f['server_name']), '(MESSAGES UNSEEN)')
+                    if status == 'OK':
+                        statuses.update(parse_status_response(data))
+            for f in folders:
+                counts = statuses.get(f['server_name'], {})
+                f['unread'] = counts.get('UNSEEN')
+                f['total'] = counts.get('MESSAGES')
+            return folders, "获取成功"
+        except Exception as e:
+            self._drop_broken_session(e)
+            return None, f"获取文件夹列表失败: {str(e)}"
+        finally:
+            self.disconnect()
+
+    def _classify_imap_folders(self, entries):
+        """识别特殊文件夹并排序：收件箱、垃圾邮件、已发送、草稿、已删除，其余按名称"""
+        folders, by_special = [], {}
+        for attrs, delimiter, name in entries:
+            upper_attrs = {a.upper() for a in attrs}
+            if '\\NOSELECT' in upper_attrs or '\\NONEXISTENT' in upper_attrs:
+                continue
+            display = decode_imap_utf7(name)
+            if name.upper() == 'INBOX' or '\\INBOX' in upper_attrs:
+                special = 'inbox'
+            else:
+                special = next((self.SPECIAL_USE[a] for a in upper_attrs if a in self.SPECIAL_USE), None)
+            entry = {'folder': name, 'server_name': name, 'name': display, 'special': None}
+            if special and special not in by_special:
+                by_special[special] = entry
+            folders.append(entry)
+
+        # 没有属性标记的特殊文件夹按名称识别
+        for key, names in self.SPECIAL_NAMES.items():
+            if key in by_special:
+                continue
+            for entry in folders:
+                leaf = entry['name'].rsplit('/', 1)[-1].rsplit('.', 1)[-1].lower()
+                if entry not in by_special.values() and leaf in names:
+                    by_special[key] = entry
+                    break
+
+        for key, entry in by_special.items():
+            entry['special'] = key
+            entry['folder'] = key
+        specials = [by_special[key] for key in self.SPECIAL_ORDER if key in by_special]
+        others = sorted((f for f in folders if not f['special']), key=lambda f: f['name'].lower())
+        return specials + others
+
+    def _discover_folders_graph(self):
+        token, msg = self.get_oauth2_access_token()
+        if not token:
+            return None, msg
+        headers = {'Authorization': f'Bearer {token}'}
+        well_known = self.FOLDER_MAP['outlook' if self._api_type == 'outlook' else 'graph']
+        try:
+            if self._api_type == 'outlook':
+                base = 'https://outlook.office.com/api/v2.0/me/mailfolders'
+                resp = self._request('GET', base, headers=headers, timeout=30, params={
+                    '$select': 'Id,DisplayName,UnreadItemCount,TotalItemCount', '$top': 100
+                })
+                if resp.status_code != 200:
+                    return None, f"API 错误: {resp.status_code}"
+                listed = resp.json().get('value', [])
+                # Outlook REST 没有 JSON 批量接口，逐个查询特殊文件夹 ID
+                special_ids = {}
+                for key, name in well_known.items():
+                    r = self._request('GET', f'{base}/{name}', headers=headers, params={'$select': 'Id'}, timeout=30)
+                    if r.status_code == 200:
+                        special_ids[r.json().get('Id')] = key
+                fields = ('Id', 'DisplayName', 'UnreadItemCount', 'TotalItemCount')
+            else:
+                # 文件夹列表和各特殊文件夹 ID 合并为一次 $batch 请求
+                select = '$select=id,displayName,unreadItemCount,totalItemCount'
+                requests_ = [{'id': 'list', 'method': 'GET', 'url': f'/me/mailFolders?{select}&$top=100'}]
+                requests_ += [{'id': key, 'method': 'GET', 'url': f'/me/mailFolders/{name}?$select=id'}
+                              for key, name in well_known.items()]
+                resp = self._request('POST', 'https://graph.microsoft.com/v1.0/$batch',
+                                     headers=headers, json={'requests': requests_}, timeout=30)
+                if resp.status_code != 200:
+                    return None, f"API 错误: {resp.status_code}"
+                responses = {r.get('id'): r for r in resp.json().get('responses', [])}
+                listing = responses.get('list', {})
+                if listing.get('status') != 200:
+                    return None, f"API 错误: {listing.get('status')}"
+                listed = listing.get('body', {}).get('value', [])
+                special_ids = {
+                    r['body'].get('id'): key for key, r in responses.items()
+                    if key != 'list' and r.get('status') == 200
+                }
+                fields = ('id', 'displayName', 'unreadItemCount', 'totalItemCount')
+        except Exception as e:
+            return None, f"获取文件夹列表失败: {str(e)}"
+
+        id_field, name_field, unread_field, total_field = fields
+        folders = []
+        for item in listed:
+            special = special_ids.get(item.get(id_field))
+            folders.append({
+                'folder': special or item.get(id_field),
+                'name': item.get(name_field, ''),
+                'special': special,
+                'unread': item.get(unread_field),
+                'total': item.get(total_field),
+            })
+        order = {key: i for i, key in enumerate(self.SPECIAL_ORDER)}
+        folders.sort(key=lambda f: (order.get(f['special'], len(order)), f['name'].lower()))
+        return folders, "获取成功"
+
+    def folder_counts(self, folders=('inbox',)):
+        """获取文件夹的未读数和总数，不下载邮件（IMAP STATUS，Graph mailFolders）
+        返回: ({文件夹键: {'unread', 'total', 'uidnext'}}, msg)，失败时为 None
+            uidnext 只有 IMAP 有；服务器上不存在的文件夹不在结果中
+        """
+        if self.use_graph_api():
+            token, msg = self.get_oauth2_access_token()
+            if not token:
+                return None, msg
+            return self._folder_counts_graph(token, folders)
+
+        success, msg = self.connect_imap()
+        if not success:
+            return None, msg
+        try:
+            return self._folder_counts_imap(folders), "获取成功"
+        except Exception as e:
+            self._drop_broken_session(e)
+            return None, f"获取文件夹计数失败: {str(e)}"
+        finally:
+            self.disconnect()
     
-    def fetch_emails(self, folder='inbox', limit=50):
+    def _folder_counts_imap(self, folders):
+        """在已登录的连接上逐个文件夹 STATUS，不影响当前选中的文件夹"""
+        counts = {}
+        for folder in folders:
+            if not self.has_folder(folder):
+                continue
+            mailbox = self._imap_mailbox(self.get_folder_name(folder))
+            status, data = self.connection.status(mailbox, '(MESSAGES UNSEEN UIDNEXT)')
+            if status != 'OK':
+                continue
+            for values in parse_status_response(data).values():
+                counts[folder] = {
+                    'unread': values.get('UNSEEN'),
+                    'total': values.get('MESSAGES'),
+                    'uidnext': values.get('UIDNEXT'),
+                }
+        return counts
+
+    def _folder_counts_graph(self, token, folders):
+        headers = {'Authorization': f'Bearer {token}'}
+        if self._api_type == 'outlook':
+            base = 'https://outlook.office.com/api/v2.0/me/mailfolders'
+            unread_field, total_field = 'UnreadItemCount', 'TotalItemCount'
+        else:
+            base = 'https://graph.microsoft.com/v1.0/me/mailFolders'
+            unread_field, total_field = 'unreadItemCount', 'totalItemCount'
+
+        counts = {}
+        try:
+            for folder in folders:
+                resp = self._request('GET', f'{base}/{self.get_folder_name(folder)}', headers=headers,
+                                     params={'$select': f'{unread_field},{total_field}'}, timeout=10)
+                if resp.status_code == 404:
+                    continue
+                if resp.status_code != 200:
+                    return None, f"API 错误: {resp.status_code}"
+                data = resp.json()
+                counts[folder] = {'unread': data.get(unread_field), 'total': data.get(total_field), 'uidnext': None}
+        except Exception as e:
+            return None, f"网络错误: {e}"
+        return counts, "获取成功"
+
+    # 列表模式只获取这些头字段
+    LIST_HEADER_FIELDS = 'FROM SUBJECT DATE'
+
+    def fetch_emails(self, folder='inbox', limit=50, headers_only=False):
         """获取邮件列表
         folder: inbox, junk, sent, drafts, deleted
+        headers_only: 只获取发件人/主题/时间/标记，正文通过 fetch_email_body 按需获取
         """
         if self.use_graph_api():
-            return self.fetch_emails_graph(folder, limit)
+            return self.fetch_emails_graph(folder, limit, headers_only)
         else:
             actual_folder = self.get_folder_name(folder)
-            return self.fetch_emails_imap(actual_folder, limit)
+            return self.fetch_emails_imap(actual_folder, limit, headers_only)
     
-    def fetch_emails_graph(self, folder='inbox', limit=50):
+    def fetch_emails_graph(self, folder='inbox', limit=50, headers_only=False):
         """使用 Graph API 或 Outlook REST API 获取邮件"""
         token, msg = self.get_oauth2_access_token()
         if not token:
@@ -257,181 +1052,408 @@ class EmailClient:
             'Content-Type': 'application/json'
         }
         
+        url, params = self._graph_list_request(folder, limit, headers_only)
+
+        try:
+            response = self._request('GET', url, headers=headers, params=params, timeout=30)
+            if response.status_code == 200:
+                data = response.json()
+                emails = [self._parse_graph_message(msg, headers_only) for msg in data.get('value', [])]
+                return emails, "获取成功"
+            else:
+                return [], f"API 错误: {response.status_code} - {response.text[:200]}"
+        except Exception as e:
+            return [], f"网络错误: {str(e)}"
+
+    # 附件元数据字段（列表 $expand 和附件列表请求共用）
+    GRAPH_ATTACHMENT_FIELDS = 'id,name,size,contentType,isInline'
+
+    def _graph_list_request(self, folder, limit, headers_only=False):
+        """构建 Graph/Outlook 邮件列表请求的 URL 和参数"""
         # 获取实际文件夹名称
         folder_name = self.get_folder_name(folder)
         
         # 根据 API 类型选择不同的端点
         if self._api_type == 'outlook':
             url = f'https://outlook.office.com/api/v2.0/me/mailfolders/{folder_name}/messages'
+            select = 'Id,Subject,From,ReceivedDateTime,BodyPreview,IsRead,HasAttachments'
             params = {
                 '$top': limit,
                 '$orderby': 'ReceivedDateTime desc',
-                '$select': 'Id,Subject,From,ReceivedDateTime,BodyPreview,Body,IsRead,HasAttachments'
+                '$select': select if headers_only else select + ',Body'
             }
         else:
             url = f'https://graph.microsoft.com/v1.0/me/mailFolders/{folder_name}/messages'
+            select = 'id,subject,from,receivedDateTime,bodyPreview,isRead,hasAttachments'
             params = {
                 '$top': limit,
                 '$orderby': 'receivedDateTime desc',
-                '$select': 'id,subject,from,receivedDateTime,bodyPreview,body,isRead,hasAttachments'
+                '$select': select if headers_only else select + ',body',
+                # 附件元数据随列表返回（不含 contentBytes），打开邮件时不必再请求附件列表
+                '$expand': f'attachments($select={self.GRAPH_ATTACHMENT_FIELDS})'
             }
+        return url, params
+
+    def fetch_emails_page(self, folder='inbox', cursor=None, page_size=50):
+        """分页获取邮件列表（只含头信息）
+        cursor: 上一页返回的游标，None 表示第一页
+            IMAP: 'uid:<n>' 表示 UID 小于 n 的邮件
+            Graph: @odata.nextLink，或 'skip:<n>' 表示跳过前 n 封
+        返回: (emails, next_cursor, msg)，没有更多邮件时 next_cursor 为 None
+        """
+        if self.use_graph_api():
+            return self.fetch_emails_page_graph(folder, cursor, page_size)
+        else:
+            actual_folder = self.get_folder_name(folder)
+            return self.fetch_emails_page_imap(actual_folder, cursor, page_size)
+
+    def page_cursor_after(self, emails):
+        """根据已显示的邮件生成下一页游标（首页来自本地同步表时使用）
+        IMAP 游标为最小 UID，emails 必须是 UID 最大的一批（get_cached_emails(by_uid=True)）
+        """
+        if not emails:
+            return None
+        if self.use_graph_api():
+            return f'skip:{len(emails)}'
+        try:
+            return f"uid:{min(int(e['uid']) for e in emails)}"
+        except (KeyError, ValueError):
+            return None
+
+    def fetch_emails_page_graph(self, folder='inbox', cursor=None, page_size=50):
+        """使用 Graph API 分页获取邮件（跟随 @odata.nextLink）"""
+        token, msg = self.get_oauth2_access_token()
+        if not token:
+            return [], None, msg
+
+        headers = {'Authorization': f'Bearer {token}'}
+        if cursor and cursor.startswith('http'):
+            url, params = cursor, None
+        else:
+            url, params = self._graph_list_request(folder, page_size, headers_only=True)
+            if cursor and cursor.startswith('skip:'):
+                params['$skip'] = int(cursor[5:])
         
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=30)
+            response = self._request('GET', url, headers=headers, params=params, timeout=30)
             if response.status_code == 200:
                 data = response.json()
-                emails = []
-                for msg in data.get('value', []):
-                    # Outlook API 和 Graph API 字段名大小写不同
-                    if self._api_type == 'outlook':
-                        from_info = msg.get('From', {}).get('EmailAddress', {})
-                        sender = from_info.get('Name', '') or from_info.get('Address', '')
-                        date_str = msg.get('ReceivedDateTime', '')
-                        subject = msg.get('Subject', '(无主题)')
-                        body = msg.get('Body', {}).get('Content', '') or msg.get('BodyPreview', '')
-                        uid = msg.get('Id', '')
-                    else:
-                        from_info = msg.get('from', {}).get('emailAddress', {})
-                        sender = from_info.get('name', '') or from_info.get('address', '')
-                        date_str = msg.get('receivedDateTime', '')
-                        subject = msg.get('subject', '(无主题)')
-                        body = msg.get('body', {}).get('content', '') or msg.get('bodyPreview', '')
-                        uid = msg.get('id', '')
-                    
-                    # 解析时间
-                    try:
-                        date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    except:
-                        date = None
-                    
-                    emails.append({
-                        'uid': uid,
-                        'subject': subject,
-                        'sender': sender,
-                        'sender_email': from_info.get('address', '') if self._api_type != 'outlook' else from_info.get('Address', ''),
-                        'date': date,
-                        'body': body,
-                        'is_read': msg.get('isRead', True) if self._api_type != 'outlook' else msg.get('IsRead', True),
-                        'has_attachments': msg.get('hasAttachments', False) if self._api_type != 'outlook' else msg.get('HasAttachments', False)
-                    })
-                return emails, "获取成功"
+                emails = [self._parse_graph_message(msg, headers_only=True) for msg in data.get('value', [])]
+                return emails, data.get('@odata.nextLink'), "获取成功"
             else:
-                return [], f"API 错误: {response.status_code} - {response.text[:200]}"
+                return [], None, f"API 错误: {response.status_code} - {response.text[:200]}"
         except Exception as e:
-            return [], f"网络错误: {str(e)}"
+            return [], None, f"网络错误: {str(e)}"
     
-    def fetch_emails_imap(self, folder='INBOX', limit=50):
-        """使用 IMAP 获取邮件"""
+    def fetch_emails_page_imap(self, folder='INBOX', cursor=None, page_size=50):
+        """使用 IMAP 按 UID 窗口分页获取邮件"""
+        success, msg = self.connect_imap()
+        if not success:
+            return [], None, msg
+
+        try:
+            select_status, select_data = self.select_folder(folder)
+            if select_status != 'OK':
+                return [], None, f"无法打开文件夹 {folder}: {select_data}"
+
+            before = int(cursor[4:]) if cursor and cursor.startswith('uid:') else None
+            if before is not None and before <= 1:
+                return [], None, "获取成功"
+            criteria = f'UID 1:{before - 1}' if before else 'ALL'
+            status, messages = self.connection.uid('SEARCH', None, criteria)
+            if status != 'OK':
+                return [], None, "获取邮件失败"
+
+            email_ids = [u for u in messages[0].split() if before is None or int(u) < before]
+            page = email_ids[-page_size:]
+            if not page:
+                return [], None, "获取成功"
+
+            emails = self._fetch_headers_imap(page)
+            next_cursor = f'uid:{int(page[0])}' if len(email_ids) > len(page) else None
+            return emails, next_cursor, "获取成功"
+        except Exception as e:
+            self._drop_broken_session(e)
+            return [], None, f"获取邮件失败: {str(e)}"
+        finally:
+            self.disconnect()
+
+    def _parse_graph_message(self, msg, headers_only=False):
+        """把 Graph/Outlook API 返回的邮件转换为列表项"""
+        # Outlook API 和 Graph API 字段名大小写不同
+        if self._api_type == 'outlook':
+            from_info = (msg.get('From') or {}).get('EmailAddress', {})
+            sender = from_info.get('Name', '') or from_info.get('Address', '')
+            date_str = msg.get('ReceivedDateTime', '')
+            subject = msg.get('Subject', '(无主题)')
+            preview = msg.get('BodyPreview', '')
+            body = (msg.get('Body') or {}).get('Content', '') or preview
+            uid = msg.get('Id', '')
+        else:
+            from_info = (msg.get('from') or {}).get('emailAddress', {})
+            sender = from_info.get('name', '') or from_info.get('address', '')
+            date_str = msg.get('receivedDateTime', '')
+            subject = msg.get('subject', '(无主题)')
+            preview = msg.get('bodyPreview', '')
+            body = (msg.get('body') or {}).get('content', '') or preview
+            uid = msg.get('id', '')
+
+        # 解析时间
+        try:
+            date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        except:
+            date = None
+
+        email_data = {
+            'uid': uid,
+            'subject': subject,
+            'sender': sender,
+            'sender_email': from_info.get('address', '') if self._api_type != 'outlook' else from_info.get('Address', ''),
+            'date': date,
+            'body': '' if headers_only else body,
+            'body_loaded': not headers_only,
+            'preview': preview,
+            'is_read': msg.get('isRead', True) if self._api_type != 'outlook' else msg.get('IsRead', True),
+            'has_attachments': msg.get('hasAttachments', False) if self._api_type != 'outlook' else msg.get('HasAttachments', False)
+        }
+        # 列表请求 $expand 了附件时一并带上附件元数据
+        if 'attachments' in msg:
+            email_data['attachments'] = [self._parse_graph_attachment(att, uid) for att in msg['attachments'] or []]
+        return email_data
+
+    def fetch_emails_imap(self, folder='INBOX', limit=50, headers_only=False):
+        """使用 IMAP 获取邮件（使用 UID，ID 在会话之间保持稳定）
+        只取邮件头，正文由 fetch_email_body 按需获取并存入本地（headers_only 只对 Graph 有意义）
+        """
         success, msg = self.connect_imap()
         if not success:
             return [], msg
         
         try:
             # 选择文件夹并检查返回状态
-            select_status, select_data = self.connection.select(folder)
+            select_status, select_data = self.select_folder(folder)
             if select_status != 'OK':
                 return [], f"无法打开文件夹 {folder}: {select_data}"
             
-            status, messages = self.connection.search(None, 'ALL')
+            status, messages = self.connection.uid('SEARCH', None, 'ALL')
             
             if status != 'OK':
                 return [], "获取邮件失败"
             
             email_ids = messages[0].split()
             email_ids = email_ids[-limit:] if len(email_ids) > limit else email_ids
-            email_ids.reverse()
+            if not email_ids:
+                return [], "获取成功"
             
-            emails = []
-            for eid in email_ids:
-                status, msg_data = self.connection.fetch(eid, '(RFC822 FLAGS)')
-                if status == 'OK':
-                    raw_email = msg_data[0][1]
-                    email_message = email.message_from_bytes(raw_email)
-                    
-                    # 检查是否已读
-                    flags = msg_data[0][0].decode() if isinstance(msg_data[0][0], bytes) else str(msg_data[0][0])
-                    is_read = '\\Seen' in flags
-                    
-                    subject = self.decode_str(email_message.get('Subject', ''))
-                    sender = self.decode_str(email_message.get('From', ''))
-                    date_str = email_message.get('Date', '')
-                    
-                    try:
-                        date = parsedate_to_datetime(date_str)
-                    except:
-                        date = None
-                    
-                    body = self.get_email_body(email_message)
-                    
-                    emails.append({
-                        'uid': eid.decode() if isinstance(eid, bytes) else str(eid),
-                        'subject': subject,
-                        'sender': sender,
-                        'sender_email': self.extract_email_address(sender),
-                        'date': date,
-                        'body': body,
-                        'is_read': is_read,
-                        'has_attachments': self.has_attachments(email_message)
-                    })
-            
-            return emails, "获取成功"
+            return self._fetch_headers_imap(email_ids), "获取成功"
         except Exception as e:
+            self._drop_broken_session(e)
             return [], f"获取邮件失败: {str(e)}"
+        finally:
+            self.disconnect()
     
-    def decode_str(self, s):
-        if not s:
-            return ''
-        decoded_parts = decode_header(s)
-        result = []
-        for part, charset in decoded_parts:
-            if isinstance(part, bytes):
-                try:
-                    result.append(part.decode(charset or 'utf-8', errors='ignore'))
-                except:
-                    result.append(part.decode('utf-8', errors='ignore'))
-            else:
-                result.append(part)
-        return ''.join(result)
-    
-    def get_email_body(self, msg):
-        body = ''
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                if content_type == 'text/plain':
-                    try:
-                        charset = part.get_content_charset() or 'utf-8'
-                        body = part.get_payload(decode=True).decode(charset, errors='ignore')
-                        break
-                    except:
-                        pass
+    def _fetch_headers_imap(self, email_ids, connection=None):
+        """一次 UID FETCH 获取一批邮件的头信息、标记、大小和 BODYSTRUCTURE
+        connection: 使用指定连接（如 IDLE 监听连接），默认为当前会话
+        """
+        uid_set = b','.join(e if isinstance(e, bytes) else str(e).encode() for e in email_ids)
+        query = f'(UID FLAGS RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({self.LIST_HEADER_FIELDS})])'
+        status, msg_data = (connection or self.connection).uid('FETCH', uid_set, query)
+        if status != 'OK':
+            return []
+
+        emails = []
+        for _, attrs in parse_fetch_response(msg_data):
+            if 'UID' not in attrs:
+                continue
+            summary = self._build_imap_summary(attrs['UID'], attrs, self._parse_fetched_headers(attrs))
+            parts = parse_bodystructure(attrs.get('BODYSTRUCTURE'))
+            # 附件元数据来自同一次 FETCH 的 BODYSTRUCTURE，打开邮件时不必再取
+            summary['attachments'] = self._attachments_from_parts(parts, summary['uid'])
+            summary['has_attachments'] = bool(summary['attachments'])
+            emails.append(summary)
+
+        # 按 UID 倒序（新邮件在前）
+        emails.sort(key=lambda e: int(e['uid']), reverse=True)
+        return emails
+
+    @staticmethod
+    def _parse_fetched_headers(attrs):
+        """解析 FETCH 返回的邮件头（只有几个字段，比交给解析进程池传输还快，在本线程解析）"""
+        return mime_parser.parse_headers(get_fetch_item(attrs, 'BODY[HEADER') or b'')
+
+    def _blob_store(self):
+        """本地原始邮件/附件存储，没有关联数据库账号时为 None"""
+        if self.db_manager and self.account_id:
+            return get_blob_store(self.db_manager)
+        return None
+
+    def _put_blob(self, store, data):
+        """存入本地存储，返回摘要；磁盘写入失败时返回 None，不影响邮件获取"""
+        if store is None:
+            return None
+        try:
+            return store.put(data)
+        except OSError:
+            return None
+
+    def _build_imap_summary(self, uid, attrs, fields):
+        """根据 FETCH 数据和解析出的头字段（mime_parser.parse_headers）构建列表项"""
+        return {
+            'uid': uid.decode() if isinstance(uid, bytes) else str(uid),
+            'subject': fields['subject'],
+            'sender': fields['sender'],
+            'sender_email': fields['sender_email'],
+            'date': fields['date'],
+            'body': '',
+            'body_loaded': False,
+            'preview': '',
+            'size': attrs.get('RFC822.SIZE', 0),
+            'is_read': '\\Seen' in parse_flags(attrs.get('FLAGS')),
+            'has_attachments': False
+        }
+
+    def fetch_email_body(self, email_id, folder='inbox'):
+        """按需获取单封邮件正文
+        返回: (body, msg)
+        """
+        if self.use_graph_api():
+            return self.fetch_email_body_graph(email_id)
         else:
-            try:
-                charset = msg.get_content_charset() or 'utf-8'
-                body = msg.get_payload(decode=True).decode(charset, errors='ignore')
-            except:
-                pass
-        return body[:5000]
+            actual_folder = self.get_folder_name(folder)
+            return self.fetch_email_body_imap(email_id, actual_folder)
+
+    def fetch_email_body_graph(self, email_id):
+        """使用 Graph API 获取单封邮件正文"""
+        token, msg = self.get_oauth2_access_token()
+        if not token:
+            return None, msg
+
+        headers = {'Authorization': f'Bearer {token}'}
+
+        if self._api_type == 'outlook':
+            url = f'https://outlook.office.com/api/v2.0/me/messages/{email_id}'
+            params = {'$select': 'Body'}
+        else:
+            url = f'https://graph.microsoft.com/v1.0/me/messages/{email_id}'
+            params = {'$select': 'body'}
+
+        try:
+            response = self._request('GET', url, headers=headers, params=params, timeout=30)
+            if response.status_code == 200:
+                data = response.json()
+                if self._api_type == 'outlook':
+                    body = data.get('Body', {}).get('Content', '')
+                else:
+                    body = data.get('body', {}).get('content', '')
+                return body, "获取成功"
+            else:
+                return None, f"获取正文失败: {response.status_code}"
+        except Exception as e:
+            return None, f"网络错误: {str(e)}"
+
+    # 不超过这个大小的邮件查看正文时整封下载并存入本地，之后查看/检测不再下载；
+    # 更大的邮件多带大附件，只取正文部件
+    MESSAGE_BLOB_MAX_BYTES = 2 * 1024 * 1024
+
+    def fetch_email_body_imap(self, email_id, folder='INBOX'):
+        """使用 IMAP 获取单封邮件正文（先取 BODYSTRUCTURE 和大小）
+        本地存储中已有原始邮件时直接解析，不连接服务器；
+        小邮件整封下载存入本地后解析，大邮件只取正文部件
+        """
+        body = self._cached_message_body(email_id, folder)
+        if body is not None:
+            return body, "获取成功"
+
+        success, msg = self.connect_imap()
+        if not success:
+            return None, msg
+
+        try:
+            self.select_folder(folder)
+            eid = email_id.encode() if isinstance(email_id, str) else email_id
+            status, msg_data = self.connection.uid('FETCH', eid, '(RFC822.SIZE BODYSTRUCTURE)')
+            if status != 'OK':
+                return None, "获取邮件失败"
+
+            attrs = next((a for _, a in parse_fetch_response(msg_data) if 'BODYSTRUCTURE' in a), {})
+            store = self._blob_store()
+            if store is not None and 0 < attrs.get('RFC822.SIZE', 0) <= self.MESSAGE_BLOB_MAX_BYTES:
+                body = self._fetch_message_blob_imap(store, eid, folder)
+                if body is not None:
+                    return body, "获取成功"
+
+            text_part = find_text_part(parse_bodystructure(attrs.get('BODYSTRUCTURE')))
+            if not text_part:
+                return '', "获取成功"
+
+            section = text_part['section']
+            status, msg_data = self.connection.uid('FETCH', eid, f'(BODY.PEEK[{section}])')
+            if status != 'OK':
+                return None, "获取正文失败"
+
+            payload = b''
+            for _, attrs in parse_fetch_response(msg_data):
+                payload = get_fetch_item(attrs, 'BODY[') or b''
+                if payload:
+                    break
+
+            body = self.decode_part_payload(
+                payload, text_part['encoding'], text_part['params'].get('charset')
+            )
+            return body, "获取成功"
+        except Exception as e:
+            self._drop_broken_session(e)
+            return None, f"获取正文失败: {str(e)}"
+        finally:
+            self.disconnect()
+
+    def _fetch_message_blob_imap(self, store, eid, folder):
+        """整封下载原始邮件存入本地并解析正文，下载失败时返回 None"""
+        status, msg_data = self.connection.uid('FETCH', eid, '(BODY.PEEK[])')
+        if status != 'OK':
+            return None
+        raw = None
+        for _, attrs in parse_fetch_response(msg_data):
+            raw = get_fetch_item(attrs, 'BODY[')
+            if raw is not None:
+                break
+        if raw is None:
+            return None
+        digest = self._put_blob(store, raw)
+        if digest:
+            _, uidvalidity = self._selected_folder()
+            self.db_manager.save_message_blobs(self.account_id, folder, uidvalidity,
+                                               {eid.decode(): (digest, len(raw))})
+        return parse_pool.parse_message(raw, body_limit=None, html_fallback=True)['body']
+
+    def _cached_message_body(self, email_id, folder):
+        """从本地存储的原始邮件中解析正文（内存映射读取），没有缓存时返回 None"""
+        store = self._blob_store()
+        if store is None:
+            return None
+        uid = email_id.decode() if isinstance(email_id, bytes) else str(email_id)
+        digest = self.db_manager.get_message_blob(self.account_id, folder, uid)
+        if not digest:
+            return None
+        return self._parse_message_blobs(store, [digest], None)[0]
+
+    def _parse_message_blobs(self, store, digests, body_limit):
+        """在解析进程池中解析本地存储的原始邮件正文，文件缺失或损坏的为 None"""
+        results = parse_pool.parse_message_files([store.path(d) for d in digests],
+                                                 body_limit=body_limit, html_fallback=True)
+        return [r['body'] if r is not None else None for r in results]
+
+    def decode_part_payload(self, payload, encoding, charset=None):
+        """按传输编码和字符集解码 MIME 部件内容"""
+        return mime_parser.decode_payload(payload, encoding, charset)
+
+    def decode_str(self, s):
+        return mime_parser.decode_str(s)
     
     def extract_email_address(self, sender_str):
         """从发件人字符串中提取邮箱地址"""
-        import re
-        match = re.search(r'<([^>]+)>', sender_str)
-        if match:
-            return match.group(1)
-        # 如果没有尖括号，可能整个字符串就是邮箱
-        if '@' in sender_str:
-            return sender_str.strip()
-        return ''
-    
-    def has_attachments(self, msg):
-        """检查邮件是否有附件"""
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_disposition = part.get('Content-Disposition', '')
-                if 'attachment' in content_disposition:
-                    return True
-        return False
+        return mime_parser.extract_email_address(sender_str)
     
     def mark_as_read(self, email_id, folder='inbox', is_read=True):
         """标记邮件为已读/未读"""
@@ -460,7 +1482,7 @@ class EmailClient:
             data = {'isRead': is_read}
         
         try:
-            response = requests.patch(url, headers=headers, json=data, timeout=30)
+            response = self._request('PATCH', url, headers=headers, json=data, timeout=30)
             if response.status_code == 200:
                 return True, "标记成功"
             else:
@@ -475,31 +1497,33 @@ class EmailClient:
             return False, msg
         
         try:
-            self.connection.select(folder)
+            self.select_folder(folder)
             flag_action = '+FLAGS' if is_read else '-FLAGS'
-            eid = email_id.encode() if isinstance(email_id, str) else email_id
-            self.connection.store(eid, flag_action, '\\Seen')
+            if not self._store_flags_imap([email_id], flag_action, '\\Seen'):
+                return False, "标记失败: 邮件不存在"
             return True, "标记成功"
         except Exception as e:
+            self._drop_broken_session(e)
             return False, f"标记失败: {str(e)}"
         finally:
             self.disconnect()
     
-    def mark_emails_batch(self, email_ids, folder='inbox', is_read=True, progress_callback=None):
+    def mark_emails_batch(self, email_ids, folder='inbox', is_read=True, progress_callback=None, results=None):
         """批量标记邮件已读/未读（优化性能，复用连接）
         email_ids: 邮件ID列表
         folder: 当前文件夹
         is_read: True=标记已读, False=标记未读
         progress_callback: 进度回调函数 (current, total)
+        results: 传入字典时按邮件ID填入是否成功 {email_id: bool}
         返回: (success_count, fail_count)
         """
         if self.use_graph_api():
-            return self.mark_emails_batch_graph(email_ids, is_read, progress_callback)
+            return self.mark_emails_batch_graph(email_ids, is_read, progress_callback, results)
         else:
             actual_folder = self.get_folder_name(folder)
-            return self.mark_emails_batch_imap(email_ids, actual_folder, is_read, progress_callback)
+            return self.mark_emails_batch_imap(email_ids, actual_folder, is_read, progress_callback, results)
     
-    def mark_emails_batch_graph(self, email_ids, is_read=True, progress_callback=None):
+    def mark_emails_batch_graph(self, email_ids, is_read=True, progress_callback=None, results=None):
         """使用 Graph API 批量标记邮件"""
         token, msg = self.get_oauth2_access_token()
         if not token:
@@ -524,50 +1548,72 @@ class EmailClient:
         for i, email_id in enumerate(email_ids):
             try:
                 url = f'{base_url}/{email_id}'
-                response = requests.patch(url, headers=headers, json=data, timeout=30)
-                if response.status_code == 200:
-                    success_count += 1
-                else:
-                    fail_count += 1
+                response = self._request('PATCH', url, headers=headers, json=data, timeout=30)
+                ok = response.status_code == 200
             except:
-                fail_count += 1
+                ok = False
+            success_count += ok
+            fail_count += not ok
+            if results is not None:
+                results[email_id] = ok
             
             if progress_callback:
                 progress_callback(i + 1, total)
         
         return success_count, fail_count
     
-    def mark_emails_batch_imap(self, email_ids, folder='INBOX', is_read=True, progress_callback=None):
-        """使用 IMAP 批量标记邮件（复用连接）"""
+    def mark_emails_batch_imap(self, email_ids, folder='INBOX', is_read=True, progress_callback=None, results=None):
+        """使用 IMAP 批量标记邮件（UID 压缩为序列集，每块一条 UID STORE）"""
         success, msg = self.connect_imap()
         if not success:
             return 0, len(email_ids)
         
-        success_count = 0
-        fail_count = 0
-        total = len(email_ids)
         flag_action = '+FLAGS' if is_read else '-FLAGS'
-        
         try:
-            self.connection.select(folder)
-            
-            for i, email_id in enumerate(email_ids):
-                try:
-                    eid = email_id.encode() if isinstance(email_id, str) else email_id
-                    self.connection.store(eid, flag_action, '\\Seen')
-                    success_count += 1
-                except:
-                    fail_count += 1
-                
-                if progress_callback:
-                    progress_callback(i + 1, total)
-            
+            self.select_folder(folder)
+            done = self._store_flags_imap(email_ids, flag_action, '\\Seen', progress_callback)
         except Exception as e:
-            return 0, total
+            self._drop_broken_session(e)
+            done = set()
         finally:
             self.disconnect()
-        
-        return success_count, fail_count
+        return self._batch_results(email_ids, done, results)
+
+    # 每条命令的序列集最大长度（字符）
+    UID_SET_MAX_LENGTH = 1000
+
+    def _store_flags_imap(self, email_ids, action, flag, progress_callback=None):
+        """在当前文件夹上按序列集 UID STORE，返回成功的 UID 集合
+        以命令结果为准：标记本来就是目标状态的邮件，服务器通常不返回 FETCH，不能据此判为失败
+        """
+        total = len(email_ids)
+        done = set()
+        processed = 0
+        for uid_set in build_uid_sets(self._numeric_uids(email_ids), self.UID_SET_MAX_LENGTH):
+            chunk = parse_uid_set(uid_set)
+            status, _ = self.connection.uid('STORE', uid_set, action, f'({flag})')
+            if status == 'OK':
+                done.update(chunk)
+            processed += len(chunk)
+            if progress_callback:
+                progress_callback(min(processed, total), total)
+        return done
+
+    @staticmethod
+    def _numeric_uids(email_ids):
+        return [int(e) for e in email_ids if str(e.decode() if isinstance(e, bytes) else e).isdigit()]
+
+    @staticmethod
+    def _batch_results(email_ids, done, results=None):
+        """按服务器确认的 UID 集合统计每个邮件ID的结果，返回 (success_count, fail_count)"""
+        success_count = 0
+        for email_id in email_ids:
+            uid = email_id.decode() if isinstance(email_id, bytes) else str(email_id)
+            ok = uid.isdigit() and int(uid) in done
+            success_count += ok
+            if results is not None:
+                results[email_id] = ok
+        return success_count, len(email_ids) - success_count
     
     def get_attachments(self, email_id, folder='inbox'):
         """获取邮件附件列表"""
@@ -578,7 +1624,7 @@ class EmailClient:
             return self.get_attachments_imap(email_id, actual_folder)
     
     def get_attachments_graph(self, email_id):
-        """使用 Graph API 获取附件列表"""
+        """使用 Graph API 获取附件列表（只取元数据，不含 contentBytes）"""
         token, msg = self.get_oauth2_access_token()
         if not token:
             return [], msg
@@ -587,83 +1633,234 @@ class EmailClient:
         
         if self._api_type == 'outlook':
             url = f'https://outlook.office.com/api/v2.0/me/messages/{email_id}/attachments'
+            params = {'$select': 'Id,Name,Size,ContentType,IsInline'}
         else:
             url = f'https://graph.microsoft.com/v1.0/me/messages/{email_id}/attachments'
+            params = {'$select': self.GRAPH_ATTACHMENT_FIELDS}
         
         try:
-            response = requests.get(url, headers=headers, timeout=30)
+            response = self._request('GET', url, headers=headers, params=params, timeout=30)
             if response.status_code == 200:
                 data = response.json()
-                attachments = []
-                for att in data.get('value', []):
-                    if self._api_type == 'outlook':
-                        attachments.append({
-                            'id': att.get('Id', ''),
-                            'name': att.get('Name', ''),
-                            'size': att.get('Size', 0),
-                            'content_type': att.get('ContentType', ''),
-                            'content_bytes': att.get('ContentBytes', '')
-                        })
-                    else:
-                        attachments.append({
-                            'id': att.get('id', ''),
-                            'name': att.get('name', ''),
-                            'size': att.get('size', 0),
-                            'content_type': att.get('contentType', ''),
-                            'content_bytes': att.get('contentBytes', '')
-                        })
+                attachments = [self._parse_graph_attachment(att, email_id) for att in data.get('value', [])]
                 return attachments, "获取成功"
             else:
                 return [], f"获取附件失败: {response.status_code}"
         except Exception as e:
             return [], f"网络错误: {str(e)}"
     
+    def _parse_graph_attachment(self, att, email_id):
+        """把 Graph/Outlook API 返回的附件转换为附件元数据"""
+        if self._api_type == 'outlook':
+            return {
+                'id': att.get('Id', ''),
+                'message_id': email_id,
+                'name': att.get('Name', ''),
+                'size': att.get('Size', 0),
+                'content_type': att.get('ContentType', ''),
+                'is_inline': att.get('IsInline', False)
+            }
+        return {
+            'id': att.get('id', ''),
+            'message_id': email_id,
+            'name': att.get('name', ''),
+            'size': att.get('size', 0),
+            'content_type': att.get('contentType', ''),
+            'is_inline': att.get('isInline', False)
+        }
+
     def get_attachments_imap(self, email_id, folder='INBOX'):
-        """使用 IMAP 获取附件列表"""
+        """使用 IMAP 获取附件列表（只取 BODYSTRUCTURE，不下载附件内容）"""
         success, msg = self.connect_imap()
         if not success:
             return [], msg
         
         try:
-            self.connection.select(folder)
+            self.select_folder(folder)
             eid = email_id.encode() if isinstance(email_id, str) else email_id
-            status, msg_data = self.connection.fetch(eid, '(RFC822)')
+            status, msg_data = self.connection.uid('FETCH', eid, '(BODYSTRUCTURE)')
             
             if status != 'OK':
                 return [], "获取邮件失败"
             
-            raw_email = msg_data[0][1]
-            email_message = email.message_from_bytes(raw_email)
+            parts = []
+            for _, attrs in parse_fetch_response(msg_data):
+                if 'BODYSTRUCTURE' in attrs:
+                    parts = parse_bodystructure(attrs['BODYSTRUCTURE'])
+                    break
             
-            attachments = []
-            for part in email_message.walk():
-                content_disposition = part.get('Content-Disposition', '')
-                if 'attachment' in content_disposition:
-                    filename = part.get_filename()
-                    if filename:
-                        filename = self.decode_str(filename)
-                        content = part.get_payload(decode=True)
-                        attachments.append({
-                            'id': filename,
-                            'name': filename,
-                            'size': len(content) if content else 0,
-                            'content_type': part.get_content_type(),
-                            'content_bytes': base64.b64encode(content).decode() if content else ''
-                        })
-            
-            return attachments, "获取成功"
+            return self._attachments_from_parts(parts, email_id), "获取成功"
         except Exception as e:
+            self._drop_broken_session(e)
             return [], f"获取附件失败: {str(e)}"
         finally:
             self.disconnect()
     
+    def _attachments_from_parts(self, parts, email_id):
+        """从 BODYSTRUCTURE 部件生成附件元数据"""
+        attachments = []
+        for part in parts:
+            if not is_attachment_part(part):
+                continue
+            # BODYSTRUCTURE 给出的是编码后的大小，base64 约为原始大小的 4/3
+            size = part['size'] * 3 // 4 if part['encoding'] == 'base64' else part['size']
+            attachments.append({
+                'id': part['section'],
+                'message_id': email_id,
+                'name': part['filename'] or f"附件{part['section']}",
+                'size': size,
+                'content_type': f"{part['type']}/{part['subtype']}",
+                'is_inline': part['disposition'] == 'inline',
+                'section': part['section'],
+                'encoding': part['encoding'],
+                'encoded_size': part['size']
+            })
+        return attachments
+
+    # 流式下载每次读取的字节数
+    DOWNLOAD_CHUNK = 1024 * 1024
+
     def download_attachment(self, attachment):
-        """下载附件（返回二进制内容）"""
+        """下载附件（返回二进制内容，仅用于已内联 content_bytes 的附件）"""
         content_bytes = attachment.get('content_bytes', '')
         if content_bytes:
             return base64.b64decode(content_bytes)
         return None
     
+    def download_attachment_to_file(self, attachment, path, folder='inbox', progress_callback=None):
+        """流式下载附件到文件，内存占用与附件大小无关
+        attachment: get_attachments 返回的附件元数据
+        path: 保存路径（先写入 path.part，完成后再重命名）
+        progress_callback: 进度回调函数 (done_bytes, total_bytes)
+        返回: (success, msg)
+        """
+        temp_path = path + '.part'
+        store = self._blob_store()
+        use_graph = self.use_graph_api()
+        actual_folder = '' if use_graph else self.get_folder_name(folder)
+        # Graph 邮件 ID 全局唯一；IMAP 用 文件夹+UID+部件号 定位
+        key = (actual_folder, attachment.get('message_id'),
+               attachment.get('id') if use_graph else attachment.get('section') or attachment.get('id'))
+        try:
+            if store is not None:
+                digest = self.db_manager.get_attachment_blob(self.account_id, *key)
+                if digest and store.has(digest) and store.copy_to(digest, temp_path):
+                    # 已下载过（或其他账号收到过相同附件），直接从本地复制
+                    os.replace(temp_path, path)
+                    if progress_callback:
+                        size = os.path.getsize(path)
+                        progress_callback(size, size)
+                    return True, "下载成功"
+
+            if use_graph:
+                success, msg = self.download_attachment_graph(attachment, temp_path, progress_callback)
+            else:
+                success, msg = self.download_attachment_imap(attachment, temp_path, actual_folder,
+                                                             progress_callback)
+            if success:
+                if store is not None:
+                    self._store_attachment(store, key, temp_path)
+                os.replace(temp_path, path)
+            return success, msg
+        finally:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def _store_attachment(self, store, key, temp_path):
+        """把下载完成的附件存入本地存储（内容相同的附件只保存一份）
+        用硬链接与 temp_path 共用数据，不再写一遍；写入失败时不影响本次保存
+        """
+        size = os.path.getsize(temp_path)
+        try:
+            digest = store.put_file(temp_path, keep=True)
+        except OSError:
+            return
+        self.db_manager.save_attachment_blob(self.account_id, *key, digest, size)
+
+    def download_attachment_graph(self, attachment, path, progress_callback=None):
+        """使用 Graph API 的 /attachments/{id}/$value 流式下载"""
+        token, msg = self.get_oauth2_access_token()
+        if not token:
+            return False, msg
+
+        headers = {'Authorization': f'Bearer {token}'}
+        email_id = attachment.get('message_id')
+        att_id = attachment.get('id')
+        total = attachment.get('size', 0)
+
+        try:
+            if self._api_type == 'outlook':
+                # Outlook REST v2.0 没有 $value，只能取 ContentBytes 后解码写入
+                url = f'https://outlook.office.com/api/v2.0/me/messages/{email_id}/attachments/{att_id}'
+                response = self._request('GET', url, headers=headers, timeout=60)
+                if response.status_code != 200:
+                    return False, f"下载失败: {response.status_code}"
+                content = base64.b64decode(response.json().get('ContentBytes', ''))
+                with open(path, 'wb') as f:
+                    f.write(content)
+                if progress_callback:
+                    progress_callback(len(content), len(content))
+                return True, "下载成功"
+
+            url = f'https://graph.microsoft.com/v1.0/me/messages/{email_id}/attachments/{att_id}/$value'
+            with self._request('GET', url, headers=headers, stream=True, timeout=60) as response:
+                if response.status_code != 200:
+                    return False, f"下载失败: {response.status_code}"
+                total = int(response.headers.get('Content-Length') or total or 0)
+                done = 0
+                with open(path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        done += len(chunk)
+                        if progress_callback:
+                            progress_callback(done, total)
+            return True, "下载成功"
+        except Exception as e:
+            return False, f"网络错误: {str(e)}"
+
+    def download_attachment_imap(self, attachment, path, folder='INBOX', progress_callback=None):
+        """使用 IMAP BODY.PEEK[section]<offset.length> 分段下载并流式解码"""
+        success, msg = self.connect_imap()
+        if not success:
+            return False, msg
+
+        try:
+            self.select_folder(folder)
+            eid = str(attachment.get('message_id')).encode()
+            section = attachment.get('section') or attachment.get('id')
+            total = attachment.get('encoded_size') or attachment.get('size', 0)
+            decoder = _TransferDecoder(attachment.get('encoding'))
+            offset = 0
+            with open(path, 'wb') as f:
+                while True:
+                    query = f'(BODY.PEEK[{section}]<{offset}.{self.DOWNLOAD_CHUNK}>)'
+                    status, msg_data = self.connection.uid('FETCH', eid, query)
+                    if status != 'OK':
+                        return False, "下载失败"
+                    chunk = b''
+                    for _, attrs in parse_fetch_response(msg_data):
+                        chunk = get_fetch_item(attrs, 'BODY[') or b''
+                        if chunk:
+                            break
+                    f.write(decoder.feed(chunk))
+                    offset += len(chunk)
+                    if progress_callback:
+                        progress_callback(offset, max(total, offset))
+                    if len(chunk) < self.DOWNLOAD_CHUNK:
+                        break
+                f.write(decoder.flush())
+            return True, "下载成功"
+        except Exception as e:
+            self._drop_broken_session(e)
+            return False, f"下载失败: {str(e)}"
+        finally:
+            self.disconnect()
+
     def send_email_with_attachments(self, to_addr, subject, body, attachments=None, cc_addr=None):
         """发送带附件的邮件
         attachments: 附件文件路径列表
@@ -692,18 +1889,24 @@ class EmailClient:
             cc_recipients = [{'emailAddress': {'address': addr.strip()}} 
                            for addr in cc_addr.split(',') if addr.strip()]
         
+        existing = [f for f in (attachments or []) if os.path.exists(f)]
+        total_size = sum(os.path.getsize(f) for f in existing)
+        if self._api_type != 'outlook' and total_size >= self.GRAPH_INLINE_LIMIT:
+            # 超过内联上限：先建草稿，大文件走上传会话分块上传，再发送
+            return self._send_graph_with_upload_sessions(
+                headers, subject, body, to_recipients, cc_recipients, existing
+            )
+
         # 构建附件数据
         attachment_data = []
-        if attachments:
-            for file_path in attachments:
-                if os.path.exists(file_path):
-                    with open(file_path, 'rb') as f:
-                        content = base64.b64encode(f.read()).decode()
-                    attachment_data.append({
-                        '@odata.type': '#microsoft.graph.fileAttachment',
-                        'name': os.path.basename(file_path),
-                        'contentBytes': content
-                    })
+        for file_path in existing:
+            with open(file_path, 'rb') as f:
+                content = base64.b64encode(f.read()).decode()
+            attachment_data.append({
+                '@odata.type': '#microsoft.graph.fileAttachment',
+                'name': os.path.basename(file_path),
+                'contentBytes': content
+            })
         
         if self._api_type == 'outlook':
             url = 'https://outlook.office.com/api/v2.0/me/sendmail'
@@ -737,7 +1940,7 @@ class EmailClient:
                 email_data['message']['ccRecipients'] = cc_recipients
         
         try:
-            response = requests.post(url, headers=headers, json=email_data, timeout=60)
+            response = self._request('POST', url, headers=headers, json=email_data, timeout=60)
             if response.status_code in [200, 202]:
                 return True, "发送成功"
             else:
@@ -745,6 +1948,89 @@ class EmailClient:
         except Exception as e:
             return False, f"网络错误: {str(e)}"
     
+    # Graph 单次请求内联附件的总大小上限（请求体上限 4MB，base64 膨胀约 1.33 倍）
+    GRAPH_INLINE_LIMIT = 3 * 1024 * 1024
+    # 上传会话分块大小，必须是 320 KiB 的整数倍
+    GRAPH_UPLOAD_CHUNK = 10 * 320 * 1024
+
+    def _send_graph_with_upload_sessions(self, headers, subject, body, to_recipients, cc_recipients, files):
+        """Graph 大附件发送：创建草稿 → 小文件直接添加、大文件上传会话分块上传 → 发送草稿"""
+        base_url = 'https://graph.microsoft.com/v1.0/me/messages'
+        draft = {
+            'subject': subject,
+            'body': {'contentType': 'Text', 'content': body},
+            'toRecipients': to_recipients
+        }
+        if cc_recipients:
+            draft['ccRecipients'] = cc_recipients
+
+        try:
+            response = self._request('POST', base_url, headers=headers, json=draft, timeout=30)
+            if response.status_code not in [200, 201]:
+                return False, f"创建草稿失败: {response.status_code} - {response.text[:200]}"
+            message_id = response.json().get('id')
+        except Exception as e:
+            return False, f"网络错误: {str(e)}"
+
+        try:
+            for file_path in files:
+                name = os.path.basename(file_path)
+                size = os.path.getsize(file_path)
+                if size < self.GRAPH_INLINE_LIMIT:
+                    with open(file_path, 'rb') as f:
+                        content = base64.b64encode(f.read()).decode()
+                    response = self._request('POST', f'{base_url}/{message_id}/attachments', headers=headers, json={
+                        '@odata.type': '#microsoft.graph.fileAttachment',
+                        'name': name,
+                        'contentBytes': content
+                    }, timeout=60)
+                    if response.status_code not in [200, 201]:
+                        raise RuntimeError(f"添加附件 {name} 失败: {response.status_code}")
+                else:
+                    self._upload_graph_attachment(headers, f'{base_url}/{message_id}', file_path, name, size)
+
+            response = self._request('POST', f'{base_url}/{message_id}/send', headers=headers, timeout=30)
+            if response.status_code in [200, 202]:
+                return True, "发送成功"
+            raise RuntimeError(f"发送失败: {response.status_code} - {response.text[:200]}")
+        except Exception as e:
+            # 失败时删除草稿，避免在草稿箱留下半成品
+            try:
+                self._request('DELETE', f'{base_url}/{message_id}', headers=headers, timeout=30)
+            except Exception:
+                pass
+            msg = str(e)
+            return False, msg if msg.startswith(('添加附件', '发送失败', '上传附件')) else f"网络错误: {msg}"
+
+    def _upload_graph_attachment(self, headers, message_url, file_path, name, size):
+        """通过上传会话从磁盘分块上传附件，每次只读取一块"""
+        response = self._request('POST', f'{message_url}/attachments/createUploadSession', headers=headers, json={
+            'AttachmentItem': {
+                'attachmentType': 'file',
+                'name': name,
+                'size': size
+            }
+        }, timeout=30)
+        if response.status_code not in [200, 201]:
+            raise RuntimeError(f"上传附件 {name} 失败: {response.status_code} - {response.text[:200]}")
+        upload_url = response.json().get('uploadUrl')
+
+        # uploadUrl 自带授权，不能再带 Authorization 头
+        with open(file_path, 'rb') as f:
+            offset = 0
+            while offset < size:
+                chunk = f.read(self.GRAPH_UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                end = offset + len(chunk) - 1
+                response = self._request('PUT', upload_url, data=chunk, headers={
+                    'Content-Length': str(len(chunk)),
+                    'Content-Range': f'bytes {offset}-{end}/{size}'
+                }, timeout=120)
+                if response.status_code not in [200, 201, 202]:
+                    raise RuntimeError(f"上传附件 {name} 失败: {response.status_code} - {response.text[:200]}")
+                offset = end + 1
+
     def send_email_smtp_with_attachments(self, to_addr, subject, body, attachments=None, cc_addr=None):
         """使用 SMTP 发送带附件的邮件"""
         smtp_server, smtp_port = self.get_smtp_server()
@@ -775,21 +2061,35 @@ class EmailClient:
             if cc_addr:
                 all_recipients.extend([addr.strip() for addr in cc_addr.split(',') if addr.strip()])
             
-            if smtp_port == 465:
-                context = ssl.create_default_context()
-                server = smtplib.SMTP_SSL(smtp_server, smtp_port, context=context)
-            else:
-                server = smtplib.SMTP(smtp_server, smtp_port)
-                server.starttls()
-            
-            server.login(self.email_addr, self.password)
-            server.sendmail(self.email_addr, all_recipients, msg.as_string())
-            server.quit()
+            server = self._open_smtp(smtp_server, smtp_port)
+            self._smtp_deliver(server, smtp_server, all_recipients, msg)
             
             return True, "发送成功"
         except Exception as e:
             return False, f"发送失败: {str(e)}"
 
+    def _open_smtp(self, smtp_server, smtp_port):
+        """连接 SMTP 服务器（465 端口 SSL，其他 STARTTLS），服务器熔断中时抛出 HostUnreachable"""
+        timeout = network_timeouts.get('smtp', 'connect')
+        def connect():
+            with latency_stats.timer('smtp', smtp_server, 'connect'):
+                if smtp_port == 465:
+                    return tls.SMTP_SSL(smtp_server, smtp_port, timeout=timeout)
+                server = smtplib.SMTP(smtp_server, smtp_port, timeout=timeout)
+                server.starttls(context=tls.shared_context())
+                return server
+        return host_breaker.call(f'{smtp_server}:{smtp_port}', connect)
+
+    def _smtp_deliver(self, server, smtp_server, recipients, msg):
+        """登录并发送，认证和发送分别使用各自的超时并计入耗时统计"""
+        server.sock.settimeout(network_timeouts.get('smtp', 'auth'))
+        with latency_stats.timer('smtp', smtp_server, 'auth'):
+            server.login(self.email_addr, self.password)
+        server.sock.settimeout(network_timeouts.get('smtp', 'send'))
+        with latency_stats.timer('smtp', smtp_server, 'send'):
+            server.sendmail(self.email_addr, recipients, msg.as_string())
+        server.quit()
+
     def get_smtp_server(self):
         """获取 SMTP 服务器配置"""
         domain = self.email_addr.split('@')[-1].lower()
@@ -863,7 +2163,7 @@ class EmailClient:
                 email_data['message']['ccRecipients'] = cc_recipients
         
         try:
-            response = requests.post(url, headers=headers, json=email_data, timeout=30)
+            response = self._request('POST', url, headers=headers, json=email_data, timeout=30)
             if response.status_code in [200, 202]:
                 return True, "发送成功"
             else:
@@ -892,18 +2192,8 @@ class EmailClient:
                 all_recipients.extend([addr.strip() for addr in cc_addr.split(',') if addr.strip()])
             
             # 连接 SMTP 服务器
-            if smtp_port == 465:
-                # SSL 连接
-                context = ssl.create_default_context()
-                server = smtplib.SMTP_SSL(smtp_server, smtp_port, context=context)
-            else:
-                # STARTTLS 连接
-                server = smtplib.SMTP(smtp_server, smtp_port)
-                server.starttls()
-            
-            server.login(self.email_addr, self.password)
-            server.sendmail(self.email_addr, all_recipients, msg.as_string())
-            server.quit()
+            server = self._open_smtp(smtp_server, smtp_port)
+            self._smtp_deliver(server, smtp_server, all_recipients, msg)
             
             return True, "发送成功"
         except smtplib.SMTPAuthenticationError as e:
@@ -941,7 +2231,7 @@ class EmailClient:
             url = f'https://graph.microsoft.com/v1.0/me/messages/{email_id}'
         
         try:
-            response = requests.delete(url, headers=headers, timeout=30)
+            response = self._request('DELETE', url, headers=headers, timeout=30)
             if response.status_code in [200, 204]:
                 return True, "删除成功"
             else:
@@ -956,32 +2246,32 @@ class EmailClient:
             return False, msg
         
         try:
-            self.connection.select(folder)
-            # 标记为删除
-            self.connection.store(email_id.encode() if isinstance(email_id, str) else email_id, 
-                                 '+FLAGS', '\\Deleted')
-            # 执行删除
-            self.connection.expunge()
+            self.select_folder(folder)
+            done, warning = self._delete_uids_imap([email_id], folder)
+            if not done:
+                return False, warning or "删除失败: 邮件不存在"
             return True, "删除成功"
         except Exception as e:
+            self._drop_broken_session(e)
             return False, f"删除失败: {str(e)}"
         finally:
             self.disconnect()
     
-    def delete_emails_batch(self, email_ids, folder='inbox', progress_callback=None):
+    def delete_emails_batch(self, email_ids, folder='inbox', progress_callback=None, results=None):
         """批量删除邮件（优化性能，复用连接）
         email_ids: 邮件ID列表
         folder: 当前文件夹
         progress_callback: 进度回调函数 (current, total)
+        results: 传入字典时按邮件ID填入是否成功 {email_id: bool}
         返回: (success_count, fail_count)
         """
         if self.use_graph_api():
-            return self.delete_emails_batch_graph(email_ids, progress_callback)
+            return self.delete_emails_batch_graph(email_ids, progress_callback, results)
         else:
             actual_folder = self.get_folder_name(folder)
-            return self.delete_emails_batch_imap(email_ids, actual_folder, progress_callback)
+            return self.delete_emails_batch_imap(email_ids, actual_folder, progress_callback, results)
     
-    def delete_emails_batch_graph(self, email_ids, progress_callback=None):
+    def delete_emails_batch_graph(self, email_ids, progress_callback=None, results=None):
         """使用 Graph API 批量删除邮件"""
         token, msg = self.get_oauth2_access_token()
         if not token:
@@ -1002,13 +2292,14 @@ class EmailClient:
         for i, email_id in enumerate(email_ids):
             try:
                 url = f'{base_url}/{email_id}'
-                response = requests.delete(url, headers=headers, timeout=30)
-                if response.status_code in [200, 204]:
-                    success_count += 1
-                else:
-                    fail_count += 1
+                response = self._request('DELETE', url, headers=headers, timeout=30)
+                ok = response.status_code in [200, 204]
             except:
-                fail_count += 1
+                ok = False
+            success_count += ok
+            fail_count += not ok
+            if results is not None:
+                results[email_id] = ok
             
             if progress_callback:
                 progress_callback(i + 1, total)
@@ -1016,61 +2307,91 @@ class EmailClient:
         return success_count, fail_count
     
     def check_aws_verification_emails(self, limit=50):
-        """检查是否有 AWS/Amazon 验证码邮件（只检查标题）
+        """检查是否有 AWS/Amazon 验证码邮件（按内置 aws 规则在服务器端搜索）
         返回: (has_aws_code, email_count) - 是否有AWS验证码邮件，以及找到的数量
         """
-        # AWS 验证码邮件的标题特征
-        aws_keywords = ['aws', 'amazon']
-        
         try:
-            emails, msg = self.fetch_emails(folder='inbox', limit=limit)
-            if not emails:
-                return False, 0
-            
-            aws_count = 0
-            for email_data in emails:
-                subject = email_data.get('subject', '').lower()
-                
-                # 只检查标题是否包含 aws 或 amazon
-                if any(kw in subject for kw in aws_keywords):
-                    aws_count += 1
-            
-            return aws_count > 0, aws_count
+            hits, msg = self.evaluate_rules(RuleSet(DEFAULT_RULES), limit)
+            count = (hits or {}).get('aws', 0)
+            return count > 0, count
         except Exception as e:
             return False, 0
     
-    def delete_emails_batch_imap(self, email_ids, folder='INBOX', progress_callback=None):
-        """使用 IMAP 批量删除邮件（复用连接，最后统一 expunge）"""
+    def delete_emails_batch_imap(self, email_ids, folder='INBOX', progress_callback=None, results=None):
+        """使用 IMAP 批量删除邮件（按序列集移到已删除，或标记后统一 expunge）"""
         success, msg = self.connect_imap()
         if not success:
             return 0, len(email_ids)
         
-        success_count = 0
-        fail_count = 0
-        total = len(email_ids)
-        
         try:
-            self.connection.select(folder)
-            
-            # 先标记所有邮件为删除
-            for i, email_id in enumerate(email_ids):
-                try:
-                    eid = email_id.encode() if isinstance(email_id, str) else email_id
-                    self.connection.store(eid, '+FLAGS', '\\Deleted')
-                    success_count += 1
-                except:
-                    fail_count += 1
-                
-                if progress_callback:
-                    progress_callback(i + 1, total)
-            
-            # 最后统一执行删除
-            self.connection.expunge()
-            
+            self.select_folder(folder)
+            done, _ = self._delete_uids_imap(email_ids, folder, progress_callback)
         except Exception as e:
+            self._drop_broken_session(e)
             # 如果整体失败，返回全部失败
-            return 0, total
+            done = set()
         finally:
             self.disconnect()
+        return self._batch_results(email_ids, done, results)
+
+    def _delete_uids_imap(self, email_ids, folder, progress_callback=None):
+        """在当前文件夹上删除邮件，返回 (服务器确认删除的 UID 集合, 提示)，提示通常为 None
+        支持 MOVE 且有已删除文件夹时 UID MOVE 过去（COPYUID 给出实际移动的 UID），
+        否则 UID STORE +FLAGS \\Deleted 后 UID EXPUNGE（UIDPLUS，只清除这些邮件）；
+        不支持 UIDPLUS 时普通 EXPUNGE 会清除文件夹中所有 \\Deleted 邮件，
+        只有没有其他 \\Deleted 邮件时才执行，否则只保留删除标记，这些邮件不计为已删除
+        """
+        conn = self.connection
+        trash = self.get_folder_name('deleted') if self.has_folder('deleted') else None
+        use_move = bool(trash) and trash != folder and self.has_capability('MOVE')
+        total = len(email_ids)
+        done, flagged = set(), set()
+        warning = None
+        processed = 0
+        for uid_set in build_uid_sets(self._numeric_uids(email_ids), self.UID_SET_MAX_LENGTH):
+            chunk = parse_uid_set(uid_set)
+            moved = False
+            if use_move:
+                conn.untagged_responses.pop('COPYUID', None)
+                status, _ = conn.uid('MOVE', uid_set, self._imap_mailbox(trash))
+                if status == 'OK':
+                    copyuid = conn.untagged_responses.pop('COPYUID', None)
+                    # [COPYUID uidvalidity 源UID集 目标UID集]
+                    parts = copyuid[-1].split() if copyuid and copyuid[-1] else []
+                    done.update(parse_uid_set(parts[1]) if len(parts) >= 2 else chunk)
+                    moved = True
+                else:
+                    # 已删除文件夹不存在等情况，改为直接删除
+                    use_move = False
+            if not moved:
+                flagged.update(self._store_flags_imap(chunk, '+FLAGS', '\\Deleted'))
+            processed += len(chunk)
+            if progress_callback:
+                progress_callback(min(processed, total), total)
         
-        return success_count, fail_count
+        if flagged:
+            if self.has_capability('UIDPLUS'):
+                for uid_set in build_uid_sets(flagged, self.UID_SET_MAX_LENGTH):
+                    status, _ = conn.uid('EXPUNGE', uid_set)
+                    if status == 'OK':
+                        done.update(parse_uid_set(uid_set))
+            elif self._only_deleted_imap(flagged):
+                status, _ = conn.expunge()
+                if status == 'OK':
+                    done.update(flagged)
+            else:
+                # 其他客户端标记删除（尚未清除）的邮件会被一起永久删除，不执行 EXPUNGE
+                warning = (f"服务器不支持 UIDPLUS，且 {folder} 中还有其他标记为已删除的邮件，"
+                           f"为避免一并永久删除，{len(flagged)} 封邮件仅标记为已删除，未从服务器清除")
+        conn.untagged_responses.pop('EXPUNGE', None)
+        return done, warning
+
+    def _only_deleted_imap(self, uids):
+        """当前文件夹中带 \\Deleted 标记的邮件是否都在 uids 中（查询失败时按否处理）"""
+        try:
+            status, data = self.connection.uid('SEARCH', None, 'DELETED')
+        except imaplib.IMAP4.error:
+            return False
+        if status != 'OK':
+            return False
+        return set(self._numeric_uids(b' '.join(d for d in data if d).split())) <= set(uids)
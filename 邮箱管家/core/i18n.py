@@ -37,6 +37,7 @@ TRANSLATIONS = {
         'col_status': '状态',
         'col_type': '类型',
         'col_aws': 'AWS',
+        'col_unread': '未读',
         'col_operation': '操作',
         
         # 操作按钮
@@ -76,6 +77,14 @@ TRANSLATIONS = {
         'general_settings_desc': '配置应用程序的基本选项',
         'font_size': '字体大小',
         'language': '语言',
+        'check_concurrency': '检测并发数',
+        'parse_workers': '解析进程数',
+        'parse_workers_auto': '自动',
+        'keyword_rules': '关键词规则',
+        'edit_rules': '编辑规则',
+        'network_timeouts': '网络超时',
+        'edit_timeouts': '设置超时',
+        'all_flags': '全部标记',
         'chinese': '中文',
         'english': 'English',
         'save': '保存',
@@ -92,6 +101,8 @@ TRANSLATIONS = {
         'confirm_delete_single': '确定要删除这个账号吗？',
         'no_accounts_to_check': '没有可检测的账号',
         'check_complete': '状态检测完成',
+        'throttle_summary': '服务器限流 {0} 次，自动重试 {1} 次，可适当调低检测并发数',
+        'hosts_unreachable': '以下服务器连续连接失败，已暂停连接: {0}',
         'moved_to_group': '已将 {0} 个账号移动到 "{1}"',
         'exported_accounts': '已导出 {0} 个账号',
         'please_select_send_account': '请先选择要发送邮件的账号',
@@ -216,6 +227,7 @@ TRANSLATIONS = {
         'col_status': 'Status',
         'col_type': 'Type',
         'col_aws': 'AWS',
+        'col_unread': 'Unread',
         'col_operation': 'Actions',
         
         # Action buttons
@@ -255,6 +267,14 @@ TRANSLATIONS = {
         'general_settings_desc': 'Configure basic application options',
         'font_size': 'Font Size',
         'language': 'Language',
+        'check_concurrency': 'Concurrency',
+        'parse_workers': 'Parse processes',
+        'parse_workers_auto': 'Auto',
+        'keyword_rules': 'Keyword Rules',
+        'edit_rules': 'Edit rules',
+        'network_timeouts': 'Timeouts',
+        'edit_timeouts': 'Edit timeouts',
+        'all_flags': 'All flags',
         'chinese': '中文',
         'english': 'English',
         'save': 'Save',
@@ -271,6 +291,8 @@ TRANSLATIONS = {
         'confirm_delete_single': 'Delete this account?',
         'no_accounts_to_check': 'No accounts to check',
         'check_complete': 'Status check complete',
+        'throttle_summary': 'Throttled {0} times, retried {1} times; consider lowering concurrency',
+        'hosts_unreachable': 'Paused unreachable servers: {0}',
         'moved_to_group': 'Moved {0} accounts to "{1}"',
         'exported_accounts': 'Exported {0} accounts',
         'please_select_send_account': 'Please select accounts to send email',
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+IMAP 响应解析模块 - 解析 FETCH / LIST / STATUS 响应和 BODYSTRUCTURE，构造 UID 序列集
+"""
+
+import base64
+import re
+from email.header import decode_header
+from email.utils import decode_rfc2231, collapse_rfc2231_value
+
+
+# 原子：普通原子，可带 [section] 和 <partial>，如 BODY[HEADER.FIELDS (FROM)]<0>
+_TOKEN_RE = re.compile(
+    rb'\s*(?:'
+    rb'(?P<open>\()|(?P<close>\))'
+    rb'|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|(?P<atom>[^\s()"\[\]]+(?:\[[^\]]*\])?(?:<[\d.]+>)?)'
+    rb')'
+)
+_LITERAL_RE = re.compile(rb'\{\d+\}\s*$')
+
+
+class _Literal(bytes):
+    """literal 字面量（区别于普通原子，不做 NIL/数字转换）"""
+
+
+def _tokenize(text):
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            break
+        pos = match.end()
+        if match.group('open'):
+            yield '('
+        elif match.group('close'):
+            yield ')'
+        elif match.group('quoted') is not None:
+            yield _Literal(re.sub(rb'\\(.)', rb'\1', match.group('quoted')))
+        elif match.group('atom'):
+            atom = match.group('atom')
+            if atom.upper() == b'NIL':
+                yield None
+            elif atom.isdigit():
+                yield int(atom)
+            else:
+                yield atom
+
+
+def _iter_tokens(data):
+    """把 imaplib 返回的 [(prefix, literal), b'...', ...] 展开为 token 流"""
+    for item in data:
+        if isinstance(item, tuple):
+            prefix = item[0] if isinstance(item[0], bytes) else b''
+            yield from _tokenize(_LITERAL_RE.sub(b'', prefix))
+            yield _Literal(item[1] or b'')
+        elif isinstance(item, bytes):
+            yield from _tokenize(item)
+
+
+def _build(tokens):
+    """把 token 流组装成嵌套列表"""
+    stack = [[]]
+    for token in tokens:
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        else:
+            stack[-1].append(token)
+    while len(stack) > 1:
+        done = stack.pop()
+        stack[-1].append(done)
+    return stack[0]
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    return value if value is not None else ''
+
+
+def parse_fetch_response(data):
+    """解析 FETCH 响应
+    data: imaplib fetch/uid('FETCH') 返回的数据列表
+    返回: [(seq, {'UID': 123, 'FLAGS': [...], 'BODY[...]': b'...', ...}), ...]
+    """
+    items = _build(_iter_tokens(data or []))
+    results = []
+    i = 0
+    while i < len(items):
+        seq = items[i]
+        if isinstance(seq, int) and i + 1 < len(items) and isinstance(items[i + 1], list):
+            attrs = {}
+            pairs = items[i + 1]
+            for j in range(0, len(pairs) - 1, 2):
+                key = _to_str(pairs[j]).upper()
+                attrs[key] = pairs[j + 1]
+            results.append((seq, attrs))
+            i += 2
+        else:
+            i += 1
+    return results
+
+
+def get_fetch_item(attrs, prefix):
+    """按前缀获取 FETCH 数据项（如 'BODY[HEADER.FIELDS'，服务器返回的 section 写法可能不同）"""
+    prefix = prefix.upper()
+    for key, value in attrs.items():
+        if key.startswith(prefix):
+            return value
+    return None
+
+
+def parse_flags(value):
+    """FLAGS 列表转为字符串列表"""
+    if not isinstance(value, list):
+        return []
+    return [_to_str(f) for f in value]
+
+
+def _params_to_dict(params):
+    if not isinstance(params, list):
+        return {}
+    result = {}
+    for k in range(0, len(params) - 1, 2):
+        result[_to_str(params[k]).lower()] = _to_str(params[k + 1])
+    return result
+
+
+def decode_mime_words(s):
+    """解码 MIME encoded-word 字符串"""
+    if not s:
+        return ''
+    result = []
+    for part, charset in decode_header(s):
+        if isinstance(part, bytes):
+            try:
+                result.append(part.decode(charset or 'utf-8', errors='ignore'))
+            except LookupError:
+                result.append(part.decode('utf-8', errors='ignore'))
+        else:
+            result.append(part)
+    return ''.join(result)
+
+
+def _param_filename(params):
+    """从参数字典中取文件名，兼容 RFC 2231 编码（filename*=utf-8''...）"""
+    for key in ('filename', 'name'):
+        if params.get(key):
+            return decode_mime_words(params[key])
+        encoded = params.get(key + '*')
+        if encoded:
+            return collapse_rfc2231_value(decode_rfc2231(encoded))
+        # 分段的 RFC 2231 参数：filename*0*, filename*1* ...
+        pieces = sorted(k for k in params if k.startswith(key + '*') and k != key + '*')
+        if pieces:
+            joined = ''.join(params[k] for k in pieces)
+            if pieces[0].endswith('*'):
+                return collapse_rfc2231_value(decode_rfc2231(joined))
+            return decode_mime_words(joined)
+    return ''
+
+
+def parse_bodystructure(node, section=''):
+    """把 BODYSTRUCTURE 嵌套列表解析为扁平的叶子部件列表
+    返回: [{'section', 'type', 'subtype', 'params', 'encoding', 'size',
+            'disposition', 'filename'}, ...]
+    """
+    parts = []
+    if not isinstance(node, list) or not node:
+        return parts
+
+    if isinstance(node[0], list):
+        # multipart: (part1)(part2)... "MIXED" ...
+        index = 0
+        for child in node:
+            if not isinstance(child, list):
+                break
+            index += 1
+            child_section = f'{section}.{index}' if section else str(index)
+            parts.extend(parse_bodystructure(child, child_section))
+        return parts
+
+    main_type = _to_str(node[0]).lower()
+    sub_type = _to_str(node[1]).lower() if len(node) > 1 else ''
+    params = _params_to_dict(node[2]) if len(node) > 2 else {}
+    encoding = _to_str(node[5]).lower() if len(node) > 5 else ''
+    size = node[6] if len(node) > 6 and isinstance(node[6], int) else 0
+
+    # 扩展字段位置：text 多一个行数，message/rfc822 多 envelope/body/行数
+    if main_type == 'text':
+        ext = 8
+    elif main_type == 'message' and sub_type == 'rfc822':
+        ext = 10
+    else:
+        ext = 7
+    disposition = ''
+    disp_params = {}
+    if len(node) > ext + 1 and isinstance(node[ext + 1], list) and node[ext + 1]:
+        disposition = _to_str(node[ext + 1][0]).lower()
+        if len(node[ext + 1]) > 1:
+            disp_params = _params_to_dict(node[ext + 1][1])
+
+    filename = _param_filename(disp_params) or _param_filename(params)
+    parts.append({
+        'section': section or '1',
+        'type': main_type,
+        'subtype': sub_type,
+        'params': params,
+        'encoding': encoding,
+        'size': size,
+        'disposition': disposition,
+        'filename': filename,
+    })
+    return parts
+
+
+def is_attachment_part(part):
+    """判断部件是否为附件"""
+    if part['disposition'] == 'attachment':
+        return True
+    # 没有 disposition 但带文件名的非正文部件（常见于旧客户端）
+    return bool(part['filename']) and part['type'] not in ('text', 'multipart') \
+        and part['disposition'] != 'inline'
+
+
+def find_text_part(parts):
+    """找到正文部件，优先 text/plain，其次 text/html"""
+    fallback = None
+    for part in parts:
+        if part['type'] != 'text' or is_attachment_part(part):
+            continue
+        if part['subtype'] == 'plain':
+            return part
+        if part['subtype'] == 'html' and fallback is None:
+            fallback = part
+    return fallback
+
+
+def parse_list_response(data):
+    """解析 LIST / XLIST 响应
+    返回: [(属性列表, 分隔符, 文件夹名), ...]，属性如 '\\Junk'、'\\Noselect'，文件夹名保持服务器原样（修改版 UTF-7）
+    """
+    results = []
+    for item in data or []:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            # 文件夹名以 literal 返回: (b'(\\HasNoChildren) "/" {7}', b'Archive')
+            tokens = _build(_iter_tokens([item]))
+        else:
+            tokens = _build(_tokenize(item))
+        if len(tokens) < 3 or not isinstance(tokens[0], list):
+            continue
+        name = tokens[2]
+        results.append((
+            parse_flags(tokens[0]),
+            _to_str(tokens[1]) or None,
+            str(name) if isinstance(name, int) else _to_str(name)
+        ))
+    return results
+
+
+def parse_status_response(data):
+    """解析 STATUS 响应
+    返回: {文件夹名: {'MESSAGES': n, 'UNSEEN': n, ...}}
+    """
+    results = {}
+    for item in data or []:
+        if item is None:
+            continue
+        tokens = _build(_iter_tokens([item]))
+        if len(tokens) < 2 or not isinstance(tokens[-1], list):
+            continue
+        name = tokens[0]
+        values = tokens[-1]
+        results[str(name) if isinstance(name, int) else _to_str(name)] = {
+            _to_str(values[i]).upper(): values[i + 1]
+            for i in range(0, len(values) - 1, 2) if isinstance(values[i + 1], int)
+        }
+    return results
+
+
+def build_uid_sets(uids, max_length=1000):
+    """把 UID 列表压缩为 IMAP 序列集，连续的 UID 合并为区间，如 [100..250, 300] -> '100:250,300'
+    部分服务器限制命令行长度，超过 max_length 个字符时分成多个序列集
+    返回: [序列集字符串, ...]
+    """
+    numbers = sorted({int(u) for u in uids})
+    sets, parts, length = [], [], 0
+    i = 0
+    while i < len(numbers):
+        j = i
+        while j + 1 < len(numbers) and numbers[j + 1] == numbers[j] + 1:
+            j += 1
+        part = str(numbers[i]) if i == j else f'{numbers[i]}:{numbers[j]}'
+        if parts and length + len(part) + 1 > max_length:
+            sets.append(','.join(parts))
+            parts, length = [], 0
+        parts.append(part)
+        length += len(part) + 1
+        i = j + 1
+    if parts:
+        sets.append(','.join(parts))
+    return sets
+
+
+def parse_uid_set(value):
+    """展开序列集，如 '100:102,105' -> [100, 101, 102, 105]（不支持 *）"""
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'replace')
+    uids = []
+    for part in str(value).split(','):
+        lo, _, hi = part.strip().partition(':')
+        if not lo.isdigit() or (hi and not hi.isdigit()):
+            continue
+        lo, hi = int(lo), int(hi or lo)
+        uids.extend(range(min(lo, hi), max(lo, hi) + 1))
+    return uids
+
+
+def decode_imap_utf7(name):
+    """文件夹名从 IMAP 修改版 UTF-7（RFC 3501 5.1.3）解码为 Unicode，如 &V4NXPpCuTvY- -> 垃圾邮件"""
+    def replace(match):
+        encoded = match.group(1)
+        if not encoded:
+            return '&'
+        encoded = encoded.replace(',', '/')
+        encoded += '=' * (-len(encoded) % 4)
+        try:
+            return base64.b64decode(encoded).decode('utf-16-be')
+        except (ValueError, UnicodeDecodeError):
+            return match.group(0)
+    return re.sub(r'&([A-Za-z0-9+,]*)-', replace, name)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+IMAP 连接池模块 - 按账号复用已登录的连接，定时 NOOP 保活并回收空闲连接
+"""
+
+import threading
+import time
+
+
+class IMAPSession:
+    """连接池中的一个已登录会话"""
+
+    def __init__(self, key, host, account, conn):
+        self.key = key
+        self.host = host
+        self.account = account
+        self.conn = conn
+        self.selected = None  # (folder, readonly)，未选择文件夹时为 None
+        self.uidvalidity = None  # 选中文件夹的 UIDVALIDITY
+        self.last_used = time.monotonic()
+
+
+class IMAPSessionPool:
+    """IMAP 会话池
+
+    - 按 (服务器, 端口, 账号, 密码) 复用已登录的连接，省去 TLS 握手和 LOGIN
+    - 复用空闲超过 validate_after 秒的连接前先 NOOP，断开则透明重新登录
+    - 后台线程定时对空闲连接 NOOP 保活，超过 idle_timeout 的连接登出回收
+    - 限制每个服务器和每个账号的连接数，空闲连接总数超过 max_idle 时淘汰最久未用的
+    - 服务器连接数已满时淘汰同一服务器上的空闲连接让出名额（优先本账号的），账号连接数已满时只等待
+    """
+
+    def __init__(self, max_per_host=8, max_per_account=2, max_idle=32,
+                 idle_timeout=300, keepalive_interval=60, validate_after=5):
+        self.max_per_host = max_per_host
+        self.max_per_account = max_per_account
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.validate_after = validate_after
+
+        self._cond = threading.Condition()
+        self._idle = []  # 空闲会话，按归还时间排序（末尾最新）
+        self._host_count = {}
+        self._account_count = {}
+        self._keepalive_thread = None
+
+    def acquire(self, key, host, factory, timeout=60):
+        """取出一个会话
+        key: (host, port, email, password)
+        factory: 新建并登录连接的函数，失败时抛出异常
+        返回: (session, msg)，失败时 session 为 None
+        """
+        account = key[:3]
+        deadline = time.monotonic() + timeout
+        while True:
+            session, to_close = None, []
+            with self._cond:
+                while True:
+                    session = self._take_idle(key)
+                    if session:
+                        break
+                    host_full = self._host_count.get(host, 0) >= self.max_per_host
+                    account_full = self._account_count.get(account, 0) >= self.max_per_account
+                    if not host_full and not account_full:
+                        self._reserve(host, account)
+                        break
+                    victim = self._find_victim(host, account, account_full)
+                    if victim:
+                        self._idle.remove(victim)
+                        self._unreserve(victim.host, victim.account)
+                        to_close.append(victim)
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None, "连接失败: 服务器连接数已达上限"
+                    self._cond.wait(remaining)
+
+            for victim in to_close:
+                self._close(victim)
+
+            if session:
+                if time.monotonic() - session.last_used < self.validate_after or self._noop(session):
+                    session.last_used = time.monotonic()
+                    return session, "连接成功"
+                # 连接已断开，丢弃后重新登录
+                self.release(session, discard=True)
+                continue
+
+            try:
+                conn = factory()
+            except Exception as e:
+                with self._cond:
+                    self._unreserve(host, account)
+                    self._cond.notify_all()
+                return None, f"连接失败: {str(e)}"
+            return IMAPSession(key, host, account, conn), "连接成功"
+
+    def release(self, session, discard=False):
+        """归还会话，discard=True 时直接登出"""
+        if discard:
+            self._close(session)
+            with self._cond:
+                self._unreserve(session.host, session.account)
+                self._cond.notify_all()
+            return
+
+        evicted = []
+        with self._cond:
+            session.last_used = time.monotonic()
+            self._idle.append(session)
+            while len(self._idle) > self.max_idle:
+                oldest = self._idle.pop(0)
+                self._unreserve(oldest.host, oldest.account)
+                evicted.append(oldest)
+            self._cond.notify_all()
+            self._ensure_keepalive()
+        for oldest in evicted:
+            self._close(oldest)
+
+    def close_all(self):
+        """登出所有空闲连接（程序退出时调用）"""
+        with self._cond:
+            sessions, self._idle = self._idle, []
+            for session in sessions:
+                self._unreserve(session.host, session.account)
+            self._cond.notify_all()
+        for session in sessions:
+            self._close(session)
+
+    def _find_victim(self, host, account, account_full):
+        """找一个能让出名额的空闲会话（最久未用的），没有时返回 None
+        优先淘汰本账号的空闲会话（密码已变更等，key 不同），同时让出服务器和账号名额；
+        账号名额已满时淘汰其他账号的会话无济于事，只有服务器名额已满时才淘汰其他账号的
+        """
+        same_account = next((s for s in self._idle if s.account == account), None)
+        if same_account or account_full:
+            return same_account
+        return next((s for s in self._idle if s.host == host), None)
+
+    def _take_idle(self, key):
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i].key == key:
+                return self._idle.pop(i)
+        return None
+
+    def _reserve(self, host, account):
+        self._host_count[host] = self._host_count.get(host, 0) + 1
+        self._account_count[account] = self._account_count.get(account, 0) + 1
+
+    def _unreserve(self, host, account):
+        self._host_count[host] = max(0, self._host_count.get(host, 0) - 1)
+        self._account_count[account] = max(0, self._account_count.get(account, 0) - 1)
+        if not self._host_count[host]:
+            del self._host_count[host]
+        if not self._account_count[account]:
+            del self._account_count[account]
+
+    def _noop(self, session):
+        try:
+            status, _ = session.conn.noop()
+            return status == 'OK'
+        except Exception:
+            return False
+
+    def _close(self, session):
+        try:
+            session.conn.logout()
+        except Exception:
+            pass
+
+    def _ensure_keepalive(self):
+        if self._keepalive_thread and self._keepalive_thread.is_alive():
+            return
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while True:
+            time.sleep(self.keepalive_interval)
+            now = time.monotonic()
+            expired, stale = [], []
+            with self._cond:
+                for session in list(self._idle):
+                    idle = now - session.last_used
+                    if idle >= self.idle_timeout:
+                        expired.append(session)
+                    elif idle >= self.keepalive_interval:
+                        stale.append(session)
+                    else:
+                        continue
+                    self._idle.remove(session)
+                for session in expired:
+                    self._unreserve(session.host, session.account)
+                if expired:
+                    self._cond.notify_all()
+                if not self._idle and not stale and not expired:
+                    # 没有空闲连接，退出线程，下次归还时再启动
+                    self._keepalive_thread = None
+                    return
+
+            for session in expired:
+                self._close(session)
+            for session in stale:
+                # NOOP 不更新 last_used，超过 idle_timeout 仍会被回收
+                if self._noop(session):
+                    with self._cond:
+                        self._idle.append(session)
+                        self._cond.notify_all()
+                else:
+                    self.release(session, discard=True)
+
+
+# 全局连接池
+imap_pool = IMAPSessionPool()
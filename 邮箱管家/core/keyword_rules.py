@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+关键词规则模块 - 用户自定义规则编译为一个组合正则，每封邮件每个字段只扫描一次
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+
+# 规则可匹配的字段 -> (IMAP SEARCH 键, Graph $search 属性)
+RULE_FIELDS = {
+    'subject': ('SUBJECT', 'subject'),
+    'sender': ('FROM', 'from'),
+}
+
+# 规则字段对应的邮件字典键（发件人同时匹配显示名和地址）
+_FIELD_KEYS = {
+    'subject': ('subject',),
+    'sender': ('sender', 'sender_email'),
+}
+
+
+class KeywordRule:
+    """一条关键词规则
+
+    name: 规则名，同时作为账号标记名
+    fields: 匹配的字段列表（subject / sender）
+    patterns: 关键词列表，不区分大小写的子串匹配，任一命中即可
+    folder: 检测的文件夹（inbox / junk ...）
+    recency_days: 只统计最近多少天的邮件，0 表示不限
+    """
+
+    def __init__(self, name, fields=None, patterns=None, folder='inbox', recency_days=30, enabled=True):
+        self.name = name
+        self.fields = [f for f in (fields or ['subject']) if f in RULE_FIELDS]
+        self.patterns = [p.strip() for p in (patterns or []) if p and p.strip()]
+        self.folder = folder or 'inbox'
+        self.recency_days = int(recency_days or 0)
+        self.enabled = bool(enabled)
+
+
+# 默认规则：原 has_aws_code 标记
+DEFAULT_RULES = [
+    KeywordRule('aws', ['subject'], ['aws', 'amazon'], 'inbox', 30),
+]
+
+
+class RuleSet:
+    """编译后的规则集
+
+    所有规则的关键词合并为一个正则（按长度倒序的分支），用前瞻在每个位置尝试匹配，
+    命中的关键词再映射回包含该关键词和该字段的规则。
+    """
+
+    def __init__(self, rules):
+        self.rules = [r for r in rules if r.enabled and r.fields and r.patterns]
+        # 关键词（小写） -> [(规则, 字段集合)]
+        self._owners = {}
+        for rule in self.rules:
+            for pattern in rule.patterns:
+                self._owners.setdefault(pattern.lower(), []).append((rule, set(rule.fields)))
+
+        keywords = sorted(self._owners, key=len, reverse=True)
+        self._keywords = keywords
+        # 同一位置只会命中最长的关键词，它包含的短关键词也必然出现，一并计入
+        self._expanded = {
+            k: [owner for sub in keywords if sub in k for owner in self._owners[sub]]
+            for k in keywords
+        }
+        self._by_name = {r.name: r for r in self.rules}
+        if keywords:
+            alternation = '|'.join(f'(?P<k{i}>{re.escape(k)})' for i, k in enumerate(keywords))
+            self._regex = re.compile(f'(?=(?:{alternation}))', re.IGNORECASE)
+        else:
+            self._regex = None
+        self._fields = sorted({f for r in self.rules for f in r.fields})
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    @property
+    def names(self):
+        return [r.name for r in self.rules]
+
+    def folders(self):
+        """规则涉及的文件夹"""
+        return sorted({r.folder for r in self.rules})
+
+    def rules_for_folder(self, folder):
+        return [r for r in self.rules if r.folder == folder]
+
+    def match(self, email_data, now=None):
+        """一封邮件命中的规则名集合"""
+        if not self._regex:
+            return set()
+        matched = set()
+        for field in self._fields:
+            text = ' '.join(email_data.get(key) or '' for key in _FIELD_KEYS[field]).strip()
+            if not text:
+                continue
+            for m in self._regex.finditer(text):
+                keyword = self._keywords[int(m.lastgroup[1:])]
+                for rule, fields in self._expanded[keyword]:
+                    if field in fields:
+                        matched.add(rule.name)
+        if matched:
+            matched = {name for name in matched if self._within_recency(name, email_data, now)}
+        return matched
+
+    def evaluate(self, emails, folder=None):
+        """统计每条规则命中的邮件数
+        folder: 只统计该文件夹的规则，None 表示全部
+        返回: {规则名: 命中数}，规则未命中时为 0
+        """
+        rules = self.rules_for_folder(folder) if folder else self.rules
+        counts = {r.name: 0 for r in rules}
+        now = datetime.now(timezone.utc)
+        for email_data in emails:
+            for name in self.match(email_data, now):
+                if name in counts:
+                    counts[name] += 1
+        return counts
+
+    def search_terms(self, folder):
+        """某文件夹的服务器端搜索条件
+        返回: ([(字段, 关键词), ...], 最大回溯天数)，天数为 None 表示不限
+        """
+        terms, days = [], []
+        for rule in self.rules_for_folder(folder):
+            for field in rule.fields:
+                for pattern in rule.patterns:
+                    if (field, pattern.lower()) not in terms:
+                        terms.append((field, pattern.lower()))
+            days.append(rule.recency_days)
+        # 服务器端是子串匹配，已被更短关键词覆盖的条件不必再发
+        terms = [(f, k) for f, k in terms
+                 if not any(f2 == f and k2 != k and k2 in k for f2, k2 in terms)]
+        since_days = None if not days or 0 in days else max(days)
+        return terms, since_days
+
+    def _within_recency(self, name, email_data, now):
+        rule = self._by_name[name]
+        if not rule.recency_days:
+            return True
+        date = email_data.get('date')
+        if not isinstance(date, datetime):
+            return True  # 没有日期的邮件不做时间过滤
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        now = now or datetime.now(timezone.utc)
+        return now - date <= timedelta(days=rule.recency_days)
+
+
+def load_rule_set(db):
+    """从数据库读取规则并编译，没有数据库时使用默认规则"""
+    if not db:
+        return RuleSet(DEFAULT_RULES)
+    return RuleSet([
+        KeywordRule(r['name'], r['fields'], r['patterns'], r['folder'], r['recency_days'], r['enabled'])
+        for r in db.get_keyword_rules()
+    ])
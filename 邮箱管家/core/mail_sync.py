@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+增量同步模块 - IMAP UIDVALIDITY/UIDNEXT/CONDSTORE 与 Graph delta 查询
+新增的邮件同时提取验证码写入索引表
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from core.imap_parser import parse_fetch_response, parse_flags
+
+
+class MailSyncEngine:
+    """把服务器文件夹增量同步到本地邮件表
+
+    IMAP: 记录 UIDVALIDITY/UIDNEXT/HIGHESTMODSEQ，之后只拉取新邮件头、
+          变化的标记（CONDSTORE 时用 CHANGEDSINCE）和已删除的 UID。
+    Graph: 记录 messages/delta 返回的 deltaLink，之后只拉取变化。
+    首次同步先取最新的一页并调用 on_ready（列表可以先显示），其余邮件随后补齐。
+    """
+
+    # 首次同步最多拉取的邮件数（更早的邮件通过分页按需获取）
+    INITIAL_WINDOW = 500
+    # Graph 首次 delta 只同步最近多少天的邮件
+    INITIAL_DAYS = 90
+    # 首屏邮件数：首次同步先取这么多封；不支持 CONDSTORE 时只重新取这些邮件的标记
+    # （更早的邮件滚动加载时从服务器分页获取，标记本来就是最新的）
+    FIRST_PAGE = 50
+    # 每次 UID FETCH 的邮件数
+    FETCH_CHUNK = 200
+
+    def __init__(self, client, db):
+        self.client = client
+        self.db = db
+        self.account_id = client.account_id
+
+    def sync(self, folder='inbox', on_ready=None):
+        """同步一个文件夹
+        on_ready: 首次同步时最新一页写入本地后调用（在同步线程中），之后继续补齐其余邮件
+        返回: (stats, msg)，stats = {'added', 'updated', 'removed', 'full'}；失败时 stats 为 None
+        """
+        if self.client.use_graph_api():
+            return self.sync_graph(folder, on_ready)
+        return self.sync_imap(folder, on_ready)
+
+    # ========== IMAP ==========
+    def sync_imap(self, folder='inbox', on_ready=None):
+        actual_folder = self.client.get_folder_name(folder)
+        success, msg = self.client.connect_imap()
+        if not success:
+            return None, msg
+
+        conn = self.client.connection
+        try:
+            # ENABLE CONDSTORE 只能在未选择文件夹时发送，已在登录时完成（EmailClient._open_imap）
+            condstore = 'CONDSTORE' in conn.capabilities
+
+            status, data = self.client.select_folder(actual_folder, readonly=True, force=True)
+            if status != 'OK':
+                return None, f"无法打开文件夹 {actual_folder}: {data}"
+
+            uidvalidity = self._response_int(conn, 'UIDVALIDITY')
+            uidnext = self._response_int(conn, 'UIDNEXT')
+            modseq = self._response_int(conn, 'HIGHESTMODSEQ') if condstore else None
+            # 本地存储的原始邮件按 UID 记录，UIDVALIDITY 变化后不能再用
+            self.db.purge_stale_blobs(self.account_id, actual_folder, uidvalidity)
+
+            state = self.db.get_sync_state(self.account_id, folder)
+            if not state or state['uidvalidity'] != uidvalidity or not state['uidnext']:
+                stats = self._full_sync_imap(conn, folder, on_ready)
+            else:
+                stats = self._incremental_sync_imap(conn, folder, state, modseq)
+
+            if modseq is None and state and not stats['full']:
+                # 本次没有拿到 HIGHESTMODSEQ 时保留已知值（UIDVALIDITY 未变，仍然有效）
+                modseq = state['highestmodseq']
+            if not uidnext:
+                # 服务器没有返回 UIDNEXT 时用已知最大 UID 推算
+                known = [int(u) for u in self.db.get_email_uids(self.account_id, folder)]
+                uidnext = max(known) + 1 if known else 1
+            self.db.save_sync_state(self.account_id, folder, uidvalidity=uidvalidity,
+                                    uidnext=uidnext, highestmodseq=modseq)
+            return stats, "同步成功"
+        except Exception as e:
+            self.client._drop_broken_session(e)
+            return None, f"同步失败: {str(e)}"
+        finally:
+            self.client.disconnect()
+
+    def _response_int(self, conn, name):
+        _, data = conn.response(name)
+        try:
+            return int(data[-1]) if data and data[-1] is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _full_sync_imap(self, conn, folder, on_ready=None):
+        """全量同步：UIDVALIDITY 变化或首次同步"""
+        self.db.clear_folder_emails(self.account_id, folder)
+        status, data = conn.uid('SEARCH', None, 'ALL')
+        if status != 'OK':
+            raise RuntimeError("获取邮件列表失败")
+        uids = data[0].split()[-self.INITIAL_WINDOW:]
+        added = self._fetch_and_store(folder, uids, on_ready)
+        return {'added': added, 'updated': 0, 'removed': 0, 'full': True}
+
+    def _incremental_sync_imap(self, conn, folder, state, modseq):
+        """增量同步：新邮件 + 标记变化 + 已删除"""
+        known = sorted(int(u) for u in self.db.get_email_uids(self.account_id, folder))
+
+        # 1. 新邮件：UID uidnext:*（服务器在没有新邮件时也会返回最后一封，需过滤）
+        status, data = conn.uid('SEARCH', None, f"UID {state['uidnext']}:*")
+        new_uids = []
+        if status == 'OK' and data and data[0]:
+            new_uids = [u for u in data[0].split() if int(u) >= state['uidnext']]
+        added = self._fetch_and_store(folder, new_uids)
+
+        if not known:
+            return {'added': added, 'updated': 0, 'removed': 0, 'full': False}
+        uid_range = f'{known[0]}:{known[-1]}'
+
+        # 2. 标记变化：CONDSTORE 只返回 modseq 之后变化的邮件，否则只取首屏邮件的 FLAGS
+        read_flags = {}
+        if modseq and state['highestmodseq']:
+            if modseq != state['highestmodseq']:
+                status, data = conn.uid('FETCH', uid_range,
+                                        f"(UID FLAGS) (CHANGEDSINCE {state['highestmodseq']})")
+                if status == 'OK':
+                    read_flags = self._parse_read_flags(data)
+        else:
+            recent = known[-self.FIRST_PAGE:]
+            status, data = conn.uid('FETCH', f'{recent[0]}:{recent[-1]}', '(UID FLAGS)')
+            if status == 'OK':
+                read_flags = self._parse_read_flags(data)
+        self.db.update_email_flags(self.account_id, folder, read_flags)
+
+        # 3. 已删除：已知范围内服务器上不存在的 UID
+        status, data = conn.uid('SEARCH', None, f'UID {uid_range}')
+        removed = []
+        if status == 'OK':
+            present = {int(u) for u in (data[0] or b'').split()}
+            removed = [uid for uid in known if uid not in present]
+            self.db.delete_emails_by_uid(self.account_id, folder, removed)
+
+        return {'added': added, 'updated': len(read_flags), 'removed': len(removed), 'full': False}
+
+    def _parse_read_flags(self, data):
+        read_flags = {}
+        for _, attrs in parse_fetch_response(data):
+            if 'UID' in attrs and 'FLAGS' in attrs:
+                read_flags[attrs['UID']] = '\\Seen' in parse_flags(attrs['FLAGS'])
+        return read_flags
+
+    def _fetch_and_store(self, folder, uids, on_ready=None):
+        """从最新的邮件开始分批获取邮件头并写入本地邮件表
+        第一批只取 FIRST_PAGE 封，写入后调用 on_ready
+        """
+        count = 0
+        end = len(uids)
+        size = self.FIRST_PAGE
+        while end > 0:
+            emails = self.client._fetch_headers_imap(uids[max(0, end - size):end])
+            self.db.save_emails(self.account_id, folder, emails)
+            self.client.index_verification_codes(folder, emails)
+            count += len(emails)
+            end -= size
+            size = self.FETCH_CHUNK
+            if on_ready:
+                on_ready()
+                on_ready = None
+        return count
+
+    # ========== Graph ==========
+    def sync_graph(self, folder='inbox', on_ready=None):
+        token, msg = self.client.get_oauth2_access_token()
+        if not token:
+            return None, msg
+
+        if self.client._api_type == 'outlook':
+            # Outlook REST v2.0 没有 delta 查询，退化为拉取最新一页
+            emails, msg = self.client.fetch_emails_graph(folder, 50, headers_only=True)
+            if not emails and msg != "获取成功":
+                return None, msg
+            self.db.clear_folder_emails(self.account_id, folder)
+            self.db.save_emails(self.account_id, folder, emails)
+            self.client.index_verification_codes(folder, emails)
+            return {'added': len(emails), 'updated': 0, 'removed': 0, 'full': True}, "同步成功"
+
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Prefer': 'odata.maxpagesize=100'
+        }
+        state = self.db.get_sync_state(self.account_id, folder)
+        full = not state or not state['delta_link']
+        if full:
+            self.db.clear_folder_emails(self.account_id, folder)
+            folder_name = self.client.get_folder_name(folder)
+            url = f'https://graph.microsoft.com/v1.0/me/mailFolders/{folder_name}/messages/delta'
+            # 只同步最近的邮件，从新到旧返回，第一页即可显示；更早的邮件滚动加载时分页获取
+            since = datetime.now(timezone.utc) - timedelta(days=self.INITIAL_DAYS)
+            params = {
+                '$select': 'id,subject,from,receivedDateTime,bodyPreview,isRead,hasAttachments',
+                '$filter': f"receivedDateTime ge {since.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+                '$orderby': 'receivedDateTime desc',
+            }
+        else:
+            url = state['delta_link']
+            params = None
+
+        changed_count, removed = 0, 0
+        try:
+            while url:
+                response = self.client._request('GET', url, headers=headers, params=params, timeout=30)
+                params = None  # nextLink/deltaLink 已包含查询参数
+                if response.status_code == 410:
+                    # deltaLink 过期，需要全量重建
+                    self.db.clear_folder_emails(self.account_id, folder)
+                    return self.sync_graph(folder, on_ready)
+                if response.status_code != 200:
+                    return None, f"API 错误: {response.status_code} - {response.text[:200]}"
+
+                data = response.json()
+                changed, deleted = [], []
+                for item in data.get('value', []):
+                    if '@removed' in item:
+                        deleted.append(item.get('id'))
+                    else:
+                        changed.append(self.client._parse_graph_message(item, headers_only=True))
+                self.db.save_emails(self.account_id, folder, changed)
+                self.db.delete_emails_by_uid(self.account_id, folder, deleted)
+                self.client.index_verification_codes(folder, changed)
+                changed_count += len(changed)
+                removed += len(deleted)
+                if full and on_ready:
+                    on_ready()
+                    on_ready = None
+
+                url = data.get('@odata.nextLink')
+                delta_link = data.get('@odata.deltaLink')
+                if delta_link:
+                    self.db.save_sync_state(self.account_id, folder, delta_link=delta_link)
+        except Exception as e:
+            return None, f"网络错误: {str(e)}"
+
+        # delta 不区分新增和修改，首次同步全部计为新增
+        added, updated = (changed_count, 0) if full else (0, changed_count)
+        return {'added': added, 'updated': updated, 'removed': removed, 'full': full}, "同步成功"
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+新邮件监听模块 - IMAP IDLE 推送，服务器不支持 IDLE 时（以及 Graph 账号）退化为定时轮询
+"""
+
+import imaplib
+import socket
+import threading
+
+
+class FolderWatcher:
+    """监听一个文件夹的新邮件
+
+    IMAP 且支持 IDLE: 单独开一个连接（不占用连接池）进入 IDLE，服务器推送 EXISTS 后
+        结束 IDLE，只 UID FETCH 新 UID 的邮件头，然后重新 IDLE；没有新邮件时没有任何流量。
+        IDLE 超过 IDLE_REFRESH 秒（服务器通常 30 分钟断开 IDLE）时立即重连并重新 IDLE。
+    其他情况: 每 poll_interval 秒检查一次 UID > 最后 UID（Graph 为第一页中未见过的邮件）。
+    NOTIFY（RFC 5465）服务器支持很少，不单独实现。
+    """
+
+    IDLE_REFRESH = 25 * 60
+    # 连接失败后的重试间隔（秒）
+    RETRY_DELAY = 30
+
+    def __init__(self, client, folder='inbox', last_uid=None, known_ids=None, poll_interval=60):
+        self.client = client
+        self.folder = folder
+        self.last_uid = last_uid
+        self.known_ids = set(known_ids or [])
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._conn = None
+
+    def stop(self):
+        """停止监听（可在其他线程调用），关闭套接字以唤醒阻塞中的 IDLE"""
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self, on_new):
+        """阻塞运行直到 stop()，on_new(emails) 在本线程回调，emails 按 UID 倒序"""
+        while not self._stop.is_set():
+            try:
+                if not self.client.use_graph_api() and self._supports_idle():
+                    self._run_idle(on_new)
+                else:
+                    self._poll_once(on_new)
+                    self._stop.wait(self.poll_interval)
+            except Exception:
+                # 网络错误：稍后重连，停止时直接退出
+                self._close()
+                self._stop.wait(self.RETRY_DELAY)
+        self._close()
+
+    def _supports_idle(self):
+        if not self.client.get_profile()['capabilities']:
+            # 还没有能力档案时登录一次
+            success, _ = self.client.connect_imap()
+            if success:
+                self.client.disconnect()
+        return self.client.has_capability('IDLE')
+
+    # ========== IDLE ==========
+    def _run_idle(self, on_new):
+        conn = self.client._connect_new_imap()
+        self._conn = conn
+        if self._stop.is_set():
+            return
+        mailbox = self.client._imap_mailbox(self.client.get_folder_name(self.folder))
+        status, data = conn.select(mailbox, readonly=True)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f'无法打开文件夹: {data}')
+        if self.last_uid is None:
+            uidnext = self._response_int(conn, 'UIDNEXT')
+            self.last_uid = uidnext - 1 if uidnext else self._max_uid(conn)
+        else:
+            # 开始监听之前到达的邮件
+            self._fetch_new(conn, on_new)
+
+        while not self._stop.is_set():
+            result = self._idle(conn)
+            if result is None:
+                # IDLE 到期：超时后的套接字不能再读取，关闭后由 run() 立即重连，不等待 RETRY_DELAY
+                self._close()
+                return
+            if result:
+                self._fetch_new(conn, on_new)
+
+    def _idle(self, conn):
+        """进入 IDLE 等待推送，收到 EXISTS 时返回 True，被停止时返回 False，
+        等待超过 IDLE_REFRESH 时返回 None（需要重连）
+        """
+        tag = conn._new_tag()
+        conn.send(tag + b' IDLE\r\n')
+        line = conn.readline()
+        if not line.startswith(b'+'):
+            raise imaplib.IMAP4.error(f'IDLE 被拒绝: {line!r}')
+
+        conn.sock.settimeout(self.IDLE_REFRESH)
+        exists = False
+        while not exists:
+            try:
+                line = conn.readline()
+            except socket.timeout:
+                return None
+            if not line:
+                if self._stop.is_set():
+                    return False
+                raise imaplib.IMAP4.abort('IDLE 连接已断开')
+            # * 12 EXISTS
+            parts = line.split()
+            exists = len(parts) >= 3 and parts[0] == b'*' and parts[2].upper() == b'EXISTS'
+
+        conn.send(b'DONE\r\n')
+        while not line.startswith(tag):
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort('IDLE 连接已断开')
+        conn._set_phase_timeout('fetch')
+        return True
+
+    def _fetch_new(self, conn, on_new):
+        status, data = conn.uid('SEARCH', None, f'UID {self.last_uid + 1}:*')
+        if status != 'OK' or not data or not data[0]:
+            return
+        # 没有新邮件时服务器也会返回最后一封，需过滤
+        uids = [u for u in data[0].split() if int(u) > self.last_uid]
+        if not uids:
+            return
+        emails = self.client._fetch_headers_imap(uids, connection=conn)
+        self.last_uid = max(int(u) for u in uids)
+        if emails:
+            on_new(emails)
+
+    def _response_int(self, conn, name):
+        _, data = conn.response(name)
+        try:
+            return int(data[-1]) if data and data[-1] is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _max_uid(self, conn):
+        status, data = conn.uid('SEARCH', None, '*')
+        if status == 'OK' and data and data[0]:
+            return max(int(u) for u in data[0].split())
+        return 0
+
+    def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.logout()
+            except Exception:
+                pass
+
+    # ========== 轮询 ==========
+    def _poll_once(self, on_new):
+        if self.client.use_graph_api():
+            emails, _, _ = self.client.fetch_emails_page(self.folder, None, 20)
+            new_emails = [e for e in emails if e.get('uid') not in self.known_ids]
+            self.known_ids.update(e.get('uid') for e in emails)
+            if new_emails:
+                on_new(new_emails)
+            return
+
+        success, msg = self.client.connect_imap()
+        if not success:
+            raise ConnectionError(msg)
+        try:
+            conn = self.client.connection
+            # 重新 SELECT 以获得最新的邮件状态
+            status, _ = self.client.select_folder(self.client.get_folder_name(self.folder), readonly=True, force=True)
+            if status != 'OK':
+                return
+            if self.last_uid is None:
+                uidnext = self._response_int(conn, 'UIDNEXT')
+                self.last_uid = uidnext - 1 if uidnext else self._max_uid(conn)
+                return
+            self._fetch_new(conn, on_new)
+        except Exception as e:
+            self.client._drop_broken_session(e)
+            raise
+        finally:
+            self.client.disconnect()
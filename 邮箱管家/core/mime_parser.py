@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+邮件解析模块 - 邮件列表用的快速解析：只解析需要的头字段，一次遍历找到正文，不解码附件内容
+"""
+
+import base64
+import mmap
+import os
+import quopri
+import re
+from email.header import decode_header
+from email.parser import BytesHeaderParser
+from email.utils import parsedate_to_datetime
+
+
+# 解析器无状态，可复用；compat32 策略不把每个头解析成结构化对象，
+# 只对用到的 Subject/From 做 encoded-word 解码（比 policy.default 快 3~5 倍）
+_header_parser = BytesHeaderParser()
+
+_ANGLE_ADDR_RE = re.compile(r'<([^>]+)>')
+_HEADER_END_RE = re.compile(rb'\r?\n\r?\n')
+
+# multipart 最大嵌套层数，超过时按普通部件处理
+MAX_DEPTH = 10
+
+# 列表正文最多保留的字符数
+BODY_LIMIT = 5000
+
+
+def decode_str(value):
+    """解码 MIME encoded-word 头（=?utf-8?B?...?=），未知字符集按 UTF-8"""
+    if not value:
+        return ''
+    if isinstance(value, str) and '=?' not in value:
+        # 绝大多数头没有编码，跳过 decode_header
+        return value
+    result = []
+    for part, charset in decode_header(value):
+        if isinstance(part, bytes):
+            try:
+                result.append(part.decode(charset or 'utf-8', errors='ignore'))
+            except LookupError:
+                result.append(part.decode('utf-8', errors='ignore'))
+        else:
+            result.append(part)
+    return ''.join(result)
+
+
+def extract_email_address(sender):
+    """从发件人字符串中提取邮箱地址"""
+    match = _ANGLE_ADDR_RE.search(sender)
+    if match:
+        return match.group(1)
+    # 如果没有尖括号，可能整个字符串就是邮箱
+    if '@' in sender:
+        return sender.strip()
+    return ''
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def summarize_headers(message):
+    """从已解析的邮件头取列表字段 {'subject', 'sender', 'sender_email', 'date'}"""
+    sender = decode_str(message.get('From', ''))
+    return {
+        'subject': decode_str(message.get('Subject', '')),
+        'sender': sender,
+        'sender_email': extract_email_address(sender),
+        'date': _parse_date(message.get('Date', '')),
+    }
+
+
+def parse_headers(header_bytes):
+    """只解析邮件头（如 BODY[HEADER.FIELDS (FROM SUBJECT DATE)] 的返回），不构建正文"""
+    return summarize_headers(_header_parser.parsebytes(header_bytes or b''))
+
+
+def decode_payload(payload, encoding, charset=None):
+    """按传输编码和字符集解码部件内容"""
+    encoding = (encoding or '').strip().lower()
+    try:
+        if encoding == 'base64':
+            payload = base64.b64decode(payload)
+        elif encoding == 'quoted-printable':
+            payload = quopri.decodestring(payload)
+    except (ValueError, TypeError):
+        pass
+    try:
+        return payload.decode(charset or 'utf-8', errors='ignore')
+    except LookupError:
+        return payload.decode('utf-8', errors='ignore')
+
+
+def _split_header(raw, start, end):
+    """切分部件 raw[start:end]，返回 (头部字节, 正文起始偏移)；只复制头部
+    raw 可以是 bytes 或 mmap（只用 find、正则和小段切片）
+    """
+    if raw[start:start + 1] == b'\n' or raw[start:start + 2] == b'\r\n':
+        return b'', raw.find(b'\n', start, end) + 1  # 没有头部的部件
+    match = _HEADER_END_RE.search(raw, start, end)
+    if not match:
+        return raw[start:end], end
+    return raw[start:match.end()], match.end()
+
+
+def _split_multipart(raw, start, end, boundary):
+    """按 boundary 切分 raw[start:end] 中的 multipart 正文，返回各子部件的 (起始, 结束) 偏移，不复制内容
+    找不到分隔行时返回 None
+    """
+    delimiter = b'--' + boundary
+    pos = raw.find(delimiter, start, end)
+    if pos == -1:
+        return None
+    parts = []
+    while True:
+        after = pos + len(delimiter)
+        if raw[after:after + 2] == b'--':
+            break  # 结束分隔行
+        part_start = raw.find(b'\n', after, end)
+        if part_start == -1:
+            break
+        part_end = raw.find(b'\n' + delimiter, part_start, end)
+        if part_end == -1:
+            # 缺少结束分隔行，剩余部分作为最后一个部件
+            parts.append((part_start + 1, end))
+            break
+        pos = part_end + 1
+        if part_end > part_start + 1 and raw[part_end - 1:part_end] == b'\r':
+            part_end -= 1
+        parts.append((part_start + 1, part_end))
+    return parts
+
+
+def _scan(raw, start, end, state, depth=0):
+    """遍历部件 raw[start:end]：只解析每个部件的头，第一个非附件的 text/plain 才复制并解码正文
+    state: {'body': str 或 None, 'has_attachments': bool}，两者都确定后提前结束
+    state 中有 'html' 键时，同时记录第一个非附件的 text/html（没有 text/plain 时作为正文）
+    返回第一层的邮件头对象
+    """
+    header_bytes, body_start = _split_header(raw, start, end)
+    headers = _header_parser.parsebytes(header_bytes)
+    content_type = headers.get_content_type()
+    if content_type.startswith('multipart/') and depth < MAX_DEPTH:
+        boundary = headers.get_param('boundary')
+        parts = _split_multipart(raw, body_start, end, boundary.encode('utf-8', 'surrogateescape')) if boundary else None
+        if parts is not None:
+            for part_start, part_end in parts:
+                _scan(raw, part_start, part_end, state, depth + 1)
+                if state['has_attachments'] and state['body'] is not None:
+                    break
+            return headers
+
+    disposition = headers.get('Content-Disposition', '')
+    if 'attachment' in str(disposition).lower():
+        state['has_attachments'] = True
+    elif state['body'] is None and content_type == 'text/plain':
+        state['body'] = decode_payload(
+            raw[body_start:end], headers.get('Content-Transfer-Encoding'), headers.get_content_charset()
+        )
+    elif state.get('html', '') is None and content_type == 'text/html':
+        state['html'] = decode_payload(
+            raw[body_start:end], headers.get('Content-Transfer-Encoding'), headers.get_content_charset()
+        )
+    return headers
+
+
+def parse_message(raw_bytes, body_limit=BODY_LIMIT, html_fallback=False):
+    """解析完整邮件（RFC822）为列表项字段
+    按 boundary 在原始字节上查找偏移，只解析各部件的头，附件内容既不经过 MIME 解析器也不做 base64 解码
+    raw_bytes 可以是 mmap（BlobStore.open）：只复制各部件的头和选中的正文部件，附件不会被读入内存
+    body_limit: 正文最多保留的字符数，None 为不截断
+    html_fallback: 没有 text/plain 时使用 text/html 作为正文（与 find_text_part 一致）
+    返回: {'subject', 'sender', 'sender_email', 'date', 'body', 'has_attachments'}
+    """
+    state = {'body': None, 'has_attachments': False}
+    if html_fallback:
+        state['html'] = None
+    raw = raw_bytes or b''
+    summary = summarize_headers(_scan(raw, 0, len(raw), state))
+    body = state['body'] if state['body'] is not None else state.get('html')
+    summary['body'] = (body or '')[:body_limit]
+    summary['has_attachments'] = state['has_attachments']
+    return summary
+
+
+def parse_message_file(path, body_limit=BODY_LIMIT, html_fallback=False):
+    """内存映射读取文件并解析（BlobStore 中的原始邮件），参数和返回值同 parse_message
+    在解析进程中调用时只需传递路径，邮件内容不经过进程间传输
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return parse_message(b'', body_limit, html_fallback)  # 空文件不能映射
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as raw:
+            return parse_message(raw, body_limit, html_fallback)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+网络指标模块 - 按协议/阶段可配置的超时，按服务器统计各阶段耗时的直方图（p50/p95/p99）
+"""
+
+import bisect
+import contextlib
+import json
+import math
+import threading
+import time
+
+from core import tls
+
+
+# 各协议的阶段超时（秒）
+DEFAULT_TIMEOUTS = {
+    'imap': {'connect': 15, 'auth': 30, 'select': 30, 'fetch': 60},
+    'smtp': {'connect': 15, 'auth': 30, 'send': 120},
+    # read 是单次请求读取超时的上限，各请求自己的超时更小时以请求为准
+    'http': {'connect': 10, 'read': 120},
+}
+
+# 阶段显示名
+PHASE_NAMES = {
+    'connect': '连接', 'auth': '认证', 'select': '选择文件夹',
+    'fetch': '获取', 'search': '搜索', 'store': '标记', 'send': '发送', 'read': '读取', 'request': '请求',
+}
+
+
+class NetworkTimeouts:
+    """阶段超时配置，保存在设置表的 network_timeouts（JSON）中"""
+
+    SETTING_KEY = 'network_timeouts'
+
+    def __init__(self):
+        self._values = {protocol: dict(phases) for protocol, phases in DEFAULT_TIMEOUTS.items()}
+
+    def get(self, protocol, phase):
+        return self._values[protocol][phase]
+
+    def as_dict(self):
+        return {protocol: dict(phases) for protocol, phases in self._values.items()}
+
+    def update(self, values):
+        """合并配置，忽略未知阶段和非正数"""
+        for protocol, phases in (values or {}).items():
+            for phase, seconds in (phases or {}).items():
+                if phase in self._values.get(protocol, {}):
+                    try:
+                        seconds = int(seconds)
+                    except (TypeError, ValueError):
+                        continue
+                    if seconds > 0:
+                        self._values[protocol][phase] = seconds
+
+    def http_timeout(self, timeout=None):
+        """requests 的 (连接, 读取) 超时"""
+        read = self.get('http', 'read')
+        if isinstance(timeout, (int, float)):
+            read = min(read, timeout)
+        return self.get('http', 'connect'), read
+
+    def load(self, db):
+        try:
+            self.update(json.loads(db.get_setting(self.SETTING_KEY, '{}')))
+        except ValueError:
+            pass
+
+    def save(self, db):
+        db.set_setting(self.SETTING_KEY, json.dumps(self._values))
+
+
+class LatencyHistogram:
+    """对数分桶的耗时直方图（毫秒），相邻桶边界相差 25%，百分位误差不超过一个桶宽"""
+
+    BOUNDS = tuple(1.25 ** i for i in range(62))  # 1ms ~ 17 分钟
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.count += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        """第 p 百分位的耗时上界（毫秒），没有数据时为 None"""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                bound = self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+
+class LatencyRecorder:
+    """按 (协议, 服务器, 阶段) 统计耗时，失败的操作同样计入（超时正是要找的长尾）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def record(self, protocol, host, phase, seconds):
+        key = (protocol, host, phase)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(seconds * 1000)
+
+    @contextlib.contextmanager
+    def timer(self, protocol, host, phase):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(protocol, host, phase, time.monotonic() - start)
+
+    def summary(self):
+        """[{'protocol', 'host', 'phase', 'count', 'p50', 'p95', 'p99', 'max'}, ...]，按 p99 倒序"""
+        with self._lock:
+            rows = [{
+                'protocol': protocol, 'host': host, 'phase': phase, 'count': h.count,
+                'p50': h.percentile(50), 'p95': h.percentile(95), 'p99': h.percentile(99), 'max': h.max,
+            } for (protocol, host, phase), h in self._histograms.items()]
+        rows.sort(key=lambda row: row['p99'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# 全局超时配置和耗时统计
+network_timeouts = NetworkTimeouts()
+latency_stats = LatencyRecorder()
+
+
+class TimedIMAP4_SSL(tls.IMAP4_SSL):
+    """带阶段超时和耗时统计的 IMAP4_SSL
+
+    connect 包括 TCP 连接、TLS 握手和问候语；之后套接字默认使用 fetch 超时，
+    LOGIN/AUTHENTICATE 和 SELECT 期间临时切换到各自的超时。
+    """
+
+    def __init__(self, host, port):
+        with latency_stats.timer('imap', host, 'connect'):
+            super().__init__(host, port, timeout=network_timeouts.get('imap', 'connect'))
+        self._set_phase_timeout('fetch')
+
+    def login(self, user, password):
+        return self._run_phase('auth', super().login, user, password)
+
+    def authenticate(self, mechanism, authobject):
+        return self._run_phase('auth', super().authenticate, mechanism, authobject)
+
+    def select(self, mailbox='INBOX', readonly=False):
+        return self._run_phase('select', super().select, mailbox, readonly)
+
+    def uid(self, command, *args):
+        # SEARCH / STORE 等命令和 FETCH 共用 fetch 超时，按命令名分别统计
+        with latency_stats.timer('imap', self.host, command.lower()):
+            return super().uid(command, *args)
+
+    def _run_phase(self, phase, func, *args):
+        self._set_phase_timeout(phase)
+        try:
+            with latency_stats.timer('imap', self.host, phase):
+                return func(*args)
+        finally:
+            self._set_phase_timeout('fetch')
+
+    def _set_phase_timeout(self, phase):
+        try:
+            self.sock.settimeout(network_timeouts.get('imap', phase))
+        except OSError:
+            pass  # 连接已关闭
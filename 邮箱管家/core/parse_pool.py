@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+解析进程池 - 把原始邮件的 MIME 解析分发到多个进程，避开 GIL，网络线程可继续下载
+"""
+
+import functools
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core import mime_parser
+
+
+class ParsePool:
+    """MIME 解析进程池
+
+    - workers 为进程数，0 表示 CPU 核数，1 表示不用进程池（在调用线程解析）
+    - 进程池在第一次需要时创建；进程无法启动或中途崩溃时退回到本线程解析
+    - 只解析完整邮件（查看正文、检测时的正文）；邮件头解析得比进程间传输还快，始终在调用线程解析
+    - 本地存储的邮件只传路径，由解析进程内存映射读取
+    - 结果是 mime_parser 的字典（只含列表需要的字段），传回主进程的数据量很小
+    - 任务因进程池崩溃或修改进程数被取消时，在调用线程重新解析
+    """
+
+    SETTING_KEY = 'parse_workers'
+
+    def __init__(self, workers=0):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._broken = False
+        self.workers = self._resolve(workers)
+
+    @staticmethod
+    def _resolve(workers):
+        try:
+            workers = int(workers)
+        except (TypeError, ValueError):
+            workers = 0
+        return workers if workers > 0 else (os.cpu_count() or 1)
+
+    def configure(self, workers):
+        """修改进程数，正在运行的进程池处理完已提交的任务后关闭，下次使用时按新大小创建"""
+        workers = self._resolve(workers)
+        if workers != self.workers:
+            self.workers = workers
+            with self._lock:
+                executor, self._executor = self._executor, None
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def load(self, db):
+        self.configure(db.get_setting(self.SETTING_KEY, '0'))
+
+    def _get_executor(self):
+        if self.workers <= 1 or self._broken:
+            return None
+        with self._lock:
+            if self._executor is None:
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                except (OSError, NotImplementedError):
+                    self._broken = True
+            return self._executor
+
+    def _submit(self, func, arg):
+        """提交到进程池，没有进程池时返回 None"""
+        executor = self._get_executor()
+        if executor is None:
+            return None
+        try:
+            return executor.submit(func, arg)
+        except BrokenProcessPool:
+            self._mark_broken()
+        except RuntimeError:
+            pass  # 进程池刚被 configure 关闭
+        return None
+
+    def _result(self, future, func, arg):
+        """取解析结果；进程池崩溃或任务被取消时在本线程重新解析，解析本身的异常照常抛出"""
+        if future is not None:
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                self._mark_broken()
+            except CancelledError:
+                pass
+        return func(arg)
+
+    def _map(self, func, args_list):
+        futures = [self._submit(func, arg) for arg in args_list]
+        return [self._result(future, func, arg) for future, arg in zip(futures, args_list)]
+
+    def _mark_broken(self):
+        with self._lock:
+            self._broken = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def parse_message(self, raw_bytes, **kwargs):
+        """解析一封完整邮件，参数和返回值同 mime_parser.parse_message"""
+        func = functools.partial(mime_parser.parse_message, **kwargs)
+        return self._result(self._submit(func, raw_bytes), func, raw_bytes)
+
+    def parse_messages(self, raw_list, **kwargs):
+        """批量解析完整邮件 [raw_bytes, ...] -> [mime_parser.parse_message 结果, ...]，顺序不变"""
+        return self._map(functools.partial(mime_parser.parse_message, **kwargs), raw_list)
+
+    def parse_message_files(self, paths, **kwargs):
+        """批量解析本地存储的原始邮件 [path, ...]，顺序不变
+        文件缺失或损坏的邮件结果为 None
+        """
+        func = functools.partial(_parse_file_or_none, **kwargs)
+        return self._map(func, paths)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def _parse_file_or_none(path, **kwargs):
+    try:
+        return mime_parser.parse_message_file(path, **kwargs)
+    except (OSError, ValueError):
+        return None
+
+
+# 全局解析进程池
+parse_pool = ParsePool()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+限流与重试模块 - 按服务器/租户的自适应令牌桶，遵守 Retry-After，带抖动退避和重试预算
+"""
+
+import imaplib
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+from core.net_metrics import network_timeouts, latency_stats
+
+
+class TokenBucket:
+    """自适应令牌桶（AIMD）
+
+    - 每秒补充 rate 个令牌，最多积攒 capacity 个
+    - 收到限流信号时速率减半，并在 Retry-After 期间暂停发放
+    - 之后每次成功把速率加回一点，直到初始速率
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.2):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.capacity = capacity or max(1.0, rate * 2)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，没有时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def throttle(self, retry_after=None):
+        """收到限流信号：速率减半，清空积攒的令牌，Retry-After 期间暂停"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class RetryBudget:
+    """重试预算：每个请求存入 ratio 次重试额度，重试时扣除，避免故障时重试风暴"""
+
+    def __init__(self, ratio=0.2, reserve=10, cap=200):
+        self.ratio = ratio
+        self.cap = cap
+        self.balance = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.balance = min(self.cap, self.balance + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.balance >= 1:
+                self.balance -= 1
+                return True
+            return False
+
+
+class RateController:
+    """共享的限流/重试层
+
+    HTTP: 429/503 视为限流，按 Retry-After（秒数或 HTTP 日期）暂停对应服务器和租户的令牌桶；
+          500/502/504 和连接错误只对幂等请求重试（POST 只在服务器明确限流时重试）。
+    IMAP: 服务器拒绝登录并返回 [THROTTLED] / [UNAVAILABLE] / [LIMIT] 响应码或明确的连接数、限流提示时
+          视为限流，按抖动退避重试；套接字错误等其他失败不算限流。
+    统计每个服务器的请求、限流、重试次数，供调整并发数参考。
+    """
+
+    THROTTLE_STATUS = (429, 503)
+    RETRY_STATUS = (500, 502, 504)
+    IDEMPOTENT = ('GET', 'HEAD', 'PUT', 'DELETE', 'PATCH', 'OPTIONS')
+    # 单次 Retry-After 最长等待秒数
+    MAX_RETRY_AFTER = 120
+    # 各类令牌桶的初始速率（每秒）；tenant 桶按 EmailClient.tenant_key() 区分，微软个人账号每个邮箱一个
+    RATES = {'http': 50, 'imap': 5, 'tenant': 20}
+    # 只匹配服务器明确的限流答复：RFC 5530 响应码、Exchange 的 throttled 提示、Gmail 等的同时连接数提示；
+    # 不匹配 "try again later"、"exceeded"（如配额已满）或系统套接字错误这类一般性文字
+    IMAP_THROTTLE_RE = re.compile(
+        r'\[(?:THROTTLED|UNAVAILABLE|LIMIT)\]|request is throttled|'
+        r'too many (?:simultaneous |concurrent )?connections|'
+        r'(?:connection|login) rate limit|bandwidth limits',
+        re.IGNORECASE
+    )
+
+    def __init__(self, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = RetryBudget()
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._stats = {}
+
+    # ========== HTTP ==========
+    def request(self, method, url, tenant=None, **kwargs):
+        """发送 HTTP 请求（参数同 requests.request），限流和临时错误时自动重试
+        返回最后一次的 Response；重试用尽时仍返回限流响应，由调用方按原逻辑处理
+        """
+        method = method.upper()
+        host = urlsplit(url).hostname or ''
+        buckets = self._buckets_for('http', host, tenant)
+        # 连接超时统一配置，读取超时取请求自身和配置上限中较小的
+        kwargs['timeout'] = network_timeouts.http_timeout(kwargs.get('timeout'))
+        attempt = 0
+        while True:
+            self._acquire(buckets)
+            self._count(host, 'requests')
+            self.budget.deposit()
+            try:
+                with latency_stats.timer('http', host, 'request'):
+                    response = requests.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count(host, 'errors')
+                if method in self.IDEMPOTENT and self._may_retry(host, attempt):
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                raise
+
+            status = response.status_code
+            if status in self.THROTTLE_STATUS:
+                retry_after = self.parse_retry_after(response.headers.get('Retry-After'))
+                self._count(host, 'throttled')
+                for bucket in buckets:
+                    bucket.throttle(retry_after)
+                if self._may_retry(host, attempt):
+                    response.close()
+                    # Retry-After 由令牌桶暂停保证，这里只加抖动，避免所有线程同时恢复
+                    time.sleep(random.uniform(0, 1) if retry_after else self._backoff(attempt))
+                    attempt += 1
+                    continue
+                return response
+            if status in self.RETRY_STATUS and method in self.IDEMPOTENT:
+                self._count(host, 'errors')
+                if self._may_retry(host, attempt):
+                    response.close()
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                return response
+
+            for bucket in buckets:
+                bucket.success()
+            return response
+
+    def parse_retry_after(self, value):
+        """Retry-After 转为秒数（支持秒数和 HTTP 日期两种格式）"""
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            seconds = int(value)
+        else:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return max(0, min(self.MAX_RETRY_AFTER, seconds))
+
+    # ========== IMAP ==========
+    def is_imap_throttle(self, error):
+        return isinstance(error, imaplib.IMAP4.error) and \
+            bool(self.IMAP_THROTTLE_RE.search(str(error)))
+
+    def run_imap(self, func, host, tenant=None):
+        """执行 IMAP 连接/登录，服务器提示连接过多或限流时退避重试，其他错误直接抛出"""
+        key = f'imap:{host}'
+        buckets = self._buckets_for('imap', key, tenant)
+        attempt = 0
+        while True:
+            self._acquire(buckets)
+            self._count(key, 'requests')
+            self.budget.deposit()
+            try:
+                result = func()
+            except Exception as e:
+                if not self.is_imap_throttle(e):
+                    raise
+                self._count(key, 'throttled')
+                for bucket in buckets:
+                    bucket.throttle()
+                if self._may_retry(key, attempt):
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                raise
+            for bucket in buckets:
+                bucket.success()
+            return result
+
+    # ========== 统计 ==========
+    def stats(self):
+        """每个服务器的计数 {host: {'requests', 'throttled', 'retries', 'errors', 'budget_exhausted'}}"""
+        with self._lock:
+            return {host: dict(counts) for host, counts in self._stats.items()}
+
+    def totals(self):
+        """所有服务器的计数之和"""
+        totals = {'requests': 0, 'throttled': 0, 'retries': 0, 'errors': 0, 'budget_exhausted': 0}
+        for counts in self.stats().values():
+            for name, value in counts.items():
+                totals[name] += value
+        return totals
+
+    # ========== 内部 ==========
+    def _buckets_for(self, kind, host, tenant):
+        with self._lock:
+            keys = [(kind, host)]
+            if tenant:
+                keys.append(('tenant', tenant))
+            buckets = []
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(self.RATES[key[0]])
+                    self._buckets[key] = bucket
+                buckets.append(bucket)
+            return buckets
+
+    def _acquire(self, buckets):
+        for bucket in buckets:
+            bucket.acquire()
+
+    def _may_retry(self, host, attempt):
+        if attempt >= self.max_retries:
+            return False
+        if not self.budget.withdraw():
+            self._count(host, 'budget_exhausted')
+            return False
+        self._count(host, 'retries')
+        return True
+
+    def _backoff(self, attempt):
+        """指数退避 + 全抖动"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _count(self, host, name):
+        with self._lock:
+            counts = self._stats.setdefault(host, {
+                'requests': 0, 'throttled': 0, 'retries': 0, 'errors': 0, 'budget_exhausted': 0
+            })
+            counts[name] += 1
+
+
+# 全局限流控制器
+rate_controller = RateController()
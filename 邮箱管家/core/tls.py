@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+TLS 模块 - 共享 SSL 上下文（CA 证书只加载一次），按服务器缓存 TLS 会话以便恢复握手
+"""
+
+import imaplib
+import smtplib
+import socket
+import ssl
+import threading
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def shared_context():
+    """进程内共享的客户端 SSL 上下文
+    create_default_context() 每次都会重新加载系统 CA 证书，且会话只能在同一上下文中恢复
+    """
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = ssl.create_default_context()
+    return _context
+
+
+class TLSSessionCache:
+    """按 服务器:端口 缓存最近一次的 TLS 会话，新连接握手时尝试恢复
+
+    同一服务器上的所有账号共用一个会话（会话属于服务器，与登录账号无关），
+    服务器不接受时 OpenSSL 会自动回退到完整握手。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._stats = {'full': 0, 'resumed': 0}
+
+    def get(self, host, port):
+        with self._lock:
+            return self._sessions.get((host, port))
+
+    def store(self, host, port, sock):
+        """保存连接的会话并记录本次握手是否为恢复
+        TLS 1.3 的会话票据在握手后才下发，应在收到服务器首个响应后调用
+        """
+        session = getattr(sock, 'session', None)
+        with self._lock:
+            self._stats['resumed' if getattr(sock, 'session_reused', False) else 'full'] += 1
+            if session is not None and (session.has_ticket or session.id):
+                self._sessions[(host, port)] = session
+
+    def stats(self):
+        """握手次数 {'full': 完整握手, 'resumed': 会话恢复}"""
+        with self._lock:
+            return dict(self._stats)
+
+    def wrap(self, sock, host, port):
+        """用共享上下文包装套接字，有缓存会话时尝试恢复"""
+        return shared_context().wrap_socket(sock, server_hostname=host, session=self.get(host, port))
+
+
+# 全局 TLS 会话缓存
+tls_sessions = TLSSessionCache()
+
+
+class IMAP4_SSL(imaplib.IMAP4_SSL):
+    """使用共享上下文并恢复 TLS 会话的 IMAP4_SSL"""
+
+    def __init__(self, host='', port=imaplib.IMAP4_SSL_PORT, timeout=None):
+        super().__init__(host, port, ssl_context=shared_context(), timeout=timeout)
+        # 服务器问候语已读取，TLS 1.3 票据此时已到达
+        tls_sessions.store(self.host, self.port, self.sock)
+
+    def _create_socket(self, timeout):
+        sock = imaplib.IMAP4._create_socket(self, timeout)
+        return tls_sessions.wrap(sock, self.host, self.port)
+
+
+class SMTP_SSL(smtplib.SMTP_SSL):
+    """使用共享上下文并恢复 TLS 会话的 SMTP_SSL"""
+
+    def __init__(self, host='', port=0, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        self._tls_key = None
+        super().__init__(host, port, timeout=timeout, context=shared_context())
+        if self._tls_key:
+            # 服务器问候语已读取
+            tls_sessions.store(*self._tls_key, self.sock)
+
+    def _get_socket(self, host, port, timeout):
+        sock = smtplib.SMTP._get_socket(self, host, port, timeout)
+        self._tls_key = (host, port)
+        return tls_sessions.wrap(sock, host, port)
@@ -4,9 +4,10 @@
 """
 
 import sqlite3
+import json
 import os
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 
 def get_app_dir():
@@ -111,6 +112,183 @@ class DatabaseManager:
             )
         ''')
         
+        # 邮件缓存表补充列表所需字段
+        cursor.execute("PRAGMA table_info(emails)")
+        email_columns = [col[1] for col in cursor.fetchall()]
+        if 'sender_email' not in email_columns:
+            cursor.execute('ALTER TABLE emails ADD COLUMN sender_email TEXT')
+        if 'preview' not in email_columns:
+            cursor.execute('ALTER TABLE emails ADD COLUMN preview TEXT')
+        if 'has_attachments' not in email_columns:
+            cursor.execute('ALTER TABLE emails ADD COLUMN has_attachments INTEGER DEFAULT 0')
+        if 'size' not in email_columns:
+            cursor.execute('ALTER TABLE emails ADD COLUMN size INTEGER DEFAULT 0')
+        if 'attachments' not in email_columns:
+            # 附件元数据 JSON（列表请求时一并获取），NULL 表示未知
+            cursor.execute('ALTER TABLE emails ADD COLUMN attachments TEXT')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_account_folder_uid
+            ON emails (account_id, folder, uid)
+        ''')
+        # 旧版本按发件人时区保存的时间统一转换为 UTC，否则按文本排序不是时间顺序
+        cursor.execute("SELECT id, date FROM emails WHERE date IS NOT NULL AND date NOT LIKE '%+00:00'")
+        updates = []
+        for row_id, date in cursor.fetchall():
+            try:
+                updates.append((self._email_date_text(datetime.fromisoformat(date)), row_id))
+            except ValueError:
+                continue
+        cursor.executemany('UPDATE emails SET date = ? WHERE id = ?', updates)
+
+        # 同步状态表（每个账号每个文件夹一行）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                account_id INTEGER,
+                folder TEXT,
+                uidvalidity INTEGER,
+                uidnext INTEGER,
+                highestmodseq INTEGER,
+                delta_link TEXT,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (account_id, folder)
+            )
+        ''')
+
+        # 账号能力档案（API 类型、IMAP CAPABILITY、文件夹映射），避免每次重新探测
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS account_profiles (
+                account_id INTEGER PRIMARY KEY,
+                api_type TEXT,
+                capabilities TEXT,
+                folder_map TEXT,
+                updated_at TIMESTAMP
+            )
+        ''')
+
+        # 服务器端发现的文件夹（LIST SPECIAL-USE / Graph mailFolders），附带邮件数
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS account_folders (
+                account_id INTEGER,
+                folder TEXT,
+                name TEXT,
+                special TEXT,
+                position INTEGER,
+                unread INTEGER,
+                total INTEGER,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (account_id, folder)
+            )
+        ''')
+
+        # 文件夹计数表（批量检测时用 STATUS / mailFolders 刷新，不下载邮件）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS folder_counts (
+                account_id INTEGER,
+                folder TEXT,
+                unread INTEGER,
+                total INTEGER,
+                uidnext INTEGER,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (account_id, folder)
+            )
+        ''')
+
+        # 原始邮件存储索引（内容在 data/blobs/ 下按 SHA-256 存放，多个账号可指向同一摘要）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS message_blobs (
+                account_id INTEGER,
+                folder TEXT,
+                uid TEXT,
+                uidvalidity INTEGER,
+                digest TEXT,
+                size INTEGER,
+                created_at TIMESTAMP,
+                PRIMARY KEY (account_id, folder, uid)
+            )
+        ''')
+
+        # 附件存储索引（IMAP 为 文件夹+UID+部件号，Graph 的 folder 为空、message_id 为邮件 ID）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS attachment_blobs (
+                account_id INTEGER,
+                folder TEXT,
+                message_id TEXT,
+                attachment_id TEXT,
+                digest TEXT,
+                size INTEGER,
+                created_at TIMESTAMP,
+                PRIMARY KEY (account_id, folder, message_id, attachment_id)
+            )
+        ''')
+
+        # 验证码索引表（同步/检测时提取，received_at 为 UTC 时间文本，便于按时间范围查询）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS verification_codes (
+                account_id INTEGER,
+                folder TEXT,
+                uid TEXT,
+                sender TEXT,
+                sender_email TEXT,
+                subject TEXT,
+                code TEXT,
+                received_at TIMESTAMP,
+                created_at TIMESTAMP,
+                PRIMARY KEY (account_id, folder, uid)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_verification_codes_account
+            ON verification_codes (account_id, received_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_verification_codes_received
+            ON verification_codes (received_at)
+        ''')
+
+        # 关键词规则表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS keyword_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                fields TEXT DEFAULT 'subject',
+                patterns TEXT,
+                folder TEXT DEFAULT 'inbox',
+                recency_days INTEGER DEFAULT 30,
+                enabled INTEGER DEFAULT 1
+            )
+        ''')
+
+        # 账号标记表（每个账号每条规则一行，hits 为命中邮件数）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS account_flags (
+                account_id INTEGER,
+                flag TEXT,
+                hits INTEGER DEFAULT 0,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (account_id, flag)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_account_flags_flag
+            ON account_flags (flag, hits, account_id)
+        ''')
+
+        # 首次创建时写入默认规则，并把旧的 has_aws_code 迁移为 aws 标记
+        # 只做一次（记录在设置表中），用户删光规则后不会再写回来
+        cursor.execute("SELECT 1 FROM settings WHERE key = 'keyword_rules_seeded'")
+        if cursor.fetchone() is None:
+            cursor.execute('SELECT COUNT(*) FROM keyword_rules')
+            if cursor.fetchone()[0] == 0:
+                cursor.execute('''
+                    INSERT INTO keyword_rules (name, fields, patterns, folder, recency_days)
+                    VALUES ('aws', 'subject', 'aws,amazon', 'inbox', 30)
+                ''')
+                cursor.execute('''
+                    INSERT OR IGNORE INTO account_flags (account_id, flag, hits, updated_at)
+                    SELECT id, 'aws', 1, last_check FROM accounts WHERE has_aws_code = 1
+                ''')
+            cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('keyword_rules_seeded', '1')")
+
         # 插入默认分组
         cursor.execute("INSERT OR IGNORE INTO groups (name) VALUES ('默认分组')")
         
@@ -192,6 +370,11 @@ class DatabaseManager:
         """更新账号的 OAuth2 凭据"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        # 换了 client_id 后 token 的 scope 可能不同，API 类型需要重新判断
+        cursor.execute('''
+            UPDATE account_profiles SET api_type = NULL
+            WHERE account_id = ? AND (SELECT client_id FROM accounts WHERE id = ?) IS NOT ?
+        ''', (account_id, account_id, client_id))
         cursor.execute('''
             UPDATE accounts 
             SET client_id = ?, refresh_token = ?, account_type = 'OAuth2'
@@ -216,6 +399,14 @@ class DatabaseManager:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM accounts WHERE id = ?', (account_id,))
         cursor.execute('DELETE FROM emails WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM sync_state WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM account_flags WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM account_profiles WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM account_folders WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM folder_counts WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM message_blobs WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM attachment_blobs WHERE account_id = ?', (account_id,))
+        cursor.execute('DELETE FROM verification_codes WHERE account_id = ?', (account_id,))
         conn.commit()
         conn.close()
     
@@ -289,13 +480,151 @@ class DatabaseManager:
     
     # ========== AWS验证码标记 ==========
     def update_aws_code_status(self, account_id, has_code):
-        """更新账号的AWS验证码状态"""
+        """更新账号的AWS验证码状态（同时写入 aws 标记）"""
+        self.set_account_flags(account_id, {'aws': 1 if has_code else 0})
+
+    # ========== 验证码索引 ==========
+    @staticmethod
+    def _utc_text(date):
+        """时间转换为 UTC 文本（不带时区的时间按 UTC 处理）"""
+        if date.tzinfo is not None:
+            date = date.astimezone(timezone.utc)
+        return date.strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _code_row(row):
+        return {
+            'account_id': row[0], 'email': row[1], 'code': row[2], 'sender': row[3],
+            'sender_email': row[4], 'subject': row[5],
+            'received_at': datetime.strptime(row[6], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc),
+        }
+
+    def save_verification_codes(self, account_id, folder, codes):
+        """保存提取到的验证码（每封邮件一条，重复提取时覆盖）
+        codes: CodeExtractor.collect 的结果
+        """
+        if not codes:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        now = datetime.now(timezone.utc)
+        cursor.executemany('''
+            INSERT OR REPLACE INTO verification_codes
+            (account_id, folder, uid, sender, sender_email, subject, code, received_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(account_id, folder, str(c['uid']), c.get('sender', ''), c.get('sender_email', ''),
+               c.get('subject', ''), c['code'], self._utc_text(c.get('received_at') or now), datetime.now())
+              for c in codes])
+        conn.commit()
+        conn.close()
+
+    def get_latest_code(self, account_id, sender=None):
+        """账号最新的验证码
+        sender: 只看发件人地址包含该文本的邮件
+        返回: {'account_id', 'email', 'code', 'sender', 'sender_email', 'subject', 'received_at'} 或 None
+        """
+        sql = '''
+            SELECT v.account_id, a.email, v.code, v.sender, v.sender_email, v.subject, v.received_at
+            FROM verification_codes v LEFT JOIN accounts a ON a.id = v.account_id
+            WHERE v.account_id = ?
+        '''
+        params = [account_id]
+        if sender:
+            sql += ' AND v.sender_email LIKE ?'
+            params.append(f'%{sender}%')
+        sql += ' ORDER BY v.received_at DESC LIMIT 1'
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        conn.close()
+        return self._code_row(row) if row else None
+
+    def get_recent_codes(self, minutes=10):
+        """所有账号最近 minutes 分钟内收到的验证码（新的在前）"""
+        since = self._utc_text(datetime.now(timezone.utc) - timedelta(minutes=minutes))
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT v.account_id, a.email, v.code, v.sender, v.sender_email, v.subject, v.received_at
+            FROM verification_codes v LEFT JOIN accounts a ON a.id = v.account_id
+            WHERE v.received_at >= ?
+            ORDER BY v.received_at DESC
+        ''', (since,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [self._code_row(row) for row in rows]
+
+    # ========== 关键词规则与账号标记 ==========
+    def get_keyword_rules(self):
+        """获取所有关键词规则
+        返回: [{'name', 'fields', 'patterns', 'folder', 'recency_days', 'enabled'}, ...]
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('UPDATE accounts SET has_aws_code = ? WHERE id = ?', (1 if has_code else 0, account_id))
+        cursor.execute('''
+            SELECT name, fields, patterns, folder, recency_days, enabled
+            FROM keyword_rules ORDER BY id
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return [{
+            'name': row[0],
+            'fields': [f for f in (row[1] or '').split(',') if f],
+            'patterns': [p for p in (row[2] or '').split(',') if p],
+            'folder': row[3] or 'inbox',
+            'recency_days': row[4] or 0,
+            'enabled': bool(row[5]),
+        } for row in rows]
+
+    def save_keyword_rules(self, rules):
+        """整体保存关键词规则，已删除规则的账号标记一并清除"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM keyword_rules')
+        cursor.executemany('''
+            INSERT INTO keyword_rules (name, fields, patterns, folder, recency_days, enabled)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(
+            r['name'], ','.join(r['fields']), ','.join(r['patterns']),
+            r.get('folder') or 'inbox', int(r.get('recency_days') or 0), 1 if r.get('enabled', True) else 0
+        ) for r in rules])
+        names = [r['name'] for r in rules]
+        placeholders = ','.join('?' * len(names))
+        cursor.execute(f'DELETE FROM account_flags WHERE flag NOT IN ({placeholders})', names)
+        if 'aws' not in names:
+            cursor.execute('UPDATE accounts SET has_aws_code = 0')
         conn.commit()
         conn.close()
     
+    def set_account_flags(self, account_id, flags):
+        """保存账号的规则命中数
+        flags: {规则名: 命中数}，aws 标记同步到 has_aws_code 列以兼容旧数据
+        """
+        if not flags:
+            return
+        now = datetime.now().isoformat()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO account_flags (account_id, flag, hits, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(account_id, flag) DO UPDATE SET hits = excluded.hits, updated_at = excluded.updated_at
+        ''', [(account_id, name, int(hits), now) for name, hits in flags.items()])
+        if 'aws' in flags:
+            cursor.execute('UPDATE accounts SET has_aws_code = ? WHERE id = ?',
+                           (1 if flags['aws'] else 0, account_id))
+        conn.commit()
+        conn.close()
+
+    def get_account_flags(self, account_id):
+        """获取账号命中的标记 {规则名: 命中数}"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT flag, hits FROM account_flags WHERE account_id = ? AND hits > 0', (account_id,))
+        flags = dict(cursor.fetchall())
+        conn.close()
+        return flags
+
     def update_account_remark(self, account_id, remark):
         """更新账号备注"""
         conn = self.get_connection()
@@ -304,6 +633,367 @@ class DatabaseManager:
         conn.commit()
         conn.close()
     
+    # ========== 账号能力档案 ==========
+    def get_account_profile(self, account_id):
+        """获取账号能力档案
+        返回: {'api_type', 'capabilities': [...], 'folder_map': {...}} 或 None
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT api_type, capabilities, folder_map FROM account_profiles WHERE account_id = ?
+        ''', (account_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+        try:
+            folder_map = json.loads(row[2]) if row[2] else {}
+        except ValueError:
+            folder_map = {}
+        return {
+            'api_type': row[0],
+            'capabilities': row[1].split() if row[1] else [],
+            'folder_map': folder_map,
+        }
+
+    def save_account_profile(self, account_id, api_type=None, capabilities=None, folder_map=None):
+        """保存账号能力档案，只更新传入的字段"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO account_profiles (account_id, api_type, capabilities, folder_map, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(account_id) DO UPDATE SET
+                api_type = COALESCE(excluded.api_type, api_type),
+                capabilities = COALESCE(excluded.capabilities, capabilities),
+                folder_map = COALESCE(excluded.folder_map, folder_map),
+                updated_at = excluded.updated_at
+        ''', (
+            account_id, api_type,
+            ' '.join(capabilities) if capabilities is not None else None,
+            json.dumps(folder_map, ensure_ascii=False) if folder_map is not None else None,
+            datetime.now()
+        ))
+        conn.commit()
+        conn.close()
+
+    def get_account_folders(self, account_id):
+        """获取缓存的文件夹列表（按服务器发现时的顺序）
+        返回: [{'folder', 'name', 'special', 'unread', 'total'}, ...]
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT folder, name, special, unread, total FROM account_folders
+            WHERE account_id = ? ORDER BY position
+        ''', (account_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [
+            {'folder': r[0], 'name': r[1], 'special': r[2], 'unread': r[3], 'total': r[4]}
+            for r in rows
+        ]
+
+    def save_account_folders(self, account_id, folders):
+        """替换账号的文件夹列表"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        now = datetime.now()
+        cursor.execute('DELETE FROM account_folders WHERE account_id = ?', (account_id,))
+        cursor.executemany('''
+            INSERT INTO account_folders (account_id, folder, name, special, position, unread, total, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (account_id, f['folder'], f['name'], f.get('special'), i, f.get('unread'), f.get('total'), now)
+            for i, f in enumerate(folders)
+        ])
+        conn.commit()
+        conn.close()
+
+    def save_folder_counts(self, account_id, counts):
+        """保存文件夹计数 {文件夹: {'unread', 'total', 'uidnext'}}，同时更新文件夹列表中的未读/总数"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        now = datetime.now()
+        for folder, c in counts.items():
+            cursor.execute('''
+                INSERT OR REPLACE INTO folder_counts (account_id, folder, unread, total, uidnext, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (account_id, folder, c.get('unread'), c.get('total'), c.get('uidnext'), now))
+            cursor.execute('''
+                UPDATE account_folders SET unread = ?, total = ?, updated_at = ?
+                WHERE account_id = ? AND folder = ?
+            ''', (c.get('unread'), c.get('total'), now, account_id, folder))
+        conn.commit()
+        conn.close()
+
+    def get_unread_counts(self, folder='inbox'):
+        """所有账号某个文件夹的未读数 {account_id: unread}，未统计过的账号不在其中"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT account_id, unread FROM folder_counts WHERE folder = ? AND unread IS NOT NULL', (folder,)
+        )
+        counts = dict(cursor.fetchall())
+        conn.close()
+        return counts
+
+    # ========== 原始邮件/附件存储 ==========
+    def save_message_blobs(self, account_id, folder, uidvalidity, blobs):
+        """记录原始邮件的存储摘要
+        blobs: {uid: (digest, size)}
+        UIDVALIDITY 变化时旧 UID 已失效，先清掉该文件夹的旧记录
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        now = datetime.now()
+        self._purge_stale_blobs(cursor, account_id, folder, uidvalidity)
+        cursor.executemany('''
+            INSERT OR REPLACE INTO message_blobs (account_id, folder, uid, uidvalidity, digest, size, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(account_id, folder, str(uid), uidvalidity, digest, size, now)
+              for uid, (digest, size) in blobs.items()])
+        conn.commit()
+        conn.close()
+
+    def purge_stale_blobs(self, account_id, folder, uidvalidity):
+        """UIDVALIDITY 变化时清掉该文件夹按旧 UID 记录的原始邮件/附件（同步时调用）"""
+        if uidvalidity is None:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        self._purge_stale_blobs(cursor, account_id, folder, uidvalidity)
+        conn.commit()
+        conn.close()
+
+    def _purge_stale_blobs(self, cursor, account_id, folder, uidvalidity):
+        if uidvalidity is None:
+            return
+        cursor.execute('''
+            DELETE FROM message_blobs WHERE account_id = ? AND folder = ? AND uidvalidity != ?
+        ''', (account_id, folder, uidvalidity))
+        if cursor.rowcount:
+            cursor.execute(
+                'DELETE FROM attachment_blobs WHERE account_id = ? AND folder = ?', (account_id, folder)
+            )
+
+    def get_message_blobs(self, account_id, folder, uids):
+        """批量获取原始邮件的存储摘要 {uid: digest}，没有记录的 UID 不在结果中"""
+        uids = [str(uid) for uid in uids]
+        if not uids:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        result = {}
+        # SQLite 单条语句的参数个数有上限，分批查询
+        for i in range(0, len(uids), 500):
+            chunk = uids[i:i + 500]
+            cursor.execute(f'''
+                SELECT uid, digest FROM message_blobs
+                WHERE account_id = ? AND folder = ? AND uid IN ({','.join('?' * len(chunk))})
+            ''', (account_id, folder, *chunk))
+            result.update(cursor.fetchall())
+        conn.close()
+        return result
+
+    def get_message_blob(self, account_id, folder, uid):
+        """获取原始邮件的存储摘要，没有时返回 None"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT digest FROM message_blobs WHERE account_id = ? AND folder = ? AND uid = ?',
+            (account_id, folder, str(uid))
+        )
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def save_attachment_blob(self, account_id, folder, message_id, attachment_id, digest, size):
+        """记录附件的存储摘要"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO attachment_blobs
+            (account_id, folder, message_id, attachment_id, digest, size, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (account_id, folder, str(message_id), str(attachment_id), digest, size, datetime.now()))
+        conn.commit()
+        conn.close()
+
+    def get_attachment_blob(self, account_id, folder, message_id, attachment_id):
+        """获取附件的存储摘要，没有时返回 None"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT digest FROM attachment_blobs
+            WHERE account_id = ? AND folder = ? AND message_id = ? AND attachment_id = ?
+        ''', (account_id, folder, str(message_id), str(attachment_id)))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def get_blob_digests(self):
+        """所有仍被引用的摘要（用于清理存储）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT digest FROM message_blobs UNION SELECT digest FROM attachment_blobs')
+        digests = {row[0] for row in cursor.fetchall()}
+        conn.close()
+        return digests
+
+    # ========== 邮件同步 ==========
+    def get_sync_state(self, account_id, folder):
+        """获取文件夹同步状态
+        返回: {'uidvalidity', 'uidnext', 'highestmodseq', 'delta_link'} 或 None
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT uidvalidity, uidnext, highestmodseq, delta_link FROM sync_state
+            WHERE account_id = ? AND folder = ?
+        ''', (account_id, folder))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+        return {'uidvalidity': row[0], 'uidnext': row[1], 'highestmodseq': row[2], 'delta_link': row[3]}
+
+    def save_sync_state(self, account_id, folder, uidvalidity=None, uidnext=None,
+                        highestmodseq=None, delta_link=None):
+        """保存文件夹同步状态"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO sync_state
+            (account_id, folder, uidvalidity, uidnext, highestmodseq, delta_link, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (account_id, folder, uidvalidity, uidnext, highestmodseq, delta_link, datetime.now()))
+        conn.commit()
+        conn.close()
+
+    def clear_folder_emails(self, account_id, folder):
+        """清空文件夹的本地邮件和同步状态（UIDVALIDITY 变化时需要全量重建）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM emails WHERE account_id = ? AND folder = ?', (account_id, folder))
+        cursor.execute('DELETE FROM sync_state WHERE account_id = ? AND folder = ?', (account_id, folder))
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _email_date_text(date):
+        """邮件时间统一保存为 UTC ISO 文本（不带时区的时间按 UTC 处理），按文本排序即时间顺序"""
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return date.astimezone(timezone.utc).isoformat()
+
+    def save_emails(self, account_id, folder, emails):
+        """新增或更新本地邮件（按 uid 去重）
+        邮件没有 attachments 键时保留已保存的附件元数据
+        """
+        if not emails:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO emails (account_id, folder, uid, sender, sender_email, subject, date,
+                                preview, is_read, has_attachments, size, attachments)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (account_id, folder, uid) DO UPDATE SET
+                sender = excluded.sender, sender_email = excluded.sender_email,
+                subject = excluded.subject, date = excluded.date, preview = excluded.preview,
+                is_read = excluded.is_read, has_attachments = excluded.has_attachments,
+                size = excluded.size, attachments = COALESCE(excluded.attachments, emails.attachments)
+        ''', [(account_id, folder, str(e['uid']), e.get('sender', ''), e.get('sender_email', ''),
+               e.get('subject', ''), self._email_date_text(e['date']) if e.get('date') else None,
+               e.get('preview', ''), 1 if e.get('is_read') else 0,
+               1 if e.get('has_attachments') else 0, e.get('size', 0),
+               json.dumps(e['attachments'], ensure_ascii=False) if e.get('attachments') is not None else None)
+              for e in emails])
+        conn.commit()
+        conn.close()
+
+    def update_email_flags(self, account_id, folder, read_flags):
+        """批量更新已读状态
+        read_flags: {uid: is_read}
+        """
+        if not read_flags:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE emails SET is_read = ? WHERE account_id = ? AND folder = ? AND uid = ?',
+            [(1 if is_read else 0, account_id, folder, str(uid)) for uid, is_read in read_flags.items()]
+        )
+        conn.commit()
+        conn.close()
+
+    def delete_emails_by_uid(self, account_id, folder, uids):
+        """删除本地邮件（服务器上已删除）"""
+        if not uids:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            'DELETE FROM emails WHERE account_id = ? AND folder = ? AND uid = ?',
+            [(account_id, folder, str(uid)) for uid in uids]
+        )
+        conn.commit()
+        conn.close()
+
+    def get_email_uids(self, account_id, folder):
+        """获取本地已同步的 uid 列表"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT uid FROM emails WHERE account_id = ? AND folder = ?', (account_id, folder))
+        uids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return uids
+
+    def get_cached_emails(self, account_id, folder, limit=50, by_uid=False):
+        """从本地邮件表读取列表（按时间倒序）
+        by_uid: 按 UID 倒序（IMAP），与服务器端按 UID 分页的游标一致
+        """
+        order = 'CAST(uid AS INTEGER) DESC' if by_uid else 'date DESC'
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT uid, sender, sender_email, subject, date, preview, is_read, has_attachments, size, attachments
+            FROM emails WHERE account_id = ? AND folder = ?
+            ORDER BY {order} LIMIT ?
+        ''', (account_id, folder, limit))
+        rows = cursor.fetchall()
+        conn.close()
+
+        emails = []
+        for row in rows:
+            try:
+                # 保存的是 UTC，显示用本地时间
+                date = datetime.fromisoformat(row[4]).astimezone() if row[4] else None
+            except ValueError:
+                date = None
+            email_data = {
+                'uid': row[0],
+                'sender': row[1] or '',
+                'sender_email': row[2] or '',
+                'subject': row[3] or '',
+                'date': date,
+                'body': '',
+                'body_loaded': False,
+                'preview': row[5] or '',
+                'is_read': bool(row[6]),
+                'has_attachments': bool(row[7]),
+                'size': row[8] or 0,
+            }
+            if row[9] is not None:
+                try:
+                    email_data['attachments'] = json.loads(row[9])
+                except ValueError:
+                    pass
+            emails.append(email_data)
+        return emails
+
     # ========== 设置管理 ==========
     def get_setting(self, key, default=None):
         """获取设置值"""
@@ -322,20 +1012,28 @@ class DatabaseManager:
         conn.commit()
         conn.close()
     
-    def get_all_accounts_sorted(self, sort_by='id', sort_order='DESC'):
-        """获取排序后的所有账号"""
+    # 按标记筛选账号的条件（走 idx_account_flags_flag 索引）
+    FLAG_FILTER_SQL = 'id IN (SELECT account_id FROM account_flags WHERE flag = ? AND hits > 0)'
+
+    def get_all_accounts_sorted(self, sort_by='id', sort_order='DESC', flag=None):
+        """获取排序后的所有账号
+        flag: 只返回命中该标记的账号
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         valid_columns = ['id', 'email', 'group_name', 'status', 'account_type', 'has_aws_code']
         if sort_by not in valid_columns:
             sort_by = 'id'
         order = 'DESC' if sort_order.upper() == 'DESC' else 'ASC'
-        cursor.execute(f'SELECT * FROM accounts ORDER BY {sort_by} {order}')
+        if flag:
+            cursor.execute(f'SELECT * FROM accounts WHERE {self.FLAG_FILTER_SQL} ORDER BY {sort_by} {order}', (flag,))
+        else:
+            cursor.execute(f'SELECT * FROM accounts ORDER BY {sort_by} {order}')
         accounts = cursor.fetchall()
         conn.close()
         return accounts
     
-    def get_accounts_by_group_sorted(self, group_name, sort_by='id', sort_order='DESC'):
+    def get_accounts_by_group_sorted(self, group_name, sort_by='id', sort_order='DESC', flag=None):
         """按分组获取排序后的账号"""
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -343,7 +1041,11 @@ class DatabaseManager:
         if sort_by not in valid_columns:
             sort_by = 'id'
         order = 'DESC' if sort_order.upper() == 'DESC' else 'ASC'
-        cursor.execute(f'SELECT * FROM accounts WHERE group_name = ? ORDER BY {sort_by} {order}', (group_name,))
+        if flag:
+            cursor.execute(f'SELECT * FROM accounts WHERE group_name = ? AND {self.FLAG_FILTER_SQL} ORDER BY {sort_by} {order}',
+                           (group_name, flag))
+        else:
+            cursor.execute(f'SELECT * FROM accounts WHERE group_name = ? ORDER BY {sort_by} {order}', (group_name,))
         accounts = cursor.fetchall()
         conn.close()
         return accounts
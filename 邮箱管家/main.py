@@ -5,6 +5,7 @@
 
 import sys
 import os
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 from ui.main_window import MainWindow
@@ -27,4 +28,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # 打包后解析进程池的子进程从这里启动
+    multiprocessing.freeze_support()
     main()
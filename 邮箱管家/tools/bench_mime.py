@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+MIME 解析基准 - 对比原来的 email.message_from_bytes 解析与 core/mime_parser.parse_message
+
+对 .eml 语料逐封解析，输出每种方式的吞吐量，并检查两种方式取到的正文和附件标记是否一致。
+没有语料时用 --generate 生成（纯文本、multipart/alternative、带 base64 附件的混合邮件）。
+
+用法:
+    python tools/bench_mime.py 邮件目录/
+    python tools/bench_mime.py --generate 300 --attachment-kb 256
+"""
+
+import argparse
+import email
+import glob
+import os
+import random
+import sys
+import time
+from email.header import decode_header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import parsedate_to_datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import mime_parser  # noqa: E402
+
+
+def _legacy_decode_str(s):
+    if not s:
+        return ''
+    result = []
+    for part, charset in decode_header(s):
+        if isinstance(part, bytes):
+            try:
+                result.append(part.decode(charset or 'utf-8', errors='ignore'))
+            except LookupError:
+                result.append(part.decode('utf-8', errors='ignore'))
+        else:
+            result.append(part)
+    return ''.join(result)
+
+
+def legacy_parse(raw_bytes):
+    """原来的解析方式：整封邮件经过 email 解析器，walk 全部部件"""
+    msg = email.message_from_bytes(raw_bytes)
+    subject = _legacy_decode_str(msg.get('Subject', ''))
+    sender = _legacy_decode_str(msg.get('From', ''))
+    try:
+        date = parsedate_to_datetime(msg.get('Date', ''))
+    except (TypeError, ValueError):
+        date = None
+    body = ''
+    if msg.is_multipart():
+        for part in msg.walk():
+            if part.get_content_type() == 'text/plain':
+                try:
+                    charset = part.get_content_charset() or 'utf-8'
+                    body = part.get_payload(decode=True).decode(charset, errors='ignore')
+                    break
+                except (AttributeError, LookupError):
+                    pass
+    else:
+        try:
+            charset = msg.get_content_charset() or 'utf-8'
+            body = msg.get_payload(decode=True).decode(charset, errors='ignore')
+        except (AttributeError, LookupError):
+            pass
+    has_attachments = msg.is_multipart() and any(
+        'attachment' in part.get('Content-Disposition', '') for part in msg.walk()
+    )
+    return {'subject': subject, 'sender': sender, 'date': date,
+            'body': body[:mime_parser.BODY_LIMIT], 'has_attachments': has_attachments}
+
+
+def generate_corpus(count, attachment_kb, seed=1):
+    """生成测试邮件，返回 [bytes, ...]"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            msg = MIMEText(f'您的验证码是 {rng.randint(100000, 999999)}，10 分钟内有效。', 'plain', 'utf-8')
+        else:
+            alternative = MIMEMultipart('alternative')
+            alternative.attach(MIMEText(f'Order #{i} shipped.\n' * 20, 'plain', 'utf-8'))
+            alternative.attach(MIMEText(f'<p>Order #{i} shipped.</p>' * 20, 'html', 'utf-8'))
+            if kind == 1:
+                msg = alternative
+            else:
+                msg = MIMEMultipart()
+                msg.attach(alternative)
+                attachment = MIMEApplication(rng.randbytes(attachment_kb * 1024))
+                attachment.add_header('Content-Disposition', 'attachment', filename=f'invoice-{i}.pdf')
+                msg.attach(attachment)
+        msg['Subject'] = f'=?utf-8?b?5rWL6K+V?= #{i}'
+        msg['From'] = f'Sender {i} <sender{i}@example.com>'
+        msg['Date'] = 'Mon, 19 Oct 2026 10:00:00 +0800'
+        corpus.append(msg.as_bytes().replace(b'\n', b'\r\n'))
+    return corpus
+
+
+def load_corpus(directory):
+    paths = sorted(glob.glob(os.path.join(directory, '**', '*.eml'), recursive=True))
+    corpus = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def bench(name, parse, corpus, rounds):
+    """返回最快一轮的解析结果"""
+    best, results = None, None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        results = [parse(raw) for raw in corpus]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    size_mb = sum(len(raw) for raw in corpus) / 1024 / 1024
+    print(f'{name:<14} {best * 1000:9.1f}ms  {len(corpus) / best:9.0f} 封/秒  {size_mb / best:8.1f} MB/秒')
+    return results
+
+
+def compare(old_results, new_results):
+    """两种方式的正文（忽略首尾空白）和附件标记是否一致，返回不一致的邮件序号"""
+    return [i for i, (old, new) in enumerate(zip(old_results, new_results))
+            if old['body'].strip() != new['body'].strip()
+            or old['has_attachments'] != new['has_attachments']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='email 解析器 / mime_parser 吞吐量对比')
+    parser.add_argument('directory', nargs='?', help='.eml 语料目录（递归查找）')
+    parser.add_argument('--generate', type=int, default=300, help='没有语料目录时生成的邮件数')
+    parser.add_argument('--attachment-kb', type=int, default=256, help='生成邮件的附件大小')
+    parser.add_argument('--rounds', type=int, default=3, help='重复次数，取最快一轮')
+    args = parser.parse_args()
+
+    if args.directory:
+        corpus = load_corpus(args.directory)
+        if not corpus:
+            parser.error(f'{args.directory} 下没有 .eml 文件')
+    else:
+        corpus = generate_corpus(args.generate, args.attachment_kb)
+    size_mb = sum(len(raw) for raw in corpus) / 1024 / 1024
+    print(f'{len(corpus)} 封邮件，共 {size_mb:.1f} MB')
+
+    old_results = bench('email 解析器', legacy_parse, corpus, args.rounds)
+    new_results = bench('mime_parser', mime_parser.parse_message, corpus, args.rounds)
+    mismatched = compare(old_results, new_results)
+    if mismatched:
+        print(f'正文/附件标记不一致: {len(mismatched)} 封，序号 {mismatched[:10]}')
+    else:
+        print('正文/附件标记一致')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+TLS 握手基准 - 对比完整握手与会话恢复的耗时（core/tls.py）
+
+默认在本机启动一个 TLS 服务器（临时自签名证书，需要 openssl 命令），
+模拟 IMAP 服务器发送问候语后关闭连接；也可以用 --host 测试真实服务器。
+
+用法:
+    python tools/bench_tls.py
+    python tools/bench_tls.py -n 200 --tls 1.2
+    python tools/bench_tls.py --host outlook.office365.com --port 993 -n 20
+"""
+
+import argparse
+import os
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import tls  # noqa: E402
+
+
+GREETING = b'* OK bench ready\r\n'
+
+
+def make_certificate(directory):
+    """生成 localhost 的自签名证书，返回 (证书路径, 私钥路径)"""
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost',
+         '-keyout', key, '-out', cert],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return cert, key
+
+
+class LocalServer:
+    """本机 TLS 服务器：握手后发送问候语，读到客户端关闭为止"""
+
+    def __init__(self, cert, key, max_version=None):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert, key)
+        if max_version is not None:
+            self.context.maximum_version = max_version
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(sock,), daemon=True).start()
+
+    def _handle(self, sock):
+        # 服务器分多次写出握手消息、会话票据和问候语，本机回环上会撞上 Nagle + 延迟确认（约 40ms）
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            with self.context.wrap_socket(sock, server_side=True) as conn:
+                conn.sendall(GREETING)
+                while conn.recv(1024):
+                    pass
+        except (OSError, ssl.SSLError):
+            pass
+
+    def close(self):
+        self.listener.close()
+
+
+def connect_once(cache, host, port, timeout):
+    """按 tls.IMAP4_SSL 的方式连接一次：用缓存会话握手，读问候语后保存会话
+    返回 (耗时秒数, 是否为会话恢复)
+    """
+    start = time.perf_counter()
+    sock = socket.create_connection((host, port), timeout=timeout)
+    with cache.wrap(sock, host, port) as conn:
+        conn.recv(1024)  # 问候语，TLS 1.3 的会话票据随后到达
+        elapsed = time.perf_counter() - start
+        cache.store(host, port, conn)
+        return elapsed, conn.session_reused
+
+
+def run(mode, host, port, count, timeout):
+    """mode: 'full' 每次用新的缓存（不恢复）；'resumed' 共用一个缓存"""
+    cache = tls.TLSSessionCache()
+    times, reused = [], 0
+    connect_once(cache, host, port, timeout)  # 预热：建立连接并取得会话
+    for _ in range(count):
+        if mode == 'full':
+            cache = tls.TLSSessionCache()
+        elapsed, was_reused = connect_once(cache, host, port, timeout)
+        times.append(elapsed * 1000)
+        reused += was_reused
+    return times, reused
+
+
+def report(mode, times, reused):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f'{mode:<8} n={len(times):<5} 恢复={reused:<5} '
+          f'平均={statistics.mean(times):7.2f}ms 中位数={statistics.median(times):7.2f}ms p95={p95:7.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TLS 完整握手 / 会话恢复耗时对比')
+    parser.add_argument('--host', help='测试真实服务器（默认启动本机服务器）')
+    parser.add_argument('--port', type=int, default=993)
+    parser.add_argument('-n', '--count', type=int, default=100, help='每种方式的连接次数')
+    parser.add_argument('--tls', choices=['1.2', '1.3'], help='本机服务器的最高 TLS 版本')
+    parser.add_argument('--timeout', type=float, default=10)
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as directory:
+        if args.host:
+            host, port = args.host, args.port
+        else:
+            cert, key = make_certificate(directory)
+            max_version = {'1.2': ssl.TLSVersion.TLSv1_2, '1.3': ssl.TLSVersion.TLSv1_3}.get(args.tls)
+            server = LocalServer(cert, key, max_version)
+            host, port = 'localhost', server.port
+            # 共享上下文改为信任临时证书，其余设置与 create_default_context() 相同
+            tls._context = ssl.create_default_context(cafile=cert)
+
+        print(f'{host}:{port}  OpenSSL: {ssl.OPENSSL_VERSION}')
+        try:
+            for mode in ('full', 'resumed'):
+                report(mode, *run(mode, host, port, args.count, args.timeout))
+        finally:
+            if server is not None:
+                server.close()
+
+
+if __name__ == '__main__':
+    main()
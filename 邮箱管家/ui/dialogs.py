@@ -6,12 +6,17 @@
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QPushButton, QComboBox, QTextEdit, QTextBrowser, QFileDialog, QMessageBox,
-    QListWidget, QListWidgetItem, QWidget, QFrame, QScrollArea, QCheckBox
+    QListWidget, QListWidgetItem, QWidget, QFrame, QScrollArea, QCheckBox,
+    QTableWidget, QTableWidgetItem, QHeaderView, QSpinBox, QGridLayout
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QColor
 
 from core.email_client import EmailClient
+from core.mail_sync import MailSyncEngine
+from core.mail_watcher import FolderWatcher
+from core.keyword_rules import load_rule_set
+from core.net_metrics import network_timeouts, PHASE_NAMES
 import os
 
 
@@ -806,21 +811,353 @@ class ImportDialog(QDialog):
         return accounts
 
 
+class KeywordRulesDialog(QDialog):
+    """关键词规则编辑对话框"""
+
+    # 字段选项: 显示名 -> 规则字段列表
+    FIELD_OPTIONS = [
+        ('标题', ['subject']),
+        ('发件人', ['sender']),
+        ('标题+发件人', ['subject', 'sender']),
+    ]
+    FOLDER_OPTIONS = [('收件箱', 'inbox'), ('垃圾邮件', 'junk')]
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.setWindowTitle('关键词规则')
+        self.setMinimumSize(720, 440)
+        self.setStyleSheet(DIALOG_STYLE)
+        self.init_ui()
+        for rule in self.db.get_keyword_rules():
+            self.add_rule_row(rule)
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(24, 24, 24, 24)
+        layout.setSpacing(16)
+
+        title = QLabel('关键词规则')
+        title.setStyleSheet("font-size: 20px; font-weight: 600; color: #1A1A1A;")
+        layout.addWidget(title)
+
+        info = QLabel('检测账号时在服务器端搜索关键词，命中的账号会被打上以规则名命名的标记。'
+                      '多个关键词用逗号分隔，不区分大小写；天数为 0 表示不限时间。')
+        info.setStyleSheet("color: #616161; font-size: 13px;")
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        self.table = QTableWidget(0, 6)
+        self.table.setHorizontalHeaderLabels(['启用', '规则名', '匹配字段', '关键词', '文件夹', '天数'])
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table, 1)
+
+        btn_row = QHBoxLayout()
+        btn_add = QPushButton('添加规则')
+        btn_add.setStyleSheet(BTN_DEFAULT)
+        btn_add.clicked.connect(lambda: self.add_rule_row())
+        btn_remove = QPushButton('删除选中')
+        btn_remove.setStyleSheet(BTN_DEFAULT)
+        btn_remove.clicked.connect(self.remove_selected_rows)
+        btn_row.addWidget(btn_add)
+        btn_row.addWidget(btn_remove)
+        btn_row.addStretch()
+
+        btn_cancel = QPushButton('取消')
+        btn_cancel.setStyleSheet(BTN_DEFAULT)
+        btn_cancel.clicked.connect(self.reject)
+        btn_ok = QPushButton('保存')
+        btn_ok.setStyleSheet(BTN_PRIMARY)
+        btn_ok.clicked.connect(self.save_rules)
+        btn_row.addWidget(btn_cancel)
+        btn_row.addSpacing(12)
+        btn_row.addWidget(btn_ok)
+        layout.addLayout(btn_row)
+
+    def add_rule_row(self, rule=None):
+        rule = rule or {'name': '', 'fields': ['subject'], 'patterns': [], 'folder': 'inbox',
+                        'recency_days': 30, 'enabled': True}
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+
+        enabled_item = QTableWidgetItem()
+        enabled_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled | Qt.ItemIsSelectable)
+        enabled_item.setCheckState(Qt.Checked if rule['enabled'] else Qt.Unchecked)
+        self.table.setItem(row, 0, enabled_item)
+        self.table.setItem(row, 1, QTableWidgetItem(rule['name']))
+
+        field_combo = QComboBox()
+        for label, fields in self.FIELD_OPTIONS:
+            field_combo.addItem(label, fields)
+            if sorted(fields) == sorted(rule['fields']):
+                field_combo.setCurrentIndex(field_combo.count() - 1)
+        self.table.setCellWidget(row, 2, field_combo)
+
+        self.table.setItem(row, 3, QTableWidgetItem(', '.join(rule['patterns'])))
+
+        folder_combo = QComboBox()
+        for label, folder in self.FOLDER_OPTIONS:
+            folder_combo.addItem(label, folder)
+            if folder == rule['folder']:
+                folder_combo.setCurrentIndex(folder_combo.count() - 1)
+        self.table.setCellWidget(row, 4, folder_combo)
+
+        self.table.setItem(row, 5, QTableWidgetItem(str(rule['recency_days'])))
+
+    def remove_selected_rows(self):
+        rows = sorted({index.row() for index in self.table.selectedIndexes()}, reverse=True)
+        for row in rows:
+            self.table.removeRow(row)
+
+    def _cell_text(self, row, column):
+        item = self.table.item(row, column)
+        return item.text().strip() if item else ''
+
+    def save_rules(self):
+        rules, names = [], set()
+        for row in range(self.table.rowCount()):
+            name = self._cell_text(row, 1)
+            patterns = [p.strip() for p in self._cell_text(row, 3).replace('，', ',').split(',') if p.strip()]
+            if not name and not patterns:
+                continue  # 忽略空行
+            if not name or name in names:
+                QMessageBox.warning(self, '错误', f'第 {row + 1} 行规则名为空或重复')
+                return
+            if not patterns:
+                QMessageBox.warning(self, '错误', f'规则 {name} 没有关键词')
+                return
+            days_text = self._cell_text(row, 5) or '0'
+            if not days_text.isdigit():
+                QMessageBox.warning(self, '错误', f'规则 {name} 的天数必须是非负整数')
+                return
+            names.add(name)
+            rules.append({
+                'name': name,
+                'fields': self.table.cellWidget(row, 2).currentData(),
+                'patterns': patterns,
+                'folder': self.table.cellWidget(row, 4).currentData(),
+                'recency_days': int(days_text),
+                'enabled': self.table.item(row, 0).checkState() == Qt.Checked,
+            })
+        self.db.save_keyword_rules(rules)
+        self.accept()
+
+
+class NetworkTimeoutsDialog(QDialog):
+    """网络超时设置对话框（按协议和阶段）"""
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.spins = {}
+        self.setWindowTitle('网络超时')
+        self.setMinimumWidth(420)
+        self.setStyleSheet(DIALOG_STYLE)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(24, 24, 24, 24)
+        layout.setSpacing(16)
+
+        title = QLabel('网络超时')
+        title.setStyleSheet("font-size: 20px; font-weight: 600; color: #1A1A1A;")
+        layout.addWidget(title)
+
+        info = QLabel('单位为秒。服务器无响应时，操作在对应阶段超时后失败，不会一直占用检测线程。')
+        info.setStyleSheet("color: #616161; font-size: 13px;")
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        grid = QGridLayout()
+        grid.setHorizontalSpacing(16)
+        grid.setVerticalSpacing(8)
+        for row, (protocol, phases) in enumerate(network_timeouts.as_dict().items()):
+            grid.addWidget(QLabel(protocol.upper()), row, 0)
+            for column, (phase, seconds) in enumerate(phases.items(), start=1):
+                spin = QSpinBox()
+                spin.setRange(1, 600)
+                spin.setValue(seconds)
+                spin.setPrefix(f'{PHASE_NAMES[phase]} ')
+                grid.addWidget(spin, row, column)
+                self.spins[(protocol, phase)] = spin
+        layout.addLayout(grid)
+
+        btn_row = QHBoxLayout()
+        btn_row.addStretch()
+        btn_cancel = QPushButton('取消')
+        btn_cancel.setStyleSheet(BTN_DEFAULT)
+        btn_cancel.clicked.connect(self.reject)
+        btn_ok = QPushButton('保存')
+        btn_ok.setStyleSheet(BTN_PRIMARY)
+        btn_ok.clicked.connect(self.save_timeouts)
+        btn_row.addWidget(btn_cancel)
+        btn_row.addSpacing(12)
+        btn_row.addWidget(btn_ok)
+        layout.addLayout(btn_row)
+
+    def save_timeouts(self):
+        values = {}
+        for (protocol, phase), spin in self.spins.items():
+            values.setdefault(protocol, {})[phase] = spin.value()
+        network_timeouts.update(values)
+        network_timeouts.save(self.db)
+        self.accept()
+
+
 class FetchEmailThread(QThread):
-    """获取邮件线程"""
-    finished = pyqtSignal(list, str)
+    """获取邮件线程（第一页）"""
+    finished = pyqtSignal(list, str, object)  # emails, msg, next_cursor
     
-    def __init__(self, account, folder='inbox', db_manager=None):
+    def __init__(self, account, folder='inbox', db_manager=None, page_size=50):
         super().__init__()
         self.account = account
         self.folder = folder
         self.db_manager = db_manager
+        self.page_size = page_size
     
     def run(self):
         client = create_email_client(self.account, self.db_manager)
-        emails, msg = client.fetch_emails(folder=self.folder, limit=50)
+        if self.db_manager:
+            # 增量同步到本地邮件表，只传输新增/变化/删除的邮件；
+            # 首次同步时最新一页写入本地后就先显示，其余邮件在本线程继续补齐
+            shown = []
+            stats, msg = MailSyncEngine(client, self.db_manager).sync(
+                self.folder, on_ready=lambda: shown.append(self.emit_cached_page(client, "获取成功"))
+            )
+            if any(shown) or (stats is not None and self.emit_cached_page(client, msg)):
+                self.check_keyword_rules(client)
+                return
+        emails, next_cursor, msg = client.fetch_emails_page(self.folder, None, self.page_size)
         client.disconnect()
-        self.finished.emit(emails, msg)
+        self.finished.emit(emails, msg, next_cursor)
+        self.check_keyword_rules(client)
+
+    def emit_cached_page(self, client, msg):
+        """从本地邮件表取第一页发出
+        Graph 只同步最近的邮件，本地为空时返回 False，改为从服务器分页获取
+        """
+        # IMAP 的下一页按 UID 取，首页也必须是 UID 最大的一批，否则会漏掉邮件
+        emails = self.db_manager.get_cached_emails(self.account[0], self.folder, limit=self.page_size,
+                                                   by_uid=not client.use_graph_api())
+        if not emails and client.use_graph_api():
+            return False
+        self.finished.emit(emails, msg, client.page_cursor_after(emails))
+        return True
+
+    def check_keyword_rules(self, client):
+        """列表显示后按关键词规则在服务器端搜索并更新账号标记"""
+        if self.folder != 'inbox' or not self.db_manager:
+            return
+        hits, _ = client.evaluate_rules(load_rule_set(self.db_manager))
+        if hits:
+            self.db_manager.set_account_flags(self.account[0], hits)
+
+
+class LoadMoreEmailsThread(QThread):
+    """加载下一页邮件线程"""
+    finished = pyqtSignal(list, object, str)  # emails, next_cursor, msg
+
+    def __init__(self, account, folder, cursor, db_manager=None, page_size=50):
+        super().__init__()
+        self.account = account
+        self.folder = folder
+        self.cursor = cursor
+        self.db_manager = db_manager
+        self.page_size = page_size
+
+    def run(self):
+        client = create_email_client(self.account, self.db_manager)
+        emails, next_cursor, msg = client.fetch_emails_page(self.folder, self.cursor, self.page_size)
+        self.finished.emit(emails, next_cursor, msg)
+
+
+class FetchBodyThread(QThread):
+    """按需获取邮件正文线程"""
+    finished = pyqtSignal(str, object, str)  # uid, body (None 表示失败), msg
+
+    def __init__(self, account, email_id, folder='inbox', db_manager=None):
+        super().__init__()
+        self.account = account
+        self.email_id = email_id
+        self.folder = folder
+        self.db_manager = db_manager
+
+    def run(self):
+        client = create_email_client(self.account, self.db_manager)
+        body, msg = client.fetch_email_body(self.email_id, self.folder)
+        self.finished.emit(self.email_id, body, msg)
+
+
+class MailWatchThread(QThread):
+    """新邮件监听线程（IDLE 推送或轮询）"""
+    new_emails = pyqtSignal(list)
+
+    # 已停止但仍在运行（连接中、刷新 token、轮询请求中）的线程，保持引用直到 finished，
+    # 避免 QThread 在运行中被销毁
+    _retiring = []
+
+    def __init__(self, account, folder, emails, db_manager=None):
+        super().__init__()
+        self.account = account
+        self.folder = folder
+        self.db_manager = db_manager
+        self.uids = [e.get('uid') for e in emails]
+        self.watcher = None
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+        if self.watcher:
+            self.watcher.stop()
+
+    def retire(self):
+        """停止监听，线程结束后再释放；不在界面线程等待"""
+        try:
+            self.new_emails.disconnect()
+        except TypeError:
+            pass
+        self.stop()
+        MailWatchThread._retiring.append(self)
+        self.finished.connect(self._release)
+        if not self.isRunning():
+            self._release()
+
+    def _release(self):
+        if self in MailWatchThread._retiring:
+            MailWatchThread._retiring.remove(self)
+            self.deleteLater()
+
+    def run(self):
+        # 创建客户端可能需要获取 token，放在线程中执行
+        client = create_email_client(self.account, self.db_manager)
+        numeric = [int(u) for u in self.uids if str(u).isdigit()]
+        self.watcher = FolderWatcher(
+            client, self.folder,
+            last_uid=max(numeric) if numeric and not client.use_graph_api() else None,
+            known_ids=self.uids
+        )
+        if self._stopped:
+            return
+        self.watcher.run(self.new_emails.emit)
+
+
+class FolderListThread(QThread):
+    """从服务器发现文件夹（含未读/总数）线程"""
+    finished = pyqtSignal(object, str)  # folders (None 表示失败), msg
+
+    def __init__(self, account, db_manager=None):
+        super().__init__()
+        self.account = account
+        self.db_manager = db_manager
+
+    def run(self):
+        client = create_email_client(self.account, self.db_manager)
+        folders, msg = client.discover_folders()
+        self.finished.emit(folders, msg)
 
 
 class EmailViewDialog(QDialog):
@@ -835,17 +1172,30 @@ class EmailViewDialog(QDialog):
         'deleted': '已删除',
     }
     
+    # 每页邮件数
+    PAGE_SIZE = 50
+
     def __init__(self, account, db, parent=None):
         super().__init__(parent)
         self.account = account
         self.db = db
         self.current_folder = 'inbox'
         self.all_emails = []  # 存储所有邮件用于搜索
+        # IMAP 的 UID 只在文件夹内唯一，正文缓存和加载线程都按 (文件夹, uid) 记录
+        self.body_cache = {}  # 已加载的正文缓存 {(folder, uid): body}
+        self.body_threads = {}  # 正在加载正文的线程 {(folder, uid): thread}
+        self.next_cursor = None  # 下一页游标，None 表示没有更多
+        self.loading_more = False
+        self.list_generation = 0  # 每次重新加载列表递增，用于丢弃过期的分页结果
+        self.watch_thread = None  # 当前文件夹的新邮件监听线程
+        self.folder_thread = None
+        self.folder_labels = dict(self.FOLDER_NAMES)  # 文件夹键 -> 显示名称
         self.setWindowTitle(f'邮件 - {account[1]}')
         self.setMinimumSize(1000, 650)
         self.setStyleSheet("QDialog { background-color: #F3F3F3; font-family: 'Segoe UI', 'Microsoft YaHei UI'; }")
         self.init_ui()
         self.fetch_emails()
+        self.load_folders()
     
     def init_ui(self):
         layout = QHBoxLayout(self)
@@ -897,8 +1247,8 @@ class EmailViewDialog(QDialog):
                 color: #1A1A1A;
             }
         """)
-        for key, name in self.FOLDER_NAMES.items():
-            self.folder_combo.addItem(name, key)
+        # 有缓存时直接列出服务器上的文件夹，否则先显示默认文件夹
+        self.populate_folders(self.db.get_account_folders(self.account[0]))
         self.folder_combo.currentIndexChanged.connect(self.on_folder_changed)
         row1.addWidget(self.folder_combo)
         
@@ -1038,6 +1388,7 @@ class EmailViewDialog(QDialog):
         """)
         self.email_list.itemClicked.connect(self.show_email_content)
         self.email_list.itemSelectionChanged.connect(self.on_selection_changed)
+        self.email_list.verticalScrollBar().valueChanged.connect(self.on_list_scrolled)
         left_layout.addWidget(self.email_list)
         layout.addWidget(left_panel)
         
@@ -1109,13 +1460,41 @@ class EmailViewDialog(QDialog):
         right_layout.addWidget(self.content_text, 1)
         layout.addWidget(right_panel, 1)
     
+    def populate_folders(self, folders):
+        """填充文件夹下拉框，保留当前选择"""
+        if not folders:
+            folders = [{'folder': key, 'name': name} for key, name in self.FOLDER_NAMES.items()]
+        self.folder_combo.blockSignals(True)
+        self.folder_combo.clear()
+        for f in folders:
+            name = self.FOLDER_NAMES.get(f['folder'], f['name'])
+            self.folder_labels[f['folder']] = name
+            if f.get('total') is not None:
+                name = f"{name} ({f.get('unread') or 0}/{f['total']})"
+            self.folder_combo.addItem(name, f['folder'])
+        index = self.folder_combo.findData(self.current_folder)
+        self.folder_combo.setCurrentIndex(max(index, 0))
+        self.folder_combo.blockSignals(False)
+
+    def load_folders(self):
+        """后台从服务器刷新文件夹列表"""
+        self.folder_thread = FolderListThread(self.account, self.db)
+        self.folder_thread.finished.connect(self.on_folders_loaded)
+        self.folder_thread.start()
+
+    def on_folders_loaded(self, folders, msg):
+        if folders:
+            self.populate_folders(folders)
+
     def on_folder_changed(self, index):
         """文件夹切换"""
         self.current_folder = self.folder_combo.currentData()
+        self.body_cache = {}
         self.search_input.clear()
         self.fetch_emails()
     
     def fetch_emails(self):
+        self.stop_watching()
         self.email_list.clear()
         self.all_emails = []
         self.loading_label.show()
@@ -1125,8 +1504,11 @@ class EmailViewDialog(QDialog):
         self.content_text.setText('')
         self.attachment_widget.hide()
         self.reset_buttons()
+        self.next_cursor = None
+        self.loading_more = False
+        self.list_generation += 1
         
-        self.fetch_thread = FetchEmailThread(self.account, self.current_folder, self.db)
+        self.fetch_thread = FetchEmailThread(self.account, self.current_folder, self.db, self.PAGE_SIZE)
         self.fetch_thread.finished.connect(self.on_emails_fetched)
         self.fetch_thread.start()
     
@@ -1161,68 +1543,152 @@ class EmailViewDialog(QDialog):
             self.mark_btn.setEnabled(True)
             self.mark_btn.setText(f'标记 ({count})')
     
-    def on_emails_fetched(self, emails, msg):
+    def on_emails_fetched(self, emails, msg, next_cursor=None):
         self.loading_label.hide()
         self.all_emails = emails  # 保存所有邮件用于搜索
+        self.next_cursor = next_cursor
         
         if not emails:
-            folder_name = self.FOLDER_NAMES.get(self.current_folder, self.current_folder)
+            folder_name = self.folder_labels.get(self.current_folder, self.current_folder)
             self.subject_label.setText(f'{folder_name} 暂无邮件\n{msg}')
+        else:
+            self.display_emails(emails)
+        self.start_watching()
+
+    def start_watching(self):
+        """列表加载完成后监听当前文件夹的新邮件"""
+        self.stop_watching()
+        generation = self.list_generation
+        self.watch_thread = MailWatchThread(self.account, self.current_folder, self.all_emails, self.db)
+        self.watch_thread.new_emails.connect(
+            lambda emails: self.on_new_emails(generation, emails)
+        )
+        self.watch_thread.start()
+
+    def stop_watching(self):
+        thread, self.watch_thread = self.watch_thread, None
+        if thread is not None:
+            thread.retire()
+
+    def on_new_emails(self, generation, emails):
+        """监听到新邮件：插入列表顶部"""
+        if generation != self.list_generation:
+            return  # 已切换文件夹
+        known = {e.get('uid') for e in self.all_emails}
+        new_emails = [e for e in emails if e.get('uid') not in known]
+        if not new_emails:
             return
+        self.all_emails[:0] = new_emails
         
-        self.display_emails(emails)
-        
-        # 自动检测 AWS 验证码邮件并更新数据库
-        if self.current_folder == 'inbox':
-            self.check_aws_emails(emails)
-    
-    def check_aws_emails(self, emails):
-        """检测邮件列表中是否有 AWS 验证码邮件（只检查标题）"""
-        # AWS 验证码邮件的标题特征
-        aws_keywords = [
-            'aws',
-            'amazon',
-        ]
+        search_text = self.search_input.text()
+        if search_text:
+            self.filter_emails(search_text)
+        else:
+            if not self.email_list.count():
+                self.subject_label.setText('选择一封邮件查看')
+            # emails 按新到旧排列，倒序插入到顶部
+            for email_data in reversed(new_emails):
+                self.add_email_item(email_data, row=0)
+
+    def done(self, result):
+        self.stop_watching()
+        super().done(result)
+
+    def on_list_scrolled(self, value):
+        """滚动到列表底部时在后台加载下一页"""
+        bar = self.email_list.verticalScrollBar()
+        if value >= bar.maximum() - 2:
+            self.load_more_emails()
+
+    def load_more_emails(self):
+        """加载下一页邮件"""
+        if self.loading_more or not self.next_cursor:
+            return
+        self.loading_more = True
         
-        aws_count = 0
-        for email_data in emails:
-            subject = email_data.get('subject', '').lower()
-            
-            # 只检查标题是否包含 aws 或 amazon
-            if any(kw in subject for kw in aws_keywords):
-                aws_count += 1
+        self.more_item = QListWidgetItem('加载更多...')
+        self.more_item.setFlags(Qt.NoItemFlags)
+        self.more_item.setTextAlignment(Qt.AlignCenter)
+        self.email_list.addItem(self.more_item)
         
-        # 更新数据库
-        has_aws = aws_count > 0
-        self.db.update_aws_code_status(self.account[0], has_aws)
+        generation = self.list_generation
+        self.more_thread = LoadMoreEmailsThread(
+            self.account, self.current_folder, self.next_cursor, self.db, self.PAGE_SIZE
+        )
+        self.more_thread.finished.connect(
+            lambda emails, cursor, msg: self.on_more_emails_loaded(generation, emails, cursor, msg)
+        )
+        self.more_thread.start()
+
+    def on_more_emails_loaded(self, generation, emails, next_cursor, msg):
+        """下一页加载完成"""
+        if generation != self.list_generation:
+            return  # 列表已重新加载，丢弃旧结果
+        self.loading_more = False
+        if getattr(self, 'more_item', None) is not None:
+            try:
+                row = self.email_list.row(self.more_item)
+                if row >= 0:
+                    self.email_list.takeItem(row)
+            except RuntimeError:
+                pass  # 搜索过滤时列表已被清空
+            self.more_item = None
+
+        if not emails and next_cursor is None and msg != "获取成功":
+            # 加载失败，保留游标以便再次滚动时重试
+            return
+        self.next_cursor = next_cursor
+
+        # 本地同步表和服务器分页可能重叠，按 uid 去重
+        known = {e.get('uid') for e in self.all_emails}
+        new_emails = [e for e in emails if e.get('uid') not in known]
+        self.all_emails.extend(new_emails)
+
+        search_text = self.search_input.text()
+        if search_text:
+            self.filter_emails(search_text)
+        else:
+            for email_data in new_emails:
+                self.add_email_item(email_data)
+
+        # 列表还没填满可视区域时继续加载（搜索过滤时不自动翻页）
+        if not search_text and self.email_list.verticalScrollBar().maximum() == 0:
+            self.load_more_emails()
     
     def display_emails(self, emails):
         """显示邮件列表"""
         self.email_list.clear()
         
         for email_data in emails:
-            item = QListWidgetItem()
-            sender = email_data.get('sender', '')[:30]
-            subject = email_data.get('subject', '(无主题)')[:40]
-            date = email_data.get('date')
-            date_str = date.strftime('%m/%d %H:%M') if date else ''
-            is_read = email_data.get('is_read', True)
-            has_attachments = email_data.get('has_attachments', False)
-            
-            # 附件标记
-            att_mark = '📎 ' if has_attachments else ''
-            
-            # 未读邮件加粗显示
-            if not is_read:
-                item.setText(f"● {att_mark}{sender}\n{subject}\n{date_str}")
-                font = item.font()
-                font.setBold(True)
-                item.setFont(font)
-            else:
-                item.setText(f"{att_mark}{sender}\n{subject}\n{date_str}")
-            
-            item.setData(Qt.UserRole, email_data)
+            self.add_email_item(email_data)
+
+    def add_email_item(self, email_data, row=None):
+        """添加一封邮件，row 为 None 时添加到列表末尾"""
+        item = QListWidgetItem()
+        sender = email_data.get('sender', '')[:30]
+        subject = email_data.get('subject', '(无主题)')[:40]
+        date = email_data.get('date')
+        date_str = date.strftime('%m/%d %H:%M') if date else ''
+        is_read = email_data.get('is_read', True)
+        has_attachments = email_data.get('has_attachments', False)
+
+        # 附件标记
+        att_mark = '📎 ' if has_attachments else ''
+
+        # 未读邮件加粗显示
+        if not is_read:
+            item.setText(f"● {att_mark}{sender}\n{subject}\n{date_str}")
+            font = item.font()
+            font.setBold(True)
+            item.setFont(font)
+        else:
+            item.setText(f"{att_mark}{sender}\n{subject}\n{date_str}")
+
+        item.setData(Qt.UserRole, email_data)
+        if row is None:
             self.email_list.addItem(item)
+        else:
+            self.email_list.insertItem(row, item)
     
     def filter_emails(self, text):
         """搜索过滤邮件（只搜索发件人和主题）"""
@@ -1293,22 +1759,68 @@ class EmailViewDialog(QDialog):
         date_str = date.strftime('%Y-%m-%d %H:%M') if date else ''
         self.info_label.setText(f"发件人: {data.get('sender', '')}\n时间: {date_str}")
         
-        # 显示邮件内容，支持 HTML 格式（链接可点击）
-        body = data.get('body', '')
-        if '<html' in body.lower() or '<a ' in body.lower() or '<div' in body.lower():
-            # HTML 格式邮件，直接显示
-            self.content_text.setHtml(body)
+        # 正文按需加载：列表只包含头信息，打开时才获取正文并缓存
+        uid = data.get('uid')
+        if data.get('body_loaded', True):
+            self.display_body(data.get('body', ''))
+        elif (self.current_folder, uid) in self.body_cache:
+            self.current_email['body'] = self.body_cache[(self.current_folder, uid)]
+            self.display_body(self.current_email['body'])
         else:
-            # 纯文本邮件，转换为 HTML 以保持格式
-            self.content_text.setPlainText(body)
+            preview = data.get('preview', '')
+            self.content_text.setPlainText(f"{preview}\n\n正在加载正文..." if preview else '正在加载正文...')
+            self.load_email_body(uid)
         
-        # 处理附件
+        # 处理附件：列表已带附件元数据（Graph $expand / IMAP BODYSTRUCTURE）时直接显示
         has_attachments = data.get('has_attachments', False)
-        if has_attachments:
+        if has_attachments and data.get('attachments') is not None:
+            self.on_attachments_loaded(data['attachments'], "获取成功")
+        elif has_attachments:
             self.load_attachments(data.get('uid'))
         else:
             self.attachment_widget.hide()
     
+    def display_body(self, body):
+        """显示邮件内容，支持 HTML 格式（链接可点击）"""
+        body = body or ''
+        if '<html' in body.lower() or '<a ' in body.lower() or '<div' in body.lower():
+            # HTML 格式邮件，直接显示
+            self.content_text.setHtml(body)
+        else:
+            # 纯文本邮件，转换为 HTML 以保持格式
+            self.content_text.setPlainText(body)
+
+    def load_email_body(self, email_id):
+        """后台加载邮件正文"""
+        key = (self.current_folder, email_id)
+        if key in self.body_threads:
+            return
+        thread = FetchBodyThread(self.account, email_id, self.current_folder, self.db)
+        thread.finished.connect(lambda uid, body, msg, key=key: self.on_body_loaded(key, body, msg))
+        self.body_threads[key] = thread
+        thread.start()
+
+    def on_body_loaded(self, key, body, msg):
+        """正文加载完成"""
+        thread = self.body_threads.pop(key, None)
+        if thread is not None:
+            thread.wait()  # finished 是 run() 的最后一步，这里只等线程退出，随后即可释放
+        folder, email_id = key
+        if folder != self.current_folder:
+            return  # 已切换文件夹，同一 UID 在新文件夹中是另一封邮件
+        if body is not None:
+            self.body_cache[key] = body
+
+        # 用户可能已切换到其他邮件
+        current = getattr(self, 'current_email', None)
+        if not current or current.get('uid') != email_id:
+            return
+        if body is None:
+            self.content_text.setPlainText(f'正文加载失败: {msg}')
+            return
+        current['body'] = body
+        self.display_body(body)
+
     def load_attachments(self, email_id):
         """加载附件列表"""
         self.attachment_thread = GetAttachmentsThread(self.account, email_id, self.current_folder)
@@ -1383,31 +1895,48 @@ class EmailViewDialog(QDialog):
         if not folder:
             return
         
-        success_count = 0
-        fail_count = 0
-        
+        jobs = []
         for att in self.current_attachments:
-            try:
-                content = create_email_client(self.account).download_attachment(att)
-                if content:
-                    # 处理文件名冲突
-                    file_path = os.path.join(folder, att['name'])
-                    base, ext = os.path.splitext(file_path)
-                    counter = 1
-                    while os.path.exists(file_path):
-                        file_path = f"{base}_{counter}{ext}"
-                        counter += 1
-                    
-                    with open(file_path, 'wb') as f:
-                        f.write(content)
-                    success_count += 1
-                else:
-                    fail_count += 1
-            except Exception:
-                fail_count += 1
-        
+            # 处理文件名冲突
+            file_path = os.path.join(folder, att['name'])
+            base, ext = os.path.splitext(file_path)
+            counter = 1
+            while os.path.exists(file_path) or any(p == file_path for _, p in jobs):
+                file_path = f"{base}_{counter}{ext}"
+                counter += 1
+            jobs.append((att, file_path))
+
+        self.start_attachment_download(jobs, folder)
+
+    def start_attachment_download(self, jobs, target):
+        """后台流式下载附件到磁盘"""
+        if hasattr(self, 'download_thread') and self.download_thread.isRunning():
+            QMessageBox.information(self, '提示', '正在下载附件，请稍候')
+            return
+        self.attachment_label.setText('下载中...')
+        self.download_thread = DownloadAttachmentsThread(self.account, jobs, self.current_folder, self.db)
+        self.download_thread.progress.connect(self.on_download_progress)
+        self.download_thread.finished.connect(
+            lambda success_count, fail_count, msg: self.on_download_finished(success_count, fail_count, msg, target)
+        )
+        self.download_thread.start()
+
+    def on_download_progress(self, index, total_files, done, total):
+        """附件下载进度"""
+        percent = int(done * 100 / total) if total else 0
+        prefix = f'({index}/{total_files}) ' if total_files > 1 else ''
+        self.attachment_label.setText(f'下载中 {prefix}{percent}%')
+
+    def on_download_finished(self, success_count, fail_count, msg, target):
+        """附件下载完成"""
+        self.attachment_label.setText('附件:')
         if fail_count == 0:
-            QMessageBox.information(self, '成功', f'已成功下载 {success_count} 个附件到:\n{folder}')
+            if success_count == 1:
+                QMessageBox.information(self, '成功', f'附件已保存到:\n{target}')
+            else:
+                QMessageBox.information(self, '成功', f'已成功下载 {success_count} 个附件到:\n{target}')
+        elif success_count == 0:
+            QMessageBox.warning(self, '错误', f'无法下载附件\n{msg}')
         else:
             QMessageBox.warning(self, '部分成功', f'成功: {success_count} 个\n失败: {fail_count} 个')
     
@@ -1430,17 +1959,7 @@ class EmailViewDialog(QDialog):
         # 选择保存路径
         path, _ = QFileDialog.getSaveFileName(self, '保存附件', att['name'])
         if path:
-            try:
-                content = create_email_client(self.account).download_attachment(att)
-                
-                if content:
-                    with open(path, 'wb') as f:
-                        f.write(content)
-                    QMessageBox.information(self, '成功', f'附件已保存到:\n{path}')
-                else:
-                    QMessageBox.warning(self, '错误', '无法下载附件')
-            except Exception as e:
-                QMessageBox.warning(self, '错误', f'保存失败: {e}')
+            self.start_attachment_download([(att, path)], path)
     
     def toggle_read_status(self):
         """切换已读/未读状态（支持批量）"""
@@ -1784,6 +2303,39 @@ class GetAttachmentsThread(QThread):
         self.finished.emit(attachments, msg)
 
 
+class DownloadAttachmentsThread(QThread):
+    """流式下载附件线程"""
+    progress = pyqtSignal(int, int, object, object)  # 第几个文件, 文件总数, 已下载字节, 总字节
+    finished = pyqtSignal(int, int, str)  # success_count, fail_count, 最后一条错误
+
+    def __init__(self, account, jobs, folder, db_manager=None):
+        super().__init__()
+        self.account = account
+        self.jobs = jobs  # [(attachment, path), ...]
+        self.folder = folder
+        self.db_manager = db_manager
+
+    def run(self):
+        client = create_email_client(self.account, self.db_manager)
+        success_count = 0
+        fail_count = 0
+        last_error = ''
+        total_files = len(self.jobs)
+
+        for i, (att, path) in enumerate(self.jobs):
+            def progress_callback(done, total, index=i + 1):
+                self.progress.emit(index, total_files, done, total)
+
+            success, msg = client.download_attachment_to_file(att, path, self.folder, progress_callback)
+            if success:
+                success_count += 1
+            else:
+                fail_count += 1
+                last_error = msg
+
+        self.finished.emit(success_count, fail_count, last_error)
+
+
 class SendEmailThread(QThread):
     """发送邮件线程"""
     finished = pyqtSignal(bool, str)
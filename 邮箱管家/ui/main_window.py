@@ -14,54 +14,79 @@ from PyQt5.QtCore import Qt, QThread, pyqtSignal, QRect
 from PyQt5.QtGui import QColor, QDragEnterEvent, QDropEvent, QPainter, QPen, QBrush, QKeySequence
 
 from database.db_manager import DatabaseManager
-from ui.dialogs import ImportDialog, EmailViewDialog, BatchSendDialog, create_email_client, MENU_STYLE_LIGHT, MENU_STYLE_DARK, ManualOAuth2Dialog, AccountDetailDialog, FluentMessageBox
+from ui.dialogs import ImportDialog, EmailViewDialog, BatchSendDialog, create_email_client, MENU_STYLE_LIGHT, MENU_STYLE_DARK, ManualOAuth2Dialog, AccountDetailDialog, FluentMessageBox, KeywordRulesDialog, NetworkTimeoutsDialog
 from ui.sidebar import Sidebar
 from ui.theme import ThemeManager, LIGHT_THEME, DARK_THEME
 from ui.system_tray import SystemTrayManager
 from core.i18n import tr, set_language, get_language
+from core.imap_pool import imap_pool
+from core.check_engine import CheckEngine
+from core.keyword_rules import load_rule_set
+from core.rate_control import rate_controller
+from core.circuit_breaker import host_breaker
+from core.net_metrics import network_timeouts, latency_stats, PHASE_NAMES
+from core.imap_compress import compression_stats
+from core.parse_pool import parse_pool, ParsePool
+from core.blob_store import get_blob_store
 
 
 class StatusCheckThread(QThread):
-    """状态检测线程"""
+    """状态检测线程 - 通过 CheckEngine 并发检测，结果按完成顺序回报"""
     status_updated = pyqtSignal(int, str)
     aws_updated = pyqtSignal(int, bool)  # 新增：AWS 状态更新信号
+    unread_updated = pyqtSignal(int, int)  # 收件箱未读数 (account_id, unread)
     progress_updated = pyqtSignal(int, int)  # 新增：进度信号 (current, total)
     finished_all = pyqtSignal()
     
-    def __init__(self, accounts, db):
+    def __init__(self, accounts, db, concurrency=None):
         super().__init__()
         self.accounts = accounts
         self.db = db
         self._stop_flag = False  # 停止标志
+        if concurrency is None:
+            concurrency = int(db.get_setting('check_concurrency', '8'))
+        self.engine = CheckEngine(concurrency=concurrency)
+        self.rules = load_rule_set(db)  # 规则只编译一次，所有工作线程共用
+        self.throttle_summary = {}  # 本次检测期间的限流/重试计数
     
     def stop(self):
         """请求停止检测"""
         self._stop_flag = True
     
+    def _check_account(self, account, client):
+        """在工作线程中执行：一次认证内检测状态和关键词规则"""
+        result = client.probe(limit=30, rules=self.rules)
+        hits = result['hits'] if result['status'] == '正常' else None
+        return result['status'], hits, result['counts']
+
     def run(self):
         total = len(self.accounts)
-        for i, account in enumerate(self.accounts):
-            # 检查是否需要停止
-            if self._stop_flag:
-                break
-            
-            # 发送进度信号
-            self.progress_updated.emit(i + 1, total)
-            
-            client = create_email_client(account, self.db)  # 传入db以便自动更新refresh_token
-            status, _ = client.check_status()
+        done = 0
+        before = rate_controller.totals()
+        results = self.engine.run(
+            self.accounts,
+            lambda account: create_email_client(account, self.db),  # 传入db以便自动更新refresh_token
+            self._check_account,
+            should_stop=lambda: self._stop_flag
+        )
+        # 数据库写入和信号发送都在本线程完成，工作线程只做网络请求
+        for account, result, error in results:
+            done += 1
+            self.progress_updated.emit(done, total)
+            status, hits, counts = result if result else ('异常', None, None)
             self.db.update_account_status(account[0], status)
             self.status_updated.emit(account[0], status)
-            
-            # 检测 AWS 验证码邮件
-            if status == '正常' and not self._stop_flag:
-                try:
-                    has_aws, _ = client.check_aws_verification_emails(limit=30)
-                    self.db.update_aws_code_status(account[0], has_aws)
-                    self.aws_updated.emit(account[0], has_aws)
-                except:
-                    pass
-        
+            if counts:
+                self.db.save_folder_counts(account[0], counts)
+                if counts.get('inbox', {}).get('unread') is not None:
+                    self.unread_updated.emit(account[0], counts['inbox']['unread'])
+            if hits:
+                self.db.set_account_flags(account[0], hits)
+                if 'aws' in hits:
+                    self.aws_updated.emit(account[0], hits['aws'] > 0)
+
+        after = rate_controller.totals()
+        self.throttle_summary = {name: after[name] - before[name] for name in after}
         self.finished_all.emit()
 
 
@@ -199,6 +224,7 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.db = DatabaseManager()
         self.current_group = '全部'
+        self.current_flag = None  # 按关键词规则标记筛选，None 表示不筛选
         self.sort_by = 'id'
         self.sort_order = 'DESC'
         
@@ -314,6 +340,12 @@ class MainWindow(QMainWindow):
         
         # 加载字体大小
         self.font_size = int(self.db.get_setting('font_size', '13'))
+
+        # 加载网络超时
+        network_timeouts.load(self.db)
+
+        # 解析进程数
+        parse_pool.load(self.db)
     
     def init_ui(self):
         self.setWindowTitle(tr('app_title'))
@@ -355,6 +387,7 @@ class MainWindow(QMainWindow):
         
         main_layout.addWidget(self.content, 1)
         self.load_group_filter()
+        self.load_flag_filter()
     
     def _apply_global_style(self):
         """应用全局样式 - 支持明暗主题"""
@@ -555,6 +588,13 @@ class MainWindow(QMainWindow):
         self.group_filter.currentTextChanged.connect(self.on_group_filter_changed)
         t_layout.addWidget(self.group_filter)
         
+        # 标记筛选（关键词规则）
+        self.flag_filter = QComboBox()
+        self.flag_filter.setFixedWidth(120)
+        self.flag_filter.setStyleSheet(self.theme_manager.get_theme()['combo'])
+        self.flag_filter.currentIndexChanged.connect(self.on_flag_filter_changed)
+        t_layout.addWidget(self.flag_filter)
+
         # 排序按钮
         self.btn_sort = FluentButton(tr('sort_by'), 'default', is_dark=is_dark)
         self.btn_sort.clicked.connect(self.show_sort_menu)
@@ -593,11 +633,11 @@ class MainWindow(QMainWindow):
         table_layout.setContentsMargins(0, 0, 0, 0)
         
         self.table = QTableWidget()
-        self.table.setColumnCount(9)  # 移除备注列
+        self.table.setColumnCount(10)  # 移除备注列
         self.table.setHorizontalHeaderLabels([
             tr('col_checkbox'), tr('col_index'), tr('col_email'), tr('col_password'),
             tr('col_group'), tr('col_status'), tr('col_type'), tr('col_aws'), 
-            tr('col_operation')
+            tr('col_unread'), tr('col_operation')
         ])
         
         # 应用表格样式
@@ -635,11 +675,13 @@ class MainWindow(QMainWindow):
         header.setSectionResizeMode(5, QHeaderView.Interactive)  # 状态
         header.setSectionResizeMode(6, QHeaderView.Interactive)  # 类型
         header.setSectionResizeMode(7, QHeaderView.Fixed)        # AWS
-        header.setSectionResizeMode(8, QHeaderView.Interactive)  # 操作
+        header.setSectionResizeMode(8, QHeaderView.Fixed)        # 未读
+        header.setSectionResizeMode(9, QHeaderView.Interactive)  # 操作
         
         self.table.setColumnWidth(0, 44)   # 复选框 (增大以适应新尺寸)
         self.table.setColumnWidth(1, 50)   # 序号
         self.table.setColumnWidth(7, 60)   # AWS
+        self.table.setColumnWidth(8, 60)   # 未读
         
         table_layout.addWidget(self.table)
         
@@ -714,11 +756,32 @@ class MainWindow(QMainWindow):
         # 重新连接信号
         self.group_filter.blockSignals(False)
 
+    def load_flag_filter(self):
+        """加载标记筛选下拉框（每条关键词规则一项）"""
+        self.flag_filter.blockSignals(True)
+        self.flag_filter.clear()
+        self.flag_filter.addItem(tr('all_flags'), None)
+        for rule in self.db.get_keyword_rules():
+            self.flag_filter.addItem(rule['name'], rule['name'])
+
+        # 恢复选中状态，规则已删除时取消筛选
+        index = self.flag_filter.findData(self.current_flag) if self.current_flag else 0
+        if index < 0:
+            index = 0
+            self.current_flag = None
+        self.flag_filter.setCurrentIndex(index)
+        self.flag_filter.blockSignals(False)
+
+    def on_flag_filter_changed(self, index):
+        self.current_flag = self.flag_filter.itemData(index)
+        self.load_accounts()
+
     def load_accounts(self):
         if self.current_group == '全部':
-            accounts = self.db.get_all_accounts_sorted(self.sort_by, self.sort_order)
+            accounts = self.db.get_all_accounts_sorted(self.sort_by, self.sort_order, flag=self.current_flag)
         else:
-            accounts = self.db.get_accounts_by_group_sorted(self.current_group, self.sort_by, self.sort_order)
+            accounts = self.db.get_accounts_by_group_sorted(self.current_group, self.sort_by, self.sort_order,
+                                                            flag=self.current_flag)
         
         self.table.setRowCount(len(accounts))
         
@@ -735,6 +798,9 @@ class MainWindow(QMainWindow):
         font_bold = self.font()
         font_bold.setBold(True)
         
+        # 收件箱未读数（批量检测时刷新）
+        unread_counts = self.db.get_unread_counts()
+
         for row, acc in enumerate(accounts):
             self.table.setRowHeight(row, 44)
             
@@ -830,9 +896,9 @@ class MainWindow(QMainWindow):
             badge_style_key = 'badge_info'
             if status_text == '正常':
                 badge_style_key = 'badge_success'
-            elif status_text in ['异常', '封禁', '失败']:
+            elif status_text in ['异常', '封禁', '失败', '不可达']:
                 badge_style_key = 'badge_error'
-            elif status_text in ['验证中', '验证']:
+            elif status_text in ['验证中', '验证', '限流']:
                 badge_style_key = 'badge_warning'
                 
             status_badge.setStyleSheet(self.theme_manager.get_theme().get(badge_style_key, ''))
@@ -855,6 +921,13 @@ class MainWindow(QMainWindow):
                 aws_item.setForeground(QColor(text_muted))
             self.table.setItem(row, 7, aws_item)
             
+            # 未读数
+            unread = unread_counts.get(acc[0])
+            unread_item = QTableWidgetItem('' if unread is None else str(unread))
+            unread_item.setTextAlignment(Qt.AlignCenter)
+            unread_item.setForeground(QColor(accent_color if unread else text_muted))
+            self.table.setItem(row, 8, unread_item)
+
             # 操作按钮 - 图标样式
             ops_widget = QWidget()
             ops_widget.setStyleSheet("background: transparent; border: none;")
@@ -899,7 +972,7 @@ class MainWindow(QMainWindow):
             ops_layout.addWidget(btn_view)
             ops_layout.addWidget(btn_del)
             ops_layout.addWidget(btn_more)
-            self.table.setCellWidget(row, 8, ops_widget)
+            self.table.setCellWidget(row, 9, ops_widget)
         
         # 右上角显示当前分组数量
         current_count = len(accounts)
@@ -1296,6 +1369,95 @@ class MainWindow(QMainWindow):
         
         layout.addSpacing(8)
         
+        # 检测并发数设置行
+        self.concurrency_label = QLabel(tr('check_concurrency'))
+        self.concurrency_label.setFixedSize(100, 32)
+        self.concurrency_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+
+        self.settings_concurrency_combo = QComboBox()
+        self.settings_concurrency_combo.addItems(['1', '4', '8', '16', '32', '64'])
+        self.settings_concurrency_combo.setFixedSize(120, 32)
+        self.settings_concurrency_combo.setStyleSheet(self.theme_manager.get_theme()['combo'])
+        current_concurrency = self.db.get_setting('check_concurrency', '8')
+        index = self.settings_concurrency_combo.findText(current_concurrency)
+        if index >= 0:
+            self.settings_concurrency_combo.setCurrentIndex(index)
+        self.settings_concurrency_combo.currentTextChanged.connect(self.on_settings_concurrency_changed)
+
+        concurrency_row = QHBoxLayout()
+        concurrency_row.setSpacing(24)
+        concurrency_row.addWidget(self.concurrency_label)
+        concurrency_row.addWidget(self.settings_concurrency_combo)
+        concurrency_row.addStretch()
+        layout.addLayout(concurrency_row)
+
+        layout.addSpacing(8)
+
+        # 解析进程数设置行（0 为 CPU 核数）
+        self.parse_workers_label = QLabel(tr('parse_workers'))
+        self.parse_workers_label.setFixedSize(100, 32)
+        self.parse_workers_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+
+        self.settings_parse_workers_combo = QComboBox()
+        self.settings_parse_workers_combo.addItem(tr('parse_workers_auto'), '0')
+        for value in ['1', '2', '4', '8', '16']:
+            self.settings_parse_workers_combo.addItem(value, value)
+        self.settings_parse_workers_combo.setFixedSize(120, 32)
+        self.settings_parse_workers_combo.setStyleSheet(self.theme_manager.get_theme()['combo'])
+        index = self.settings_parse_workers_combo.findData(self.db.get_setting(ParsePool.SETTING_KEY, '0'))
+        if index >= 0:
+            self.settings_parse_workers_combo.setCurrentIndex(index)
+        self.settings_parse_workers_combo.currentIndexChanged.connect(self.on_settings_parse_workers_changed)
+
+        parse_workers_row = QHBoxLayout()
+        parse_workers_row.setSpacing(24)
+        parse_workers_row.addWidget(self.parse_workers_label)
+        parse_workers_row.addWidget(self.settings_parse_workers_combo)
+        parse_workers_row.addStretch()
+        layout.addLayout(parse_workers_row)
+
+        layout.addSpacing(8)
+
+        # 关键词规则
+        self.rules_label = QLabel(tr('keyword_rules'))
+        self.rules_label.setFixedSize(100, 28)
+        self.rules_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+
+        self.btn_edit_rules = QPushButton(tr('edit_rules'))
+        self.btn_edit_rules.setFixedHeight(28)
+        self.btn_edit_rules.setCursor(Qt.PointingHandCursor)
+        self._apply_link_btn_style(self.btn_edit_rules)
+        self.btn_edit_rules.clicked.connect(self.edit_keyword_rules)
+
+        rules_row = QHBoxLayout()
+        rules_row.setSpacing(24)
+        rules_row.addWidget(self.rules_label)
+        rules_row.addWidget(self.btn_edit_rules)
+        rules_row.addStretch()
+        layout.addLayout(rules_row)
+
+        layout.addSpacing(8)
+
+        # 网络超时
+        self.timeouts_label = QLabel(tr('network_timeouts'))
+        self.timeouts_label.setFixedSize(100, 28)
+        self.timeouts_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+
+        self.btn_edit_timeouts = QPushButton(tr('edit_timeouts'))
+        self.btn_edit_timeouts.setFixedHeight(28)
+        self.btn_edit_timeouts.setCursor(Qt.PointingHandCursor)
+        self._apply_link_btn_style(self.btn_edit_timeouts)
+        self.btn_edit_timeouts.clicked.connect(lambda: NetworkTimeoutsDialog(self.db, self).exec_())
+
+        timeouts_row = QHBoxLayout()
+        timeouts_row.setSpacing(24)
+        timeouts_row.addWidget(self.timeouts_label)
+        timeouts_row.addWidget(self.btn_edit_timeouts)
+        timeouts_row.addStretch()
+        layout.addLayout(timeouts_row)
+
+        layout.addSpacing(8)
+
         # 数据存储位置
         self.data_label = QLabel(tr('data_location'))
         self.data_label.setFixedSize(100, 28)
@@ -1382,6 +1544,23 @@ class MainWindow(QMainWindow):
         self.db.set_setting('font_size', font_size_str)
         self.refresh_font_size(font_size)
     
+    def edit_keyword_rules(self):
+        """编辑关键词规则，保存后刷新标记筛选"""
+        dialog = KeywordRulesDialog(self.db, self)
+        if dialog.exec_():
+            self.load_flag_filter()
+            self.load_accounts()
+
+    def on_settings_concurrency_changed(self, value):
+        """设置页面检测并发数改变（下次检测生效）"""
+        self.db.set_setting('check_concurrency', value)
+
+    def on_settings_parse_workers_changed(self, index):
+        """设置页面解析进程数改变（立即生效）"""
+        value = self.settings_parse_workers_combo.itemData(index)
+        self.db.set_setting(ParsePool.SETTING_KEY, value)
+        parse_pool.configure(value)
+
     def on_settings_lang_changed(self, index):
         """设置页面语言改变 - 同步更新侧边栏"""
         from core.i18n import set_language
@@ -1421,6 +1600,17 @@ class MainWindow(QMainWindow):
         self.general_section_desc.setText(tr('general_settings_desc'))
         self.font_label.setText(tr('font_size'))
         self.lang_label.setText(tr('language'))
+        if hasattr(self, 'concurrency_label'):
+            self.concurrency_label.setText(tr('check_concurrency'))
+        if hasattr(self, 'parse_workers_label'):
+            self.parse_workers_label.setText(tr('parse_workers'))
+            self.settings_parse_workers_combo.setItemText(0, tr('parse_workers_auto'))
+        if hasattr(self, 'rules_label'):
+            self.rules_label.setText(tr('keyword_rules'))
+            self.btn_edit_rules.setText(tr('edit_rules'))
+        if hasattr(self, 'timeouts_label'):
+            self.timeouts_label.setText(tr('network_timeouts'))
+            self.btn_edit_timeouts.setText(tr('edit_timeouts'))
         
         # 更新数据和关于区域
         if hasattr(self, 'data_label'):
@@ -1466,6 +1656,14 @@ class MainWindow(QMainWindow):
         self.general_section_desc.setStyleSheet(f"font-size: 13px; color: {self.theme_manager.get_color('text_secondary')}; background: transparent;")
         self.font_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
         self.lang_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+        if hasattr(self, 'concurrency_label'):
+            self.concurrency_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+        if hasattr(self, 'rules_label'):
+            self.rules_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+            self._apply_link_btn_style(self.btn_edit_rules)
+        if hasattr(self, 'timeouts_label'):
+            self.timeouts_label.setStyleSheet(f"color: {self.theme_manager.get_color('text')}; background: transparent; font-size: 14px;")
+            self._apply_link_btn_style(self.btn_edit_timeouts)
         
         # 更新数据和关于区域样式
         if hasattr(self, 'data_label'):
@@ -1484,6 +1682,8 @@ class MainWindow(QMainWindow):
         # 更新下拉框样式
         self.settings_font_combo.setStyleSheet(self.theme_manager.get_theme()['combo'])
         self.settings_lang_combo.setStyleSheet(self.theme_manager.get_theme()['combo'])
+        if hasattr(self, 'settings_concurrency_combo'):
+            self.settings_concurrency_combo.setStyleSheet(self.theme_manager.get_theme()['combo'])
         
         # 更新主题按钮状态
         self.theme_light_btn.setChecked(not is_dark)
@@ -1922,6 +2122,7 @@ class MainWindow(QMainWindow):
         self.check_thread = StatusCheckThread(accounts, self.db)
         self.check_thread.status_updated.connect(self.on_status_updated)
         self.check_thread.aws_updated.connect(self.on_aws_updated)
+        self.check_thread.unread_updated.connect(self.on_unread_updated)
         self.check_thread.progress_updated.connect(self.on_check_progress)
         self.check_thread.finished_all.connect(self.on_check_finished)
         self.check_thread.start()
@@ -1956,9 +2157,9 @@ class MainWindow(QMainWindow):
                                 badge_style_key = 'badge_info'
                                 if status == '正常':
                                     badge_style_key = 'badge_success'
-                                elif status in ['异常', '封禁', '失败']:
+                                elif status in ['异常', '封禁', '失败', '不可达']:
                                     badge_style_key = 'badge_error'
-                                elif status in ['验证中', '验证']:
+                                elif status in ['验证中', '验证', '限流']:
                                     badge_style_key = 'badge_warning'
                                 badge.setStyleSheet(self.theme_manager.get_theme().get(badge_style_key, ''))
                         break
@@ -2029,10 +2230,32 @@ class MainWindow(QMainWindow):
                             aws_item.setForeground(QColor(muted_color))
                     break
 
+    def on_unread_updated(self, account_id, unread):
+        """更新未读列"""
+        for row in range(self.table.rowCount()):
+            widget = self.table.cellWidget(row, 0)
+            if widget:
+                cb = widget.findChild(QCheckBox)
+                if cb and cb.property('account_id') == account_id:
+                    unread_item = self.table.item(row, 8)
+                    if unread_item:
+                        unread_item.setText(str(unread))
+                        color = 'accent' if unread else 'text_muted'
+                        unread_item.setForeground(QColor(self.theme_manager.get_color(color)))
+                    break
+
     def on_check_finished(self):
         self.btn_check.setEnabled(True)
         self.btn_check.setText(tr('batch_check'))
-        FluentMessageBox.success(self, tr('success'), tr('check_complete'))
+        message = tr('check_complete')
+        summary = getattr(self.check_thread, 'throttle_summary', None) or {}
+        if summary.get('throttled'):
+            # 出现限流时提示次数，便于调低检测并发数
+            message += '\n' + tr('throttle_summary', summary['throttled'], summary['retries'])
+        unreachable = host_breaker.open_hosts()
+        if unreachable:
+            message += '\n' + tr('hosts_unreachable', ', '.join(unreachable))
+        FluentMessageBox.success(self, tr('success'), message)
 
     def batch_delete(self):
         selected = self.get_selected_accounts()
@@ -2043,6 +2266,7 @@ class MainWindow(QMainWindow):
         if FluentMessageBox.question(self, tr('confirm'), tr('confirm_delete', len(selected))):
             for aid in selected:
                 self.db.delete_account(aid)
+            self.collect_blob_garbage()
             self.load_accounts()
     
     def batch_send_email(self):
@@ -2083,11 +2307,22 @@ class MainWindow(QMainWindow):
             
             if FluentMessageBox.question(self, tr('confirm'), tr('confirm_delete_single')):
                 self.db.delete_account(account_id)
+                self.collect_blob_garbage()
                 self.load_accounts()
                 self.sidebar.load_groups()  # 刷新侧边栏分组计数
         except Exception as e:
             FluentMessageBox.error(self, '错误', f'删除账号时出错: {str(e)}')
     
+    def collect_blob_garbage(self):
+        """删除账号后清理不再被任何账号引用的原始邮件/附件文件"""
+        store = get_blob_store(self.db)
+        if store is None:
+            return
+        try:
+            store.collect_garbage(self.db.get_blob_digests())
+        except OSError:
+            pass
+
     def show_more_menu(self):
         """显示更多操作菜单"""
         btn = self.sender()
@@ -2199,8 +2434,8 @@ class MainWindow(QMainWindow):
     
     def adjust_column_widths(self):
         """按比例调整列宽 (邮箱:密码:分组:状态:类型:操作)"""
-        # 计算可用宽度（减去复选框、序号列、AWS列和滚动条）
-        available = self.table.viewport().width() - 44 - 50 - 60 - 20
+        # 计算可用宽度（减去复选框、序号列、AWS列、未读列和滚动条）
+        available = self.table.viewport().width() - 44 - 50 - 60 - 60 - 20
         if available <= 0:
             return
         
@@ -2212,7 +2447,7 @@ class MainWindow(QMainWindow):
         self.table.setColumnWidth(4, int(unit * 1.2))   # 分组 1.2份
         self.table.setColumnWidth(5, int(unit * 1))     # 状态 1份
         self.table.setColumnWidth(6, int(unit * 1))     # 类型 1份
-        self.table.setColumnWidth(8, int(unit * 1.5))   # 操作 1.5份
+        self.table.setColumnWidth(9, int(unit * 1.5))   # 操作 1.5份
 
     def setup_shortcuts(self):
         """设置快捷键"""
@@ -2312,11 +2547,12 @@ class MainWindow(QMainWindow):
         self.table.setHorizontalHeaderLabels([
             tr('col_checkbox'), tr('col_index'), tr('col_email'), tr('col_password'),
             tr('col_group'), tr('col_status'), tr('col_type'), tr('col_aws'), 
-            tr('col_operation')
+            tr('col_unread'), tr('col_operation')
         ])
         
-        # 更新分组筛选
+        # 更新分组和标记筛选
         self.load_group_filter()
+        self.load_flag_filter()
         
         # 重新加载账号列表以更新所有文本
         self.load_accounts()
@@ -2368,8 +2604,9 @@ class MainWindow(QMainWindow):
         # 更新搜索框样式
         self.search_input.setStyleSheet(theme['input'])
         
-        # 更新分组筛选样式
+        # 更新分组和标记筛选样式
         self.group_filter.setStyleSheet(theme['combo'])
+        self.flag_filter.setStyleSheet(theme['combo'])
         
         # 更新表格样式
         self.table.setStyleSheet(theme['table'])
@@ -2461,6 +2698,9 @@ class MainWindow(QMainWindow):
         # 图表区域
         self._create_charts_section(page_layout)
         
+        # 网络耗时
+        self._create_latency_section(page_layout)
+
         page_layout.addStretch()
         
         # 初始隐藏
@@ -2586,6 +2826,76 @@ class MainWindow(QMainWindow):
         charts_layout.addStretch()
         parent_layout.addWidget(charts_widget)
     
+    def _create_latency_section(self, parent_layout):
+        """创建网络耗时面板（各服务器各阶段的 p50/p95/p99，按 p99 倒序）"""
+        is_dark = self.theme_manager.is_dark()
+        text_color = '#c9d1d9' if is_dark else '#1A1A1A'
+        muted_color = '#8b949e' if is_dark else '#616161'
+
+        panel = QFrame()
+        panel.setMaximumWidth(664)
+        panel.setStyleSheet(f"""
+            QFrame {{
+                background: {'#161b22' if is_dark else '#FFFFFF'};
+                border: none;
+                border-radius: 16px;
+            }}
+        """)
+        shadow = QGraphicsDropShadowEffect(panel)
+        shadow.setBlurRadius(15)
+        shadow.setColor(QColor(0, 0, 0, 15 if not is_dark else 30))
+        shadow.setOffset(0, 4)
+        panel.setGraphicsEffect(shadow)
+
+        layout = QVBoxLayout(panel)
+        layout.setContentsMargins(24, 20, 24, 20)
+        layout.setSpacing(12)
+
+        title_label = QLabel('网络耗时 (ms)')
+        title_label.setStyleSheet(f"font-size: 16px; font-weight: 600; color: {text_color}; background: transparent;")
+        layout.addWidget(title_label)
+
+        # IMAP COMPRESS=DEFLATE 节省的流量
+        traffic = compression_stats.totals()
+        if traffic['raw_in']:
+            saved = 1 - traffic['wire_in'] / traffic['raw_in']
+            traffic_label = QLabel(
+                f"IMAP 压缩: 接收 {traffic['raw_in'] / 1048576:.1f} MB，"
+                f"实际传输 {traffic['wire_in'] / 1048576:.1f} MB（节省 {saved:.0%}）"
+            )
+            traffic_label.setStyleSheet(f"font-size: 12px; color: {muted_color}; background: transparent;")
+            layout.addWidget(traffic_label)
+
+        rows = latency_stats.summary()[:20]
+        if not rows:
+            empty_label = QLabel('暂无数据，检测或收取邮件后显示')
+            empty_label.setStyleSheet(f"font-size: 12px; color: {muted_color}; background: transparent;")
+            layout.addWidget(empty_label)
+            parent_layout.addWidget(panel)
+            return
+
+        table = QTableWidget(len(rows), 7)
+        table.setHorizontalHeaderLabels(['协议', '服务器', '阶段', '次数', 'P50', 'P95', 'P99'])
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionMode(QAbstractItemView.NoSelection)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        table.setStyleSheet(f"""
+            QTableWidget {{ background: transparent; color: {text_color}; font-size: 12px; border: none; }}
+            QHeaderView::section {{ background: transparent; color: {muted_color}; border: none; padding: 4px; }}
+        """)
+        for i, row in enumerate(rows):
+            values = [
+                row['protocol'].upper(), row['host'], PHASE_NAMES.get(row['phase'], row['phase']),
+                str(row['count']), f"{row['p50']:.0f}", f"{row['p95']:.0f}", f"{row['p99']:.0f}",
+            ]
+            for column, value in enumerate(values):
+                table.setItem(i, column, QTableWidgetItem(value))
+        table.setFixedHeight(min(len(rows), 8) * 30 + 32)
+        layout.addWidget(table)
+        parent_layout.addWidget(panel)
+
     def _create_chart_panel(self, title, data):
         """创建图表面板"""
         from ui.dialogs import PieChartWidget
@@ -2760,6 +3070,9 @@ class MainWindow(QMainWindow):
         # 隐藏托盘图标
         if self.tray_manager and self.tray_manager.tray_icon:
             self.tray_manager.tray_icon.hide()
+        # 登出连接池中的 IMAP 会话，结束解析进程
+        imap_pool.close_all()
+        parse_pool.shutdown(wait=False)
         event.accept()
 
     def show_table_context_menu(self, pos):
@@ -2856,6 +3169,12 @@ class MainWindow(QMainWindow):
         action_export = menu.addAction('📋  导出信息')
         action_export.triggered.connect(lambda: self.export_single_account(account_id))
         
+        # 验证码（从索引表读取，不访问邮箱）
+        action_code = menu.addAction('🔑  复制最新验证码')
+        action_code.triggered.connect(lambda: self.copy_latest_code(account_id))
+        action_recent_codes = menu.addAction('🕒  最近验证码')
+        action_recent_codes.triggered.connect(lambda: self.show_recent_codes())
+
         menu.addSeparator()
         
         # 删除 - 使用自定义 widget 实现红色
@@ -2934,6 +3253,35 @@ class MainWindow(QMainWindow):
         
         QMessageBox.information(self, '提示', '账号信息已复制到剪贴板')
     
+    def copy_latest_code(self, account_id):
+        """复制账号最新的验证码（检测/同步时已提取）"""
+        record = self.db.get_latest_code(account_id)
+        if not record:
+            QMessageBox.information(self, '提示', '暂无验证码，请先检测或同步该账号')
+            return
+
+        from PyQt5.QtWidgets import QApplication
+        QApplication.clipboard().setText(record['code'])
+        received = record['received_at'].astimezone().strftime('%Y-%m-%d %H:%M:%S')
+        QMessageBox.information(
+            self, '提示',
+            f"验证码 {record['code']} 已复制到剪贴板\n"
+            f"发件人: {record['sender'] or record['sender_email']}\n时间: {received}"
+        )
+
+    def show_recent_codes(self, minutes=10):
+        """显示所有账号最近收到的验证码"""
+        records = self.db.get_recent_codes(minutes)
+        if not records:
+            QMessageBox.information(self, '提示', f'最近 {minutes} 分钟没有收到验证码')
+            return
+        lines = [
+            f"{r['received_at'].astimezone():%H:%M:%S}  {r['email'] or r['account_id']}  {r['code']}"
+            f"  ({r['sender_email'] or r['sender']})"
+            for r in records
+        ]
+        QMessageBox.information(self, f'最近 {minutes} 分钟的验证码', '\n'.join(lines))
+
     def view_account_emails(self, account_id):
         """查看账号邮件"""
         accounts = self.db.get_all_accounts()
@@ -2950,12 +3298,12 @@ class MainWindow(QMainWindow):
 
     def on_cell_double_clicked(self, row, col):
         """双击单元格"""
-        if col == 8:  # 备注列
+        if col == 9:  # 备注列
             self.edit_remark(row)
     
     def edit_remark(self, row):
         """编辑备注"""
-        item = self.table.item(row, 8)
+        item = self.table.item(row, 9)
         if not item:
             return
         
@@ -2997,7 +3345,7 @@ class MainWindow(QMainWindow):
         editor.returnPressed.connect(lambda: self.save_remark(editor))
         editor.installEventFilter(self)
         
-        self.table.setCellWidget(row, 8, editor)
+        self.table.setCellWidget(row, 9, editor)
         editor.setFocus()
         editor.selectAll()
     
@@ -3011,7 +3359,7 @@ class MainWindow(QMainWindow):
         self.db.update_account_remark(account_id, new_remark)
         
         # 移除编辑器，更新表格显示
-        self.table.removeCellWidget(row, 8)
+        self.table.removeCellWidget(row, 9)
         
         is_dark = self.theme_manager.is_dark()
         text_color = '#8b949e' if is_dark else '#666666'
@@ -3021,7 +3369,7 @@ class MainWindow(QMainWindow):
         item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
         item.setToolTip('双击编辑备注')
         item.setData(Qt.UserRole, account_id)
-        self.table.setItem(row, 8, item)
+        self.table.setItem(row, 9, item)
         
         self.show_toast(tr('remark_saved'))
     
@@ -3035,7 +3383,7 @@ class MainWindow(QMainWindow):
                 account_id = obj.property('account_id')
                 original = obj.property('original')
                 
-                self.table.removeCellWidget(row, 8)
+                self.table.removeCellWidget(row, 9)
                 
                 is_dark = self.theme_manager.is_dark()
                 text_color = '#8b949e' if is_dark else '#666666'
@@ -3045,6 +3393,6 @@ class MainWindow(QMainWindow):
                 item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
                 item.setToolTip('双击编辑备注')
                 item.setData(Qt.UserRole, account_id)
-                self.table.setItem(row, 8, item)
+                self.table.setItem(row, 9, item)
                 return True
         return super().eventFilter(obj, event)